@@ -5,22 +5,34 @@ Versão: 1.2.0
 
 from .database import (
     Database,
+    ShardedDatabase,
     Model,
+    ModelMeta,
     Field,
     FieldType,
     ForeignKey,
     QuerySet,
-    RelatedManager
+    RelatedManager,
+    PendingWrite,
+    Change,
+    Migrator,
+    MigrationOperation
 )
 
 __version__ = "1.2.0"
 __all__ = [
     "Database",
+    "ShardedDatabase",
     "Model",
+    "ModelMeta",
     "Field",
     "FieldType",
     "ForeignKey",
     "QuerySet",
-    "RelatedManager"
+    "RelatedManager",
+    "PendingWrite",
+    "Change",
+    "Migrator",
+    "MigrationOperation"
 ]
 
@@ -0,0 +1,300 @@
+"""
+Benchmarks do pysql_lite
+Mede operações por segundo e pico de memória das operações principais
+(save, bulk insert, find_by_id, filter, order_by/limit, hidratação e
+acesso relacionado) em bancos em memória e em arquivo.
+
+Uso:
+    cd pysql_lite
+    python benchmarks/bench_database.py --sizes 1000,100000 --backends memory,file
+    python benchmarks/bench_database.py --output resultados.json
+
+A saída é JSON para comparar execuções entre releases.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database import Database, Model, Field, FieldType, ForeignKey
+
+
+# ============================================================================
+# Modelos do benchmark
+# ============================================================================
+
+class BenchUser(Model):
+    """Usuário com tipos de campo variados"""
+    _table_name = "bench_users"
+    _fields = {
+        "id": Field(FieldType.INTEGER, primary_key=True),
+        "name": Field(FieldType.TEXT, nullable=False),
+        "email": Field(FieldType.TEXT),
+        "age": Field(FieldType.INTEGER),
+        "score": Field(FieldType.REAL),
+        "is_active": Field(FieldType.BOOLEAN, default=True),
+        "created_at": Field(FieldType.DATETIME),
+    }
+
+
+class BenchPost(Model):
+    """Post relacionado a BenchUser"""
+    _table_name = "bench_posts"
+    _fields = {
+        "id": Field(FieldType.INTEGER, primary_key=True),
+        "user_id": Field(FieldType.INTEGER, foreign_key=ForeignKey(BenchUser)),
+        "title": Field(FieldType.TEXT),
+        "views": Field(FieldType.INTEGER, default=0),
+    }
+
+
+BenchUser.register_related("posts", BenchPost, "user_id")
+
+CHUNK_SIZE = 50_000
+BASE_DATE = datetime(2024, 1, 1)
+
+
+# ============================================================================
+# Utilitários de medição
+# ============================================================================
+
+def measure(func: Callable[[], int], min_time: float, max_iterations: int) -> Dict[str, Any]:
+    """
+    Executa func repetidamente até min_time segundos (ou max_iterations)
+    e depois mais uma vez sob tracemalloc para medir o pico de memória.
+
+    func retorna a quantidade de operações realizadas na chamada.
+    """
+    ops = 0
+    iterations = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while iterations < max_iterations:
+        ops += func()
+        iterations += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops": ops,
+        "seconds": elapsed,
+        "ops_per_sec": ops / elapsed if elapsed > 0 else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def make_user(rng: random.Random, i: int) -> BenchUser:
+    """Gera um usuário sintético determinístico"""
+    return BenchUser(
+        name=f"user{i}",
+        email=f"user{i}@example.com",
+        age=rng.randint(18, 97),
+        score=rng.random(),
+        is_active=rng.random() < 0.8,
+        created_at=BASE_DATE + timedelta(seconds=rng.randint(0, 365 * 86400)),
+    )
+
+
+def load_dataset(rows: int, rng: random.Random) -> float:
+    """Popula usuários e posts em blocos; retorna o tempo de inserção dos usuários"""
+    elapsed = 0.0
+    for offset in range(0, rows, CHUNK_SIZE):
+        chunk = [make_user(rng, i) for i in range(offset, min(offset + CHUNK_SIZE, rows))]
+        start = time.perf_counter()
+        BenchUser.bulk_create(chunk)
+        elapsed += time.perf_counter() - start
+
+    for offset in range(0, rows, CHUNK_SIZE):
+        posts = [
+            BenchPost(user_id=rng.randint(1, rows), title=f"post{i}", views=rng.randint(0, 1000))
+            for i in range(offset, min(offset + CHUNK_SIZE, rows))
+        ]
+        BenchPost.bulk_create(posts)
+
+    return elapsed
+
+
+# ============================================================================
+# Cenários
+# ============================================================================
+
+FILTER_CASES = {
+    "eq": {"age": 42},
+    "gt": {"age__gt": 95},
+    "gte": {"age__gte": 96},
+    "lt": {"age__lt": 20},
+    "lte": {"age__lte": 19},
+    "ne": {"age__ne": 42},
+    "like": {"name__like": "user12%"},
+    "contains": {"email__contains": "r123@"},
+    "startswith": {"name__startswith": "user12"},
+    "endswith": {"email__endswith": "77@example.com"},
+    "in": {"age__in": [20, 40, 60]},
+}
+
+
+def run_backend(backend: str, rows: int, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Executa todos os cenários para um backend e tamanho de tabela"""
+    rng = random.Random(args.seed)
+    tmpdir = None
+
+    if backend == "memory":
+        db_path = ":memory:"
+    else:
+        tmpdir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmpdir.name, "bench.db")
+
+    db = Database(db_path)
+    BenchUser.set_database(db)
+    BenchPost.set_database(db)
+
+    results: List[Dict[str, Any]] = []
+
+    def record(operation: str, measurement: Dict[str, Any]):
+        measurement.update({"backend": backend, "rows": rows, "operation": operation})
+        results.append(measurement)
+
+    try:
+        # bulk insert: carga completa da tabela
+        tracemalloc.start()
+        insert_time = load_dataset(rows, rng)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        record("bulk_insert", {
+            "ops": rows,
+            "seconds": insert_time,
+            "ops_per_sec": rows / insert_time if insert_time > 0 else None,
+            "peak_memory_bytes": peak,
+        })
+
+        sample_ids = [rng.randint(1, rows) for _ in range(args.sample)]
+
+        def save_one() -> int:
+            make_user(rng, rows + rng.randint(0, 10 ** 9)).save()
+            return 1
+        record("save", measure(save_one, args.min_time, args.sample))
+
+        def save_write_behind() -> int:
+            for _ in range(args.sample):
+                make_user(rng, rows + rng.randint(0, 10 ** 9)).save()
+            db.flush()
+            return args.sample
+        BenchUser._write_behind = True
+        db.enable_write_behind()
+        try:
+            record("save_write_behind", measure(save_write_behind, args.min_time, 1000))
+        finally:
+            db.disable_write_behind()
+            BenchUser._write_behind = False
+
+        def find_by_id() -> int:
+            for pk in sample_ids:
+                BenchUser.find_by_id(pk)
+            return len(sample_ids)
+        record("find_by_id", measure(find_by_id, args.min_time, 1000))
+
+        for operator, kwargs in FILTER_CASES.items():
+            def run_filter(kwargs=kwargs) -> int:
+                BenchUser.filter(**kwargs)
+                return 1
+            record(f"filter_{operator}", measure(run_filter, args.min_time, 1000))
+
+        def order_by_limit() -> int:
+            BenchUser.query.filter(is_active=True).order_by("age", "DESC").limit(10).all()
+            return 1
+        record("queryset_order_by_limit", measure(order_by_limit, args.min_time, 1000))
+
+        hydrate_rows = db.fetchall(
+            f"SELECT * FROM {BenchUser._table_name} LIMIT ?", (min(rows, 10_000),)
+        )
+
+        def hydrate() -> int:
+            for row in hydrate_rows:
+                BenchUser._from_row(row)
+            return len(hydrate_rows)
+        record("from_row_hydration", measure(hydrate, args.min_time, 1000))
+
+        related_users = [BenchUser.find_by_id(pk) for pk in sample_ids[:max(1, args.sample // 10)]]
+
+        def related_access() -> int:
+            for user in related_users:
+                user.posts.all()
+            return len(related_users)
+        record("related_manager_access", measure(related_access, args.min_time, 1000))
+    finally:
+        db.close()
+        Database._instance = None
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    return results
+
+
+def main(argv: List[str] = None) -> Dict[str, Any]:
+    """Ponto de entrada do runner"""
+    parser = argparse.ArgumentParser(description="Benchmarks do pysql_lite")
+    parser.add_argument("--sizes", default="1000,100000,1000000",
+                        help="Tamanhos de tabela separados por vírgula")
+    parser.add_argument("--backends", default="memory,file",
+                        help="Backends separados por vírgula: memory, file")
+    parser.add_argument("--sample", type=int, default=1000,
+                        help="Quantidade de operações pontuais (save, find_by_id)")
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="Tempo mínimo de medição por cenário (segundos)")
+    parser.add_argument("--seed", type=int, default=42, help="Semente dos dados sintéticos")
+    parser.add_argument("--output", help="Arquivo para gravar o JSON (padrão: stdout)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    for backend in backends:
+        if backend not in ("memory", "file"):
+            parser.error(f"Backend inválido: {backend}")
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+        },
+        "results": [],
+    }
+
+    for backend in backends:
+        for rows in sizes:
+            report["results"].extend(run_backend(backend, rows, args))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(output)
+    else:
+        print(output)
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
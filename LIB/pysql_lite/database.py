@@ -5,13 +5,27 @@ Camada de abstração simples para interagir com SQLite sem SQL complexo
 
 import sqlite3
 import os
-from typing import Any, Dict, List, Optional, Type, TypeVar
-from datetime import datetime
+import re
+import copy
+import json
+import time
+import zlib
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Deque, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple, Type, TypeVar, Union
+from datetime import datetime, timedelta, timezone
 from enum import Enum
+from pathlib import Path
 
 # Type variable para uso genérico
 T = TypeVar('T', bound='Model')
 
+logger = logging.getLogger("pysql_lite")
+
 
 class FieldType(Enum):
     """Tipos de campos suportados"""
@@ -21,6 +35,20 @@ class FieldType(Enum):
     BLOB = "BLOB"
     BOOLEAN = "BOOLEAN"  # Armazenado como INTEGER no SQLite, mas marcado como BOOLEAN logicamente
     DATETIME = "DATETIME"  # Armazenado como TEXT no SQLite em formato ISO
+    JSON = "JSON"  # Armazenado como TEXT; consultável com json_extract
+
+
+class _NoValue:
+    """Marca a ausência de valor em parallel_map() (continua única após pickle)"""
+    
+    def __reduce__(self):
+        return "_NO_VALUE"
+    
+    def __repr__(self) -> str:
+        return "<sem valor>"
+
+
+_NO_VALUE = _NoValue()
 
 
 class QuerySet:
@@ -38,6 +66,8 @@ class QuerySet:
         self.filters: Dict[str, tuple] = {}  # Armazena {campo: (operador, valor)}
         self.order_fields: List[tuple] = []  # Armazena [(campo, direcção), ...]
         self._limit_value: Optional[int] = None
+        self._deferred: Set[str] = set()  # Campos adiados via defer()
+        self._only: Optional[Set[str]] = None  # Campos carregados via only()
         self._executed = False
         self._results: List['Model'] = []
     
@@ -66,6 +96,10 @@ class QuerySet:
         """
         Adiciona ordenação ao query
         
+        Valores NULL seguem a ordenação do SQLite, menores que qualquer
+        outro valor: ficam no início em ASC e no fim em DESC, também no
+        merge entre shards.
+        
         Args:
             field_name: Nome do campo para ordenar
             direction: 'ASC' ou 'DESC'
@@ -98,6 +132,56 @@ class QuerySet:
         self._limit_value = count
         return self
     
+    def defer(self, *field_names: str) -> 'QuerySet':
+        """
+        Adia o carregamento dos campos informados (Lazy Loading de colunas)
+        
+        Os campos adiados não entram no SELECT e são carregados com uma
+        query dedicada no primeiro acesso ao atributo.
+        
+        Args:
+            *field_names: Nomes dos campos a adiar
+        
+        Returns:
+            Self para permitir encadeamento
+        """
+        pk_field = self.model_class._get_pk_field_name()
+        for field_name in field_names:
+            if field_name not in self.model_class._fields:
+                raise ValueError(f"Campo '{field_name}' não existe no modelo {self.model_class.__name__}")
+            if field_name == pk_field:
+                raise ValueError("A chave primária não pode ser adiada")
+            self._deferred.add(field_name)
+        return self
+    
+    def only(self, *field_names: str) -> 'QuerySet':
+        """
+        Carrega apenas os campos informados (e a chave primária);
+        os demais são adiados
+        
+        Args:
+            *field_names: Nomes dos campos a carregar
+        
+        Returns:
+            Self para permitir encadeamento
+        """
+        for field_name in field_names:
+            if field_name not in self.model_class._fields:
+                raise ValueError(f"Campo '{field_name}' não existe no modelo {self.model_class.__name__}")
+        self._only = set(field_names)
+        return self
+    
+    def _deferred_fields(self) -> FrozenSet[str]:
+        """Calcula o conjunto final de campos adiados para o SELECT"""
+        pk_field = self.model_class._get_pk_field_name()
+        if self._only is None:
+            deferred = set(self.model_class._lazy_fields())
+        else:
+            deferred = set(self.model_class._fields) - self._only
+        deferred |= self._deferred
+        deferred.discard(pk_field)
+        return frozenset(deferred)
+    
     def _execute(self) -> List['Model']:
         """
         Executa o query no banco de dados (Lazy Loading)
@@ -106,29 +190,17 @@ class QuerySet:
         if self._executed:
             return self._results
         
-        # Se não há filtros, retorna todos
-        if not self.filters:
-            results = self.model_class.find_all()
-        else:
-            # Reconstrói os kwargs com a sintaxe original para usar o filter() existente
-            kwargs = {}
-            for key, (operator, value) in self.filters.items():
-                kwargs[key] = value
-            results = self.model_class.filter(**kwargs)
-        
-        # Aplica ordenação se houver
-        if self.order_fields:
-            for field_name, direction in reversed(self.order_fields):
-                reverse = direction == 'DESC'
-                results = sorted(
-                    results,
-                    key=lambda x: getattr(x, field_name, None) or '',
-                    reverse=reverse
-                )
-        
-        # Aplica LIMIT se houver
-        if self._limit_value is not None:
-            results = results[:self._limit_value]
+        # Reconstrói os kwargs com a sintaxe original do filter()
+        kwargs = {}
+        for key, (operator, value) in self.filters.items():
+            kwargs[key] = value
+        # Ordenação e LIMIT são executados no SQL
+        results = self.model_class._select(
+            kwargs,
+            self._deferred_fields(),
+            self.order_fields,
+            self._limit_value
+        )
         
         self._results = results
         self._executed = True
@@ -148,6 +220,73 @@ class QuerySet:
         results = self._execute()
         return len(results)
     
+    def parallel_map(self, func: Callable[['Model'], Any], workers: Optional[int] = None,
+                     reduce: Optional[Callable[[Any, Any], Any]] = None, initial: Any = _NO_VALUE,
+                     chunks_per_worker: int = 4) -> Any:
+        """
+        Aplica func a cada registro do query em vários processos
+        
+        A tabela é dividida em faixas de rowid; cada processo abre sua própria
+        conexão somente leitura, hidrata e processa a sua faixa. func e reduce
+        precisam ser picklable (funções de módulo) e o banco precisa ser um
+        arquivo. order_by() e limit() não são suportados.
+        
+        Args:
+            func: Função aplicada a cada instância
+            workers: Quantidade de processos (padrão: os.cpu_count())
+            reduce: Se informado, combina os resultados com reduce(acumulado, valor);
+                    deve ser associativa, pois cada faixa é reduzida separadamente
+            initial: Valor inicial (elemento neutro) do reduce
+            chunks_per_worker: Faixas por processo, para equilibrar a carga
+        
+        Returns:
+            Lista de resultados em ordem de rowid, ou o valor reduzido
+        """
+        if self.order_fields or self._limit_value is not None:
+            raise ValueError("parallel_map() não suporta order_by() nem limit()")
+        
+        model = self.model_class
+        if not model._initialized:
+            model._initialize_model()
+        
+        shards = model._database.shards_for(model)
+        if any(shard.db_path == ":memory:" for shard in shards):
+            raise ValueError("parallel_map() requer um banco em arquivo (não :memory:)")
+        
+        workers = workers or os.cpu_count() or 1
+        kwargs = {key: value for key, (operator, value) in self.filters.items()}
+        deferred = self._deferred_fields()
+        
+        tasks = []
+        for shard in shards:
+            # Grava pendências para que os processos leiam o estado atual
+            shard.flush()
+            row = shard.execute(
+                f"SELECT MIN(rowid) AS low, MAX(rowid) AS high FROM {model._table_name}",
+                model=model.__name__
+            ).fetchone()
+            if row['low'] is None:
+                continue
+            
+            chunk_count = workers * chunks_per_worker
+            width = max(1, -(-(row['high'] - row['low'] + 1) // chunk_count))
+            for low in range(row['low'], row['high'] + 1, width):
+                tasks.append((shard.db_path, model, kwargs, deferred,
+                              low, low + width - 1, func, reduce, initial))
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(_scan_range, tasks))
+        
+        if reduce is None:
+            return [value for values in partials for value in values]
+        
+        result = initial
+        for partial in partials:
+            if partial is _NO_VALUE:
+                continue
+            result = partial if result is _NO_VALUE else reduce(result, partial)
+        return None if result is _NO_VALUE else result
+    
     def __iter__(self):
         """Permite iteração sobre os resultados (Lazy Loading)"""
         return iter(self._execute())
@@ -166,6 +305,41 @@ class QuerySet:
         return f"<QuerySet: {self.model_class.__name__} ({filters_str})>"
 
 
+def _scan_range(task: tuple) -> Any:
+    """
+    Processa uma faixa de rowid em um processo de parallel_map()
+    
+    Abre uma conexão somente leitura, hidrata as linhas da faixa e aplica
+    func; com reduce, devolve só o valor reduzido da faixa.
+    """
+    db_path, model, filters, deferred, low, high, func, reduce, initial = task
+    
+    database = Database(db_path, read_only=True)
+    # O modelo passa a ler (inclusive campos adiados) pela conexão do processo
+    model._database = database
+    model._initialized = True
+    try:
+        where_clauses, values = model._build_where(filters)
+        where_clauses.append("rowid BETWEEN ? AND ?")
+        values.extend((low, high))
+        sql = (
+            f"SELECT {model._column_list(deferred)} FROM {model._table_name} "
+            f"WHERE {' AND '.join(where_clauses)}"
+        )
+        
+        cursor = database.execute(sql, tuple(values), model=model.__name__)
+        if reduce is None:
+            return [func(model._from_row(row, deferred)) for row in cursor]
+        
+        result = initial
+        for row in cursor:
+            value = func(model._from_row(row, deferred))
+            result = value if result is _NO_VALUE else reduce(result, value)
+        return result
+    finally:
+        database.close()
+
+
 class ForeignKey:
     """Representa uma referência a outro modelo (chave estrangeira)"""
     
@@ -192,6 +366,42 @@ class ForeignKey:
         return f"FOREIGN KEY ({column_name}) REFERENCES {self.target_table}({self.target_pk}) ON DELETE {self.on_delete}"
 
 
+# Mapeia tipos do modelo para tipos SQLite
+_SQL_TYPES = {
+    FieldType.INTEGER: "INTEGER",
+    FieldType.TEXT: "TEXT",
+    FieldType.REAL: "REAL",
+    FieldType.BLOB: "BLOB",
+    FieldType.BOOLEAN: "INTEGER",  # SQLite não tem BOOLEAN
+    FieldType.DATETIME: "TEXT",    # Armazena como ISO format (ou INTEGER com epoch_ms)
+    FieldType.JSON: "TEXT",        # Armazena o JSON serializado
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _datetime_to_epoch_ms(value: datetime) -> int:
+    """Converte um datetime em milissegundos desde 1970 (datetimes sem fuso são tratados como UTC)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(milliseconds=1)
+
+
+_JSON_KEY = re.compile(r'^\w+$')
+
+
+def _parse_json_path(segments: List[str]) -> Tuple[str, ...]:
+    """Valida os segmentos de um caminho JSON (chaves ou índices de lista)"""
+    if not segments or not all(_JSON_KEY.match(segment) for segment in segments):
+        raise ValueError(f"Caminho JSON inválido: {'.'.join(segments)}")
+    return tuple(segments)
+
+
+def _json_path_expression(path: Tuple[str, ...]) -> str:
+    """Converte ('items', '0', 'sku') em '$.items[0].sku'"""
+    return '$' + ''.join(f"[{segment}]" if segment.isdigit() else f".{segment}" for segment in path)
+
+
 class Field:
     """Representa um campo na tabela"""
     
@@ -202,135 +412,1723 @@ class Field:
         nullable: bool = True,
         default: Any = None,
         unique: bool = False,
-        foreign_key: Optional['ForeignKey'] = None
+        foreign_key: Optional['ForeignKey'] = None,
+        lazy: bool = False,
+        index: bool = False,
+        json_indexes: Optional[List[str]] = None,
+        storage: str = 'iso'
     ):
+        """
+        Args:
+            lazy: Se True, o campo fica fora do SELECT por padrão e é
+                  carregado no primeiro acesso ao atributo (útil para BLOBs)
+            index: Se True, cria um índice para a coluna junto com a tabela
+            json_indexes: Caminhos de um campo JSON (ex: "address.city") que
+                          ganham uma coluna gerada indexada; filtros nesses
+                          caminhos usam o índice
+            storage: Armazenamento de DATETIME: 'iso' (TEXT ISO 8601) ou
+                     'epoch_ms' (INTEGER em milissegundos UTC, mais compacto
+                     e com comparações inteiras)
+        """
+        if lazy and primary_key:
+            raise ValueError("A chave primária não pode ser lazy")
+        if json_indexes and field_type != FieldType.JSON:
+            raise ValueError("json_indexes só é permitido em campos FieldType.JSON")
+        if storage not in ('iso', 'epoch_ms'):
+            raise ValueError(f"storage inválido: {storage}. Valores válidos: iso, epoch_ms")
+        if storage == 'epoch_ms' and field_type != FieldType.DATETIME:
+            raise ValueError("storage='epoch_ms' só é permitido em campos FieldType.DATETIME")
+        
         self.field_type = field_type
         self.primary_key = primary_key
         self.nullable = nullable
         self.default = default
         self.unique = unique
         self.foreign_key = foreign_key
+        self.lazy = lazy
+        self.index = index
+        self.storage = storage
+        self.json_indexes: List[Tuple[str, ...]] = [
+            _parse_json_path(path.split('.')) for path in (json_indexes or [])
+        ]
         self.name: Optional[str] = None
     
-    def get_sql_definition(self) -> str:
-        """Retorna a definição SQL do campo"""
-        # Mapeia tipos Python para tipos SQLite
-        type_map = {
-            FieldType.INTEGER: "INTEGER",
-            FieldType.TEXT: "TEXT",
-            FieldType.REAL: "REAL",
-            FieldType.BLOB: "BLOB",
-            FieldType.BOOLEAN: "INTEGER",  # SQLite não tem BOOLEAN
-            FieldType.DATETIME: "TEXT",    # Armazena como ISO format
+    def to_db(self, value: Any) -> Any:
+        """Converte um valor Python para o formato armazenado no banco"""
+        if self.field_type == FieldType.JSON:
+            return None if value is None else json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        if isinstance(value, bool):
+            return 1 if value else 0
+        if isinstance(value, datetime):
+            if self.storage == 'epoch_ms':
+                return _datetime_to_epoch_ms(value)
+            return value.isoformat()
+        return value
+    
+    def to_python(self, value: Any) -> Any:
+        """Converte um valor lido do banco para o tipo Python do campo"""
+        if self.field_type == FieldType.BOOLEAN and value is not None:
+            return bool(value)
+        if self.field_type == FieldType.DATETIME and value is not None:
+            # Aceita as duas representações (útil durante a migração de storage)
+            if isinstance(value, int):
+                seconds, millis = divmod(value, 1000)
+                return _EPOCH + timedelta(0, seconds, millis * 1000)
+            try:
+                return datetime.fromisoformat(value)
+            except (ValueError, TypeError):
+                return value
+        if self.field_type == FieldType.JSON and isinstance(value, str):
+            return json.loads(value)
+        return value
+    
+    def generated_column(self, path: Tuple[str, ...]) -> str:
+        """Nome da coluna gerada para um caminho em json_indexes"""
+        return f"{self.name}__{'__'.join(path)}"
+    
+    def generated_column_definitions(self) -> List[str]:
+        """Definições das colunas geradas (VIRTUAL) dos caminhos em json_indexes"""
+        return [
+            f"{self.generated_column(path)} GENERATED ALWAYS AS "
+            f"(json_extract({self.name}, '{_json_path_expression(path)}')) VIRTUAL"
+            for path in self.json_indexes
+        ]
+    
+    def sql_type(self) -> str:
+        """Tipo da coluna no SQLite"""
+        if self.storage == 'epoch_ms':
+            return "INTEGER"
+        return _SQL_TYPES.get(self.field_type, self.field_type.value)
+    
+    def get_sql_definition(self) -> str:
+        """Retorna a definição SQL do campo"""
+        parts = [self.name or "", self.sql_type()]
+        
+        if self.primary_key:
+            parts.append("PRIMARY KEY AUTOINCREMENT")
+        
+        if not self.nullable and not self.primary_key:
+            parts.append("NOT NULL")
+        
+        if self.unique:
+            parts.append("UNIQUE")
+        
+        if self.default is not None and not self.primary_key:
+            if isinstance(self.default, datetime):
+                parts.append(f"DEFAULT {self.to_db(self.default)!r}")
+            elif self.field_type == FieldType.JSON:
+                encoded = self.to_db(self.default).replace("'", "''")
+                parts.append(f"DEFAULT '{encoded}'")
+            elif isinstance(self.default, str):
+                parts.append(f"DEFAULT '{self.default}'")
+            else:
+                parts.append(f"DEFAULT {self.default}")
+        
+        return " ".join(parts)
+
+
+class Database:
+    """Gerenciador de conexão com SQLite"""
+    
+    _instance: Optional['Database'] = None
+    
+    def __init__(self, db_path: str = ":memory:", read_only: bool = False):
+        """
+        Inicializa a conexão com o banco de dados
+        
+        Args:
+            db_path: Caminho do arquivo SQLite (":memory:" para banco em memória)
+            read_only: Abre o arquivo em modo somente leitura (mode=ro)
+        """
+        self.db_path = db_path
+        self.read_only = read_only
+        self.connection: Optional[sqlite3.Connection] = None
+        
+        # Instrumentação de queries
+        self._before_hooks: List[Callable] = []
+        self._after_hooks: List[Callable] = []
+        self._slow_query_threshold: Optional[float] = None  # Em segundos
+        self._slow_query_explain = True
+        self.slow_queries: Deque[Dict[str, Any]] = deque(maxlen=1000)
+        self.model_stats: Dict[str, Dict[str, int]] = {}
+        
+        # A conexão é compartilhada entre threads (ex.: a fila write-behind em
+        # :memory:): cada query, commit e bloco transaction() roda sob este lock
+        self._lock = threading.RLock()
+        # Profundidade de transaction() aninhadas, por thread; commit() é adiado até a mais externa
+        self._local = threading.local()
+        
+        # Fila de escrita em segundo plano (ver enable_write_behind)
+        self.write_behind: Optional['WriteBehindQueue'] = None
+        
+        # Espelho em memória (ver load_into_memory)
+        self._mirror_source: Optional['Database'] = None
+        self._mirror_pages = 256
+        self._mirror_sleep = 0.005
+        self._refresh_stop: Optional[threading.Event] = None
+        self._refresh_thread: Optional[threading.Thread] = None
+        
+        self._connect()
+    
+    @property
+    def _transaction_depth(self) -> int:
+        return getattr(self._local, 'depth', 0)
+    
+    @_transaction_depth.setter
+    def _transaction_depth(self, value: int):
+        self._local.depth = value
+    
+    @classmethod
+    def get_instance(cls, db_path: str = ":memory:") -> 'Database':
+        """Singleton pattern para gerenciar uma única conexão"""
+        if cls._instance is None:
+            cls._instance = cls(db_path)
+        return cls._instance
+    
+    def _connect(self):
+        """Estabelece conexão com o banco de dados"""
+        try:
+            if self.read_only:
+                # as_uri() escapa '#', '?' e '%', que o SQLite trataria como parte da URI
+                uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+                self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            else:
+                self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.row_factory = sqlite3.Row
+            # Ativa suporte a chaves estrangeiras
+            self.connection.execute("PRAGMA foreign_keys = ON")
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Erro ao conectar ao banco de dados: {e}")
+    
+    def execute(self, query: str, params: tuple = (), model: Optional[str] = None) -> sqlite3.Cursor:
+        """
+        Executa uma query no banco de dados
+        
+        Args:
+            query: SQL a executar
+            params: Parâmetros dos placeholders
+            model: Nome do modelo que originou a query (para estatísticas)
+        """
+        cursor, _ = self._run(query, params, model, fetch=False)
+        return cursor
+    
+    def fetchall(self, query: str, params: tuple = (), model: Optional[str] = None) -> List[sqlite3.Row]:
+        """
+        Executa uma query e retorna todas as linhas
+        
+        Diferente de execute(), o tempo medido inclui a leitura de todas as
+        linhas, e as linhas retornadas contam como hidratadas para o modelo.
+        """
+        _, rows = self._run(query, params, model, fetch=True)
+        return rows
+    
+    def executemany(self, query: str, seq_of_params: List[tuple], model: Optional[str] = None) -> sqlite3.Cursor:
+        """Executa a mesma query para cada conjunto de parâmetros"""
+        cursor, _ = self._run(query, seq_of_params, model, fetch=False, many=True)
+        return cursor
+    
+    def _run(self, query: str, params: Any, model: Optional[str], fetch: bool, many: bool = False):
+        """Ponto único de execução de SQL, com hooks e medição de tempo"""
+        if self.connection is None:
+            raise RuntimeError("Banco de dados não conectado")
+        
+        for hook in self._before_hooks:
+            hook(query, params)
+        
+        # Contadores e EXPLAIN também usam a conexão e estado compartilhados,
+        # então rodam no mesmo trecho protegido pelo lock que a query
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                cursor = self.connection.cursor()
+                if many:
+                    cursor.executemany(query, params)
+                else:
+                    cursor.execute(query, params)
+                rows = cursor.fetchall() if fetch else None
+            except sqlite3.Error as e:
+                raise RuntimeError(f"Erro ao executar query: {e}\nQuery: {query}")
+            duration = time.perf_counter() - start
+            
+            rowcount = len(rows) if rows is not None else cursor.rowcount
+            
+            if model is not None:
+                stats = self.model_stats.get(model)
+                if stats is None:
+                    stats = self.model_stats[model] = {"queries": 0, "rows": 0}
+                stats["queries"] += 1
+                if rows is not None:
+                    stats["rows"] += len(rows)
+            
+            if self._slow_query_threshold is not None and duration >= self._slow_query_threshold:
+                self._log_slow_query(query, params, duration, rowcount, explain=not many)
+        
+        for hook in self._after_hooks:
+            hook(query, params, duration, rowcount)
+        
+        return cursor, rows
+    
+    def add_before_hook(self, callback: Callable[[str, tuple], None]):
+        """
+        Registra um callback chamado antes de cada query
+        
+        Args:
+            callback: Função callback(sql, params)
+        """
+        self._before_hooks.append(callback)
+    
+    def add_after_hook(self, callback: Callable[[str, tuple, float, int], None]):
+        """
+        Registra um callback chamado após cada query
+        
+        Args:
+            callback: Função callback(sql, params, duração_em_segundos, rowcount)
+        """
+        self._after_hooks.append(callback)
+    
+    def remove_hook(self, callback: Callable):
+        """Remove um callback registrado com add_before_hook/add_after_hook"""
+        if callback in self._before_hooks:
+            self._before_hooks.remove(callback)
+        if callback in self._after_hooks:
+            self._after_hooks.remove(callback)
+    
+    def enable_slow_query_log(self, threshold_ms: float = 100.0, explain: bool = True,
+                              max_entries: int = 1000):
+        """
+        Ativa o log de queries lentas
+        
+        Queries com duração >= threshold_ms são registradas em slow_queries
+        e no logger "pysql_lite", junto com o EXPLAIN QUERY PLAN.
+        
+        Args:
+            threshold_ms: Limite em milissegundos
+            explain: Se True, captura o plano de execução das queries lentas
+            max_entries: Quantidade máxima de entradas mantidas em memória
+        """
+        self._slow_query_threshold = threshold_ms / 1000.0
+        self._slow_query_explain = explain
+        self.slow_queries = deque(self.slow_queries, maxlen=max_entries)
+    
+    def disable_slow_query_log(self):
+        """Desativa o log de queries lentas"""
+        self._slow_query_threshold = None
+    
+    def _log_slow_query(self, query: str, params: Any, duration: float, rowcount: int,
+                        explain: bool = True):
+        """Registra uma query lenta com seu plano de execução (chamado com _lock adquirido)"""
+        plan: List[str] = []
+        if explain and self._slow_query_explain and query.lstrip()[:6].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+            try:
+                # Executa direto na conexão para não disparar hooks novamente
+                plan_rows = self.connection.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+                plan = [row[3] for row in plan_rows]
+            except sqlite3.Error:
+                pass
+        
+        entry = {
+            "sql": query.strip(),
+            "params": params,
+            "duration_ms": duration * 1000.0,
+            "rowcount": rowcount,
+            "plan": plan,
+        }
+        self.slow_queries.append(entry)
+        logger.warning(
+            "Query lenta (%.2f ms): %s | plano: %s",
+            entry["duration_ms"], entry["sql"], "; ".join(plan) or "-"
+        )
+    
+    def reset_stats(self):
+        """Zera os contadores por modelo e o log de queries lentas"""
+        with self._lock:
+            self.model_stats.clear()
+            self.slow_queries.clear()
+    
+    def commit(self):
+        """Confirma transação (adiado enquanto houver um transaction() ativo)"""
+        if self.connection and self._transaction_depth == 0:
+            with self._lock:
+                self.connection.commit()
+    
+    def rollback(self):
+        """Desfaz transação"""
+        if self.connection:
+            with self._lock:
+                self.connection.rollback()
+    
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """
+        Agrupa várias operações em uma única transação
+        
+        Dentro do bloco, os commit() feitos pelos modelos são adiados e um
+        único COMMIT é executado ao final (ou ROLLBACK em caso de exceção).
+        Outras threads que usam esta conexão aguardam o fim do bloco.
+        
+        Args:
+            immediate: Usa BEGIN IMMEDIATE, reservando o lock de escrita do
+                       arquivo já no início (leituras do bloco não ficam
+                       desatualizadas por escritas de outras conexões)
+        
+        Exemplo:
+            with db.transaction():
+                for usuario in usuarios:
+                    usuario.save()
+        """
+        if self.connection is None:
+            raise RuntimeError("Banco de dados não conectado")
+        
+        with self._lock:
+            outermost = self._transaction_depth == 0
+            if outermost and not self.connection.in_transaction:
+                self.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            self._transaction_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._transaction_depth -= 1
+                if outermost:
+                    self.connection.rollback()
+                raise
+            else:
+                self._transaction_depth -= 1
+                if outermost:
+                    self.connection.commit()
+    
+    def close(self):
+        """Fecha conexão com o banco de dados"""
+        if self.write_behind is not None:
+            self.disable_write_behind()
+        self.stop_refresh()
+        with self._lock:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+        # Fechar outro banco não descarta o singleton de get_instance()
+        if Database._instance is self:
+            Database._instance = None
+    
+    def snapshot(self, path: str, pages: int = 256, sleep: float = 0.005,
+                 progress: Optional[Callable[[int, int, int], None]] = None) -> str:
+        """
+        Copia o banco para um arquivo usando a API de backup incremental
+        
+        A cópia é feita em passos de `pages` páginas com uma pausa entre
+        eles, então o lock de leitura do arquivo é liberado entre os passos
+        e escritores em outras conexões continuam trabalhando durante o
+        backup. Threads que usam esta mesma conexão aguardam o fim da cópia.
+        
+        Args:
+            path: Arquivo de destino
+            pages: Páginas copiadas por passo
+            sleep: Pausa entre passos (segundos)
+            progress: Callback progress(status, restantes, total) por passo
+        
+        Returns:
+            Caminho do snapshot
+        """
+        target = sqlite3.connect(path)
+        try:
+            # A conexão é compartilhada entre threads: o backup não pode correr junto com queries nela
+            with self._lock:
+                if self.connection is None:
+                    raise RuntimeError("Banco de dados não conectado")
+                self.connection.backup(target, pages=pages, progress=progress, sleep=sleep)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Erro ao criar snapshot em {path}: {e}")
+        finally:
+            target.close()
+        
+        return path
+    
+    def load_into_memory(self, refresh_interval: Optional[float] = None,
+                         pages: int = 256, sleep: float = 0.005) -> 'Database':
+        """
+        Cria um espelho somente leitura do banco em :memory:
+        
+        Consultas analíticas no espelho não disputam o lock do arquivo com
+        as transações da aplicação.
+        
+        Args:
+            refresh_interval: Se informado, recarrega o espelho a cada N segundos
+                              em uma thread de segundo plano
+            pages: Páginas copiadas por passo do backup
+            sleep: Pausa entre passos do backup (segundos)
+        
+        Returns:
+            Database em memória, com PRAGMA query_only ativo
+        """
+        if self.connection is None:
+            raise RuntimeError("Banco de dados não conectado")
+        
+        mirror = Database(":memory:")
+        mirror._mirror_source = self
+        mirror._mirror_pages = pages
+        mirror._mirror_sleep = sleep
+        mirror.refresh()
+        
+        if refresh_interval is not None:
+            mirror._refresh_stop = threading.Event()
+            mirror._refresh_thread = threading.Thread(
+                target=mirror._refresh_loop,
+                args=(refresh_interval,),
+                name="pysql_lite_mirror_refresh",
+                daemon=True
+            )
+            mirror._refresh_thread.start()
+        
+        return mirror
+    
+    def refresh(self):
+        """
+        Recarrega um espelho criado por load_into_memory()
+        
+        A cópia é feita em uma conexão nova que substitui a atual ao final,
+        então leituras em andamento não são bloqueadas.
+        """
+        source = self._mirror_source
+        if source is None:
+            raise RuntimeError("refresh() só está disponível em espelhos criados por load_into_memory()")
+        
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+        try:
+            with source._lock:
+                if source.connection is None:
+                    raise RuntimeError("Banco de origem do espelho foi fechado")
+                source.connection.backup(connection, pages=self._mirror_pages, sleep=self._mirror_sleep)
+        except sqlite3.Error as e:
+            connection.close()
+            raise RuntimeError(f"Erro ao carregar espelho em memória: {e}")
+        except RuntimeError:
+            connection.close()
+            raise
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA query_only = ON")
+        
+        # A troca espera as queries em andamento no espelho; a conexão antiga
+        # é liberada quando os cursores devolvidos por execute() terminarem
+        with self._lock:
+            self.connection = connection
+    
+    def stop_refresh(self):
+        """Encerra a recarga periódica do espelho em memória"""
+        if self._refresh_thread is not None:
+            self._refresh_stop.set()
+            self._refresh_thread.join()
+            self._refresh_thread = None
+    
+    def _refresh_loop(self, interval: float):
+        """Loop da thread de recarga do espelho"""
+        while not self._refresh_stop.wait(interval):
+            try:
+                self.refresh()
+            except RuntimeError as e:
+                logger.error("Falha ao recarregar espelho em memória: %s", e)
+    
+    def create_table(self, table_name: str, fields: Dict[str, Field], track_changes: bool = False):
+        """Cria uma tabela (e seus índices) no banco de dados"""
+        try:
+            with self.transaction():
+                for sql in self._table_statements(table_name, fields, track_changes):
+                    self.execute(sql)
+        except RuntimeError as e:
+            raise RuntimeError(f"Erro ao criar tabela {table_name}: {e}")
+    
+    def create_all(self, models: Optional[List[Type['Model']]] = None):
+        """
+        Cria as tabelas e índices de todos os modelos em uma única transação
+        
+        Deve ser chamado na inicialização da aplicação: os modelos ficam
+        ligados a este banco e a primeira operação de cada um não precisa
+        mais executar CREATE TABLE.
+        
+        Args:
+            models: Modelos a criar (padrão: os de ModelMeta.registry ainda
+                    não ligados a outro banco, ver _default_models)
+        """
+        if models is None:
+            models = _default_models(self)
+        
+        try:
+            with self.transaction():
+                for model in models:
+                    for sql in self._table_statements(model._table_name, model._fields,
+                                                      model._track_changes):
+                        self.execute(sql)
+        except RuntimeError as e:
+            raise RuntimeError(f"Erro ao criar tabelas: {e}")
+        
+        for model in models:
+            model._database = self
+            model._initialized = True
+    
+    def migrate(self, models: Optional[List[Type['Model']]] = None, batch_size: int = 1000,
+                pause: float = 0.01, progress: Optional[Callable[[Dict[str, Any]], None]] = None
+                ) -> List['MigrationOperation']:
+        """
+        Aplica ao banco as diferenças entre os modelos e o schema atual
+        
+        Equivalente a create_all() para bancos que já existem: cria o que
+        falta (tabelas, colunas, índices) e converte colunas cujo tipo mudou
+        em lotes. Para backfills, use um Migrator diretamente.
+        
+        Args:
+            models: Modelos a migrar (padrão: como em create_all())
+        
+        Returns:
+            Operações executadas
+        """
+        if models is None:
+            models = _default_models(self)
+        
+        migrator = Migrator(self, batch_size=batch_size, pause=pause, progress=progress)
+        operations = migrator.run(migrator.plan(models))
+        
+        for model in models:
+            model._database = self
+            model._initialized = True
+        
+        return operations
+    
+    def enable_write_behind(self, batch_size: int = 500, flush_interval_ms: float = 50.0) -> 'WriteBehindQueue':
+        """
+        Ativa o modo write-behind para os modelos com _write_behind = True
+        
+        O save() de novas instâncias desses modelos passa a enfileirar a linha
+        e retornar um PendingWrite; uma thread grava as linhas em lote
+        (executemany por tabela) a cada batch_size linhas ou flush_interval_ms.
+        
+        Args:
+            batch_size: Quantidade de linhas por commit
+            flush_interval_ms: Tempo máximo que uma linha espera na fila
+        """
+        if self.write_behind is None:
+            self.write_behind = WriteBehindQueue(self, batch_size, flush_interval_ms)
+        return self.write_behind
+    
+    def disable_write_behind(self):
+        """Grava as linhas pendentes e encerra a thread de escrita"""
+        if self.write_behind is not None:
+            self.write_behind.close()
+            self.write_behind = None
+    
+    def flush(self, timeout: Optional[float] = None):
+        """Aguarda a gravação de todas as linhas enfileiradas no modo write-behind"""
+        if self.write_behind is not None:
+            self.write_behind.flush(timeout)
+    
+    def route(self, model: Type['Model'], instance: Optional['Model'] = None,
+              pk: Any = None) -> 'Database':
+        """Retorna o banco que armazena a linha (sempre self em um banco comum)"""
+        return self
+    
+    def shards_for(self, model: Type['Model']) -> List['Database']:
+        """Retorna os bancos que armazenam a tabela do modelo"""
+        return [self]
+    
+    def insert_pk_expression(self, model: Type['Model'], shard: 'Database') -> Optional[Tuple[str, tuple, int]]:
+        """
+        Expressão SQL para gerar a chave primária no INSERT
+        
+        Returns:
+            None para usar o AUTOINCREMENT, ou (expressão, parâmetros, incremento)
+        """
+        return None
+    
+    def _table_statements(self, table_name: str, fields: Dict[str, Field],
+                          track_changes: bool = False) -> List[str]:
+        """Gera o CREATE TABLE, os CREATE INDEX e, opcionalmente, o changelog de uma tabela"""
+        field_defs = []
+        constraints = []
+        indexes = []
+        
+        generated = []
+        
+        for field_name, field in fields.items():
+            field.name = field_name
+            field_defs.append(field.get_sql_definition())
+            
+            # Colunas geradas para os caminhos JSON consultados com frequência
+            generated.extend(field.generated_column_definitions())
+            for path in field.json_indexes:
+                column = field.generated_column(path)
+                indexes.append(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table_name}_{column} "
+                    f"ON {table_name} ({column})"
+                )
+            
+            # Adiciona constraint de chave estrangeira se existir
+            if field.foreign_key:
+                constraint_sql = field.foreign_key.get_constraint_sql(table_name, field_name)
+                constraints.append(constraint_sql)
+            
+            if field.index and not field.primary_key:
+                indexes.append(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table_name}_{field_name} "
+                    f"ON {table_name} ({field_name})"
+                )
+        
+        # Combina definições de campos e constraints
+        all_parts = field_defs + generated + constraints
+        statements = [f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(all_parts)})"] + indexes
+        
+        if track_changes:
+            pk_field = next((name for name, field in fields.items() if field.primary_key), "id")
+            statements.extend(self._changelog_statements(table_name, pk_field))
+        
+        return statements
+    
+    def _changelog_statements(self, table_name: str, pk_field: str) -> List[str]:
+        """Gera a tabela de changelog e os triggers que a mantêm"""
+        changelog = f"{table_name}_changelog"
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {changelog} ("
+            f"version INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, pk NOT NULL)",
+            f"CREATE INDEX IF NOT EXISTS idx_{changelog}_pk ON {changelog} (pk)",
+        ]
+        for event, op, row in (("INSERT", "insert", "NEW"),
+                               ("UPDATE", "update", "NEW"),
+                               ("DELETE", "delete", "OLD")):
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{changelog}_{op} AFTER {event} ON {table_name} "
+                f"BEGIN INSERT INTO {changelog} (op, pk) VALUES ('{op}', {row}.{pk_field}); END"
+            )
+        return statements
+
+
+_COMPARISON_OPERATORS = frozenset(('eq', 'gt', 'gte', 'lt', 'lte', 'ne'))
+
+_LOOKUP_OPERATORS = frozenset(
+    ('eq', 'gt', 'gte', 'lt', 'lte', 'ne', 'like', 'contains', 'startswith', 'endswith', 'in')
+)
+
+
+def _default_models(database: Any) -> List[Type['Model']]:
+    """
+    Modelos registrados que create_all()/migrate() assumem sem lista explícita
+
+    Modelos já ligados a outro banco ficam de fora: ligá-los a este
+    moveria todas as suas operações para cá.
+    """
+    return [model for model in ModelMeta.registry.values()
+            if model._database is None or model._database is database]
+
+
+def _json_scalar(value: Any) -> Any:
+    """Converte um valor para comparar com o resultado de json_extract"""
+    if isinstance(value, bool):
+        return 1 if value else 0
+    if isinstance(value, (dict, list)):
+        # json_extract devolve objetos e listas como JSON compacto
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    return value
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """Chave de ordenação compatível com o SQLite: NULL < números < texto < BLOB"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, value)
+
+
+def _sort_rows(rows: List[sqlite3.Row], order_fields: List[Tuple[str, str]]) -> List[sqlite3.Row]:
+    """
+    Ordena linhas vindas de vários shards conforme o ORDER BY
+    
+    Cada shard já devolve uma sequência ordenada; o Timsort detecta essas
+    sequências e faz essencialmente um merge.
+    """
+    for field_name, direction in reversed(order_fields):
+        rows = sorted(rows, key=lambda row: _sort_key(row[field_name]), reverse=direction == 'DESC')
+    return rows
+
+
+# Maior chave primária gerada por tabela fragmentada, em cada shard
+_SEQUENCE_TABLE = "pysql_lite_sequence"
+
+
+class ShardedDatabase:
+    """
+    Distribui modelos entre vários arquivos SQLite (shards)
+    
+    Cada arquivo tem seu próprio lock de escrita, então escritas em shards
+    diferentes não competem entre si. Um modelo pode ser:
+    
+    - fixado em um shard (route_model): todas as linhas ficam no mesmo arquivo
+    - fragmentado por chave (shard_by): cada linha vai para o shard do hash
+      da chave; as chaves primárias são intercaladas (id % N identifica o
+      shard), então find_by_id consulta um único arquivo. Cada shard guarda
+      o maior ID já gerado em pysql_lite_sequence (como o AUTOINCREMENT),
+      então IDs de linhas removidas nunca são reutilizados
+    
+    Leituras de modelos fragmentados são executadas em paralelo (threads) em
+    todos os shards e combinadas respeitando ORDER BY e LIMIT. Modelos sem
+    rota ficam no shard 0.
+    
+    Limitações: transações não são atômicas entre shards e chaves estrangeiras
+    só funcionam entre linhas do mesmo shard.
+    
+    Exemplo:
+        db = ShardedDatabase(["eventos_0.db", "eventos_1.db", "eventos_2.db"])
+        db.shard_by(Evento, "tenant_id")
+        db.route_model(Usuario, 0)
+        db.create_all([Evento, Usuario])
+    """
+    
+    def __init__(self, db_paths: List[str], max_workers: Optional[int] = None):
+        """
+        Args:
+            db_paths: Caminhos dos arquivos SQLite, um por shard
+            max_workers: Threads usadas nas leituras paralelas (padrão: um por shard)
+        """
+        if not db_paths:
+            raise ValueError("ShardedDatabase requer pelo menos um shard")
+        
+        self.shards: List[Database] = [Database(path) for path in db_paths]
+        self._model_routes: Dict[str, int] = {}
+        self._shard_keys: Dict[str, str] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(self.shards),
+            thread_name_prefix="pysql_lite_shard"
+        )
+    
+    def route_model(self, model: Type['Model'], shard_index: int):
+        """Fixa todas as linhas do modelo em um shard"""
+        if not 0 <= shard_index < len(self.shards):
+            raise ValueError(f"Shard {shard_index} não existe (total: {len(self.shards)})")
+        self._shard_keys.pop(model._table_name, None)
+        self._model_routes[model._table_name] = shard_index
+    
+    def shard_by(self, model: Type['Model'], field_name: str):
+        """Distribui as linhas do modelo entre os shards pelo hash de um campo"""
+        if field_name not in model._fields:
+            raise ValueError(f"Campo '{field_name}' não existe no modelo {model.__name__}")
+        if model._fields[field_name].primary_key:
+            raise ValueError("A chave primária não pode ser usada como chave de shard")
+        self._model_routes.pop(model._table_name, None)
+        self._shard_keys[model._table_name] = field_name
+        self._install_sequence(model._table_name, model._fields)
+    
+    def shard_index_for(self, value: Any) -> int:
+        """Índice do shard para um valor de chave (hash estável entre processos)"""
+        return zlib.crc32(repr(value).encode("utf-8")) % len(self.shards)
+    
+    # ------------------------------------------------------------------
+    # Roteamento usado por Model
+    # ------------------------------------------------------------------
+    
+    def route(self, model: Type['Model'], instance: Optional['Model'] = None,
+              pk: Any = None) -> Database:
+        """Retorna o shard que armazena a linha"""
+        table = model._table_name
+        shard_key = self._shard_keys.get(table)
+        
+        if shard_key is None:
+            return self.shards[self._model_routes.get(table, 0)]
+        
+        if pk is not None:
+            # IDs intercalados: o shard i gera IDs i+1, i+1+N, i+1+2N, ...
+            return self.shards[(int(pk) - 1) % len(self.shards)]
+        
+        if instance is None:
+            raise ValueError(f"Roteamento de {model.__name__} requer instância ou chave primária")
+        
+        return self.shards[self.shard_index_for(getattr(instance, shard_key, None))]
+    
+    def shards_for(self, model: Type['Model']) -> List[Database]:
+        """Retorna os shards que armazenam a tabela do modelo"""
+        table = model._table_name
+        if table in self._shard_keys:
+            return list(self.shards)
+        return [self.shards[self._model_routes.get(table, 0)]]
+    
+    def insert_pk_expression(self, model: Type['Model'], shard: Database) -> Optional[Tuple[str, tuple, int]]:
+        """Gera IDs intercalados para modelos fragmentados por chave"""
+        if model._table_name not in self._shard_keys:
+            return None
+        
+        count = len(self.shards)
+        index = self.shards.index(shard)
+        # Parte do maior ID já gerado no shard, não do MAX() atual da tabela
+        expression = f"(SELECT IFNULL(MAX(seq), ?) + ? FROM {_SEQUENCE_TABLE} WHERE name = '{model._table_name}')"
+        return expression, (index + 1 - count, count), count
+    
+    def _install_sequence(self, table_name: str, fields: Dict[str, Field]):
+        """
+        Cria, nos shards que já têm a tabela, o registro do maior ID gerado
+        e o trigger que o atualiza na mesma transação de cada INSERT
+        """
+        if table_name not in self._shard_keys:
+            return
+        
+        pk_field = next((name for name, field in fields.items() if field.primary_key), "id")
+        upsert = "ON CONFLICT(name) DO UPDATE SET seq = MAX(seq, excluded.seq)"
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {_SEQUENCE_TABLE} (name TEXT PRIMARY KEY, seq INTEGER NOT NULL)",
+            # Tabelas criadas antes do trigger partem do maior ID existente
+            f"INSERT INTO {_SEQUENCE_TABLE} (name, seq) SELECT '{table_name}', {pk_field} FROM {table_name} "
+            f"WHERE true ORDER BY {pk_field} DESC LIMIT 1 {upsert}",
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table_name}_sequence AFTER INSERT ON {table_name} "
+            f"BEGIN INSERT INTO {_SEQUENCE_TABLE} (name, seq) VALUES ('{table_name}', NEW.{pk_field}) {upsert}; END",
+        ]
+        for shard in self.shards:
+            if not shard.fetchall("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)):
+                continue
+            with shard.transaction():
+                for sql in statements:
+                    shard.execute(sql)
+    
+    def fan_out(self, shards: List[Database], query: str, params: tuple = (),
+                model: Optional[str] = None) -> List[List[sqlite3.Row]]:
+        """Executa a mesma consulta em vários shards em paralelo"""
+        futures = [self._executor.submit(shard.fetchall, query, params, model) for shard in shards]
+        return [future.result() for future in futures]
+    
+    # ------------------------------------------------------------------
+    # API compatível com Database
+    # ------------------------------------------------------------------
+    
+    def fetchall(self, query: str, params: tuple = (), model: Optional[str] = None) -> List[sqlite3.Row]:
+        """Executa a consulta em todos os shards e concatena as linhas"""
+        return [row for rows in self.fan_out(self.shards, query, params, model) for row in rows]
+    
+    def create_table(self, table_name: str, fields: Dict[str, Field], track_changes: bool = False):
+        """Cria a tabela em todos os shards"""
+        for shard in self.shards:
+            shard.create_table(table_name, fields, track_changes)
+        self._install_sequence(table_name, fields)
+    
+    def create_all(self, models: Optional[List[Type['Model']]] = None):
+        """Cria tabelas e índices em todos os shards e liga os modelos a este banco"""
+        if models is None:
+            models = _default_models(self)
+        
+        for shard in self.shards:
+            shard.create_all(models)
+        
+        for model in models:
+            self._install_sequence(model._table_name, model._fields)
+            model._database = self
+            model._initialized = True
+    
+    def migrate(self, models: Optional[List[Type['Model']]] = None, batch_size: int = 1000,
+                pause: float = 0.01, progress: Optional[Callable[[Dict[str, Any]], None]] = None
+                ) -> List['MigrationOperation']:
+        """Migra cada shard e liga os modelos a este banco"""
+        if models is None:
+            models = _default_models(self)
+        
+        operations = []
+        for shard in self.shards:
+            operations.extend(shard.migrate(models, batch_size, pause, progress))
+        
+        for model in models:
+            self._install_sequence(model._table_name, model._fields)
+            model._database = self
+            model._initialized = True
+        
+        return operations
+    
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """Abre uma transação em cada shard (não atômica entre shards)"""
+        with ExitStack() as stack:
+            for shard in self.shards:
+                stack.enter_context(shard.transaction(immediate))
+            yield self
+    
+    def commit(self):
+        """Confirma a transação em todos os shards"""
+        for shard in self.shards:
+            shard.commit()
+    
+    def rollback(self):
+        """Desfaz a transação em todos os shards"""
+        for shard in self.shards:
+            shard.rollback()
+    
+    def snapshot(self, path_template: str, pages: int = 256, sleep: float = 0.005) -> List[str]:
+        """
+        Cria um snapshot de cada shard
+        
+        Args:
+            path_template: Caminho com o marcador {index}, ex: "backup_{index}.db"
+        """
+        if "{index}" not in path_template:
+            raise ValueError("path_template deve conter o marcador {index}")
+        return [
+            shard.snapshot(path_template.format(index=index), pages, sleep)
+            for index, shard in enumerate(self.shards)
+        ]
+    
+    def enable_write_behind(self, batch_size: int = 500, flush_interval_ms: float = 50.0):
+        """Ativa uma fila de escrita em segundo plano por shard"""
+        for shard in self.shards:
+            shard.enable_write_behind(batch_size, flush_interval_ms)
+    
+    def disable_write_behind(self):
+        """Grava as linhas pendentes e encerra as filas de todos os shards"""
+        for shard in self.shards:
+            shard.disable_write_behind()
+    
+    def flush(self, timeout: Optional[float] = None):
+        """Aguarda a gravação das linhas enfileiradas em todos os shards"""
+        for shard in self.shards:
+            shard.flush(timeout)
+    
+    def close(self):
+        """Fecha as conexões de todos os shards"""
+        self._executor.shutdown(wait=True)
+        for shard in self.shards:
+            shard.close()
+    
+    def add_before_hook(self, callback: Callable[[str, tuple], None]):
+        """Registra o hook em todos os shards"""
+        for shard in self.shards:
+            shard.add_before_hook(callback)
+    
+    def add_after_hook(self, callback: Callable[[str, tuple, float, int], None]):
+        """Registra o hook em todos os shards"""
+        for shard in self.shards:
+            shard.add_after_hook(callback)
+    
+    def remove_hook(self, callback: Callable):
+        """Remove o hook de todos os shards"""
+        for shard in self.shards:
+            shard.remove_hook(callback)
+    
+    def enable_slow_query_log(self, threshold_ms: float = 100.0, explain: bool = True,
+                              max_entries: int = 1000):
+        """Ativa o log de queries lentas em todos os shards"""
+        for shard in self.shards:
+            shard.enable_slow_query_log(threshold_ms, explain, max_entries)
+    
+    def disable_slow_query_log(self):
+        """Desativa o log de queries lentas em todos os shards"""
+        for shard in self.shards:
+            shard.disable_slow_query_log()
+    
+    @property
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        """Queries lentas de todos os shards"""
+        return [entry for shard in self.shards for entry in shard.slow_queries]
+    
+    @property
+    def model_stats(self) -> Dict[str, Dict[str, int]]:
+        """Contadores por modelo somados entre os shards"""
+        totals: Dict[str, Dict[str, int]] = {}
+        for shard in self.shards:
+            for model, stats in shard.model_stats.items():
+                total = totals.setdefault(model, {"queries": 0, "rows": 0})
+                total["queries"] += stats["queries"]
+                total["rows"] += stats["rows"]
+        return totals
+    
+    def reset_stats(self):
+        """Zera os contadores de todos os shards"""
+        for shard in self.shards:
+            shard.reset_stats()
+
+
+class Change:
+    """Alteração de uma linha registrada no changelog (ver Model.changes_since)"""
+    
+    __slots__ = ('version', 'op', 'pk', 'instance')
+    
+    def __init__(self, version: int, op: str, pk: Any, instance: Optional['Model']):
+        self.version = version
+        self.op = op              # 'insert', 'update' ou 'delete' (última operação na linha)
+        self.pk = pk
+        self.instance = instance  # Linha atual, ou None se foi deletada
+    
+    def __repr__(self) -> str:
+        return f"<Change v{self.version} {self.op} pk={self.pk}>"
+
+
+class PendingWrite:
+    """Handle de um save() enfileirado no modo write-behind"""
+    
+    def __init__(self, instance: 'Model'):
+        self.instance = instance
+        self.rowid: Optional[int] = None
+        self.error: Optional[BaseException] = None
+        self._event = threading.Event()
+    
+    def done(self) -> bool:
+        """Indica se a linha já foi gravada (ou falhou)"""
+        return self._event.is_set()
+    
+    def wait(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Aguarda o commit da linha
+        
+        Returns:
+            ID da linha inserida
+        
+        Raises:
+            TimeoutError: Se a linha não for gravada dentro do timeout
+            RuntimeError: Se a gravação do lote falhar
+        """
+        if not self._event.wait(timeout):
+            raise TimeoutError("Linha ainda não gravada pelo write-behind")
+        if self.error is not None:
+            raise RuntimeError(f"Erro na gravação em lote: {self.error}")
+        return self.rowid
+    
+    def _resolve(self, rowid: Optional[int] = None, error: Optional[BaseException] = None):
+        self.rowid = rowid
+        self.error = error
+        self._event.set()
+
+
+class WriteBehindQueue:
+    """
+    Fila de escrita em segundo plano com group commit
+    
+    save() enfileira a instância; uma thread drena a fila, agrupa as linhas
+    por tabela e as grava em uma única transação, com um commit a cada
+    batch_size linhas ou flush_interval_ms. Cada linha é um INSERT próprio
+    dentro da transação: o ID vem do lastrowid da própria linha e uma linha
+    inválida falha sozinha, sem desfazer as demais do lote. Leituras só
+    enxergam as linhas depois do commit; use flush() ou PendingWrite.wait()
+    quando precisar de durabilidade.
+    
+    Bancos em arquivo usam uma conexão dedicada para a escrita; bancos
+    :memory: compartilham a conexão do Database, e cada lote é gravado sob
+    o lock da conexão (as escritas da aplicação aguardam o commit do lote).
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, database: Database, batch_size: int = 500, flush_interval_ms: float = 50.0):
+        if batch_size < 1:
+            raise ValueError("batch_size deve ser >= 1")
+        
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        # put() e close() decidem sob este lock se a fila ainda aceita linhas,
+        # para que nada seja enfileirado depois do marcador de parada
+        self._state_lock = threading.Lock()
+        self._closed = False
+        
+        if database.db_path == ":memory:":
+            self._writer = database
+        else:
+            self._writer = Database(database.db_path)
+            # Hooks e contadores continuam valendo para as escritas em lote
+            self._writer._before_hooks = database._before_hooks
+            self._writer._after_hooks = database._after_hooks
+            self._writer.model_stats = database.model_stats
+        
+        self._thread = threading.Thread(target=self._run, name="pysql_lite_write_behind", daemon=True)
+        self._thread.start()
+    
+    def put(self, instance: 'Model') -> PendingWrite:
+        """Enfileira uma instância nova para INSERT"""
+        pending = PendingWrite(instance)
+        with self._state_lock:
+            if self._closed:
+                raise RuntimeError("Write-behind encerrado")
+            self._queue.put(pending)
+        return pending
+    
+    def flush(self, timeout: Optional[float] = None):
+        """Bloqueia até que tudo que foi enfileirado antes da chamada esteja gravado"""
+        marker = threading.Event()
+        self._queue.put(marker)
+        if not marker.wait(timeout):
+            raise TimeoutError("Flush do write-behind não concluído")
+    
+    def close(self):
+        """Grava as linhas pendentes e encerra a thread"""
+        with self._state_lock:
+            stopping = not self._closed
+            self._closed = True
+            if stopping:
+                self._queue.put(self._STOP)
+        self._thread.join()
+        if self._writer is not self.database and self._writer.connection is not None:
+            self._writer.connection.close()
+            self._writer.connection = None
+    
+    def _run(self):
+        """Loop da thread de escrita"""
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            
+            # Acumula até batch_size linhas, o prazo ou um marcador de flush/parada
+            while isinstance(item, PendingWrite) and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+            
+            self._write(batch)
+            
+            if batch[-1] is self._STOP:
+                return
+    
+    def _write(self, batch: List[Any]):
+        """Grava um lote: um INSERT por linha e um único commit"""
+        pending = [item for item in batch if isinstance(item, PendingWrite)]
+        
+        if pending:
+            groups: Dict[Type['Model'], List[PendingWrite]] = {}
+            for item in pending:
+                groups.setdefault(type(item.instance), []).append(item)
+            
+            results: List[Tuple[PendingWrite, int]] = []
+            failures: List[Tuple[PendingWrite, BaseException]] = []
+            try:
+                with self._writer.transaction():
+                    for model, items in groups.items():
+                        sql, prefix, _ = model._insert_sql(self.database)
+                        for item in items:
+                            # Um erro aborta só este INSERT; a transação segue com as demais linhas
+                            try:
+                                cursor = self._writer.execute(sql, prefix + item.instance._insert_values(),
+                                                              model=model.__name__)
+                            except Exception as e:
+                                failures.append((item, e))
+                            else:
+                                results.append((item, cursor.lastrowid))
+            except Exception as e:
+                logger.error("Falha ao gravar lote do write-behind: %s", e)
+                for item in pending:
+                    item._resolve(error=e)
+            else:
+                for item, rowid in results:
+                    setattr(item.instance, item.instance._get_pk_field_name(), rowid)
+                    item._resolve(rowid)
+                for item, error in failures:
+                    logger.error("Falha ao gravar linha do write-behind: %s", error)
+                    item._resolve(error=error)
+        
+        for item in batch:
+            if isinstance(item, threading.Event):
+                item.set()
+
+
+def _type_affinity(declared_type: str) -> str:
+    """Afinidade de um tipo declarado, pelas regras do SQLite (VARCHAR(255) e TEXT -> TEXT)"""
+    declared_type = declared_type.upper()
+    if "INT" in declared_type:
+        return "INTEGER"
+    if any(name in declared_type for name in ("CHAR", "CLOB", "TEXT")):
+        return "TEXT"
+    if "BLOB" in declared_type or not declared_type:
+        return "BLOB"
+    if any(name in declared_type for name in ("REAL", "FLOA", "DOUB")):
+        return "REAL"
+    return "NUMERIC"
+
+
+def _references_column(sql: str, column: str) -> bool:
+    """Se um trecho de SQL menciona a coluna como identificador"""
+    return re.search(rf'(?<![\w$]){re.escape(column)}(?![\w$])', sql, re.IGNORECASE) is not None
+
+
+def _clause_bodies(sql: str, keyword: str) -> List[str]:
+    """Conteúdo entre parênteses após cada ocorrência de keyword (ex: CHECK (...), AS (...))"""
+    bodies = []
+    for match in re.finditer(rf'\b{keyword}\s*\(', sql, re.IGNORECASE):
+        depth = 1
+        for end in range(match.end(), len(sql)):
+            if sql[end] == '(':
+                depth += 1
+            elif sql[end] == ')':
+                depth -= 1
+                if depth == 0:
+                    bodies.append(sql[match.end():end])
+                    break
+    return bodies
+
+
+class MigrationOperation:
+    """Operação de schema gerada por Migrator.plan()"""
+    
+    def __init__(self, kind: str, model: Type['Model'], column: Optional[str] = None,
+                 statements: Optional[List[str]] = None,
+                 backfill: Optional[Callable[['Model'], Any]] = None):
+        """
+        Args:
+            kind: 'create_table', 'add_column', 'add_index', 'add_changelog',
+                  'convert_column' ou 'backfill'
+            model: Modelo da tabela alterada
+            column: Coluna afetada (quando houver)
+            statements: SQL executado em uma única transação
+            backfill: Função backfill(instância) -> valor, para kind='backfill'
+        """
+        self.kind = kind
+        self.model = model
+        self.table = model._table_name
+        self.column = column
+        self.statements = statements or []
+        self.backfill = backfill
+    
+    @property
+    def batched(self) -> bool:
+        """Se a operação percorre a tabela em lotes de rowid"""
+        return self.kind in ('convert_column', 'backfill')
+    
+    def __repr__(self) -> str:
+        target = f"{self.table}.{self.column}" if self.column else self.table
+        return f"<MigrationOperation {self.kind} {target}>"
+
+
+class Migrator:
+    """
+    Motor de migração de schema
+    
+    Compara os _fields dos modelos com PRAGMA table_xinfo e gera as operações
+    que faltam (tabelas, colunas, índices, changelog e conversões de tipo).
+    Conversões e backfills percorrem a tabela em lotes de rowid, com um
+    commit por lote e uma pausa entre lotes, para que a aplicação continue
+    lendo e escrevendo durante a migração. Colunas que não existem mais no
+    modelo nunca são removidas.
+    
+    Exemplo:
+        migrator = Migrator(db, batch_size=5000, pause=0.05, progress=print)
+        migrator.add_backfill(User, "slug", lambda user: user.name.lower())
+        for operation in migrator.plan():
+            print(operation)
+        migrator.run()
+    """
+    
+    def __init__(self, database: Database, batch_size: int = 1000, pause: float = 0.01,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Args:
+            database: Banco a migrar (para ShardedDatabase, use um Migrator por shard)
+            batch_size: Linhas por transação nas operações em lote
+            pause: Pausa entre lotes (segundos), liberando o lock para outros escritores
+            progress: Callback chamado com um dict após cada lote/operação
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size deve ser > 0")
+        
+        self.database = database
+        self.batch_size = batch_size
+        self.pause = pause
+        self.progress = progress
+        self._backfills: Dict[Tuple[str, str], Callable[['Model'], Any]] = {}
+    
+    def add_backfill(self, model: Type['Model'], field_name: str, func: Callable[['Model'], Any]):
+        """
+        Registra o preenchimento de uma coluna a partir das demais
+        
+        O backfill é aplicado em lotes às linhas em que a coluna é NULL,
+        então pode ser executado de novo após uma interrupção.
+        """
+        if field_name not in model._fields:
+            raise ValueError(f"Campo '{field_name}' não existe no modelo {model.__name__}")
+        self._backfills[(model._table_name, field_name)] = func
+    
+    # ------------------------------------------------------------------
+    # Diff do schema
+    # ------------------------------------------------------------------
+    
+    def plan(self, models: Optional[List[Type['Model']]] = None) -> List[MigrationOperation]:
+        """
+        Gera as operações necessárias para alinhar o banco aos modelos
+        
+        Args:
+            models: Modelos a comparar (padrão: como em Database.create_all())
+        """
+        if models is None:
+            models = _default_models(self.database)
+        
+        operations: List[MigrationOperation] = []
+        for model in models:
+            operations.extend(self._plan_model(model))
+        return operations
+    
+    def _plan_model(self, model: Type['Model']) -> List[MigrationOperation]:
+        """Compara um modelo com a tabela existente"""
+        table = model._table_name
+        database = self.database
+        
+        columns = {
+            row['name']: _type_affinity(row['type'])
+            for row in database.fetchall(f"PRAGMA table_xinfo({table})")
         }
         
-        sql_type = type_map.get(self.field_type, self.field_type.value)
-        
-        parts = [self.name or "", sql_type]
+        if not columns:
+            statements = database._table_statements(table, model._fields, model._track_changes)
+            return [MigrationOperation('create_table', model, statements=statements)] + [
+                MigrationOperation('backfill', model, field_name, backfill=func)
+                for (backfill_table, field_name), func in self._backfills.items()
+                if backfill_table == table
+            ]
         
-        if self.primary_key:
-            parts.append("PRIMARY KEY AUTOINCREMENT")
+        operations = []
+        for field_name, field in model._fields.items():
+            field.name = field_name
+            if field.primary_key:
+                continue
+            
+            if field_name not in columns:
+                operations.append(MigrationOperation(
+                    'add_column', model, field_name, statements=self._add_column_statements(model, field)
+                ))
+            elif (columns[field_name] != _type_affinity(field.sql_type())
+                  or f"{field_name}__migrating" in columns):
+                self._check_convertible(model, field)
+                operations.append(MigrationOperation('convert_column', model, field_name))
+            
+            for definition, path in zip(field.generated_column_definitions(), field.json_indexes):
+                column = field.generated_column(path)
+                if column not in columns:
+                    operations.append(MigrationOperation(
+                        'add_column', model, column,
+                        statements=[f"ALTER TABLE {table} ADD COLUMN {definition}"]
+                    ))
+        
+        # Backfills depois de todas as colunas e antes dos índices, que deixariam as escritas mais lentas
+        for field_name in model._fields:
+            func = self._backfills.get((table, field_name))
+            if func is not None:
+                operations.append(MigrationOperation('backfill', model, field_name, backfill=func))
+        
+        existing_indexes = {
+            row['name'] for row in database.fetchall(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,)
+            )
+        }
+        for sql in database._table_statements(table, model._fields)[1:]:
+            name = sql.split()[5]  # CREATE INDEX IF NOT EXISTS <nome> ON ...
+            if name not in existing_indexes:
+                operations.append(MigrationOperation('add_index', model, statements=[sql]))
+        
+        if model._track_changes:
+            changelog = database.fetchall(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (f"{table}_changelog",)
+            )
+            if not changelog:
+                pk_field = model._get_pk_field_name()
+                operations.append(MigrationOperation(
+                    'add_changelog', model, statements=database._changelog_statements(table, pk_field)
+                ))
         
-        if not self.nullable and not self.primary_key:
-            parts.append("NOT NULL")
+        return operations
+    
+    def _check_convertible(self, model: Type['Model'], field: Field):
+        """
+        Recusa, já no plano, conversões que o DROP COLUMN do SQLite não
+        conseguiria concluir, antes de qualquer cópia
         
-        if self.unique:
-            parts.append("UNIQUE")
+        A coluna não pode ter UNIQUE ou FOREIGN KEY declarados na tabela nem
+        ser usada por CHECK, colunas geradas, triggers ou views; índices que
+        a usam são recriados. Como no ADD COLUMN, NOT NULL exige um default.
+        """
+        table = model._table_name
+        column = field.name
+        database = self.database
+        problems = []
+        
+        if not field.nullable and field.default is None:
+            problems.append("NOT NULL sem default no modelo")
+        
+        for index in database.fetchall(f"PRAGMA index_list({table})"):
+            if index['origin'] == 'u' and any(
+                info['name'] == column for info in database.fetchall(f"PRAGMA index_info({index['name']})")
+            ):
+                problems.append("UNIQUE declarado na tabela")
+        
+        rows = database.fetchall("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        table_sql = rows[0]['sql'] if rows else ""
+        if any(_references_column(body, column) for body in _clause_bodies(table_sql, r"FOREIGN\s+KEY")):
+            problems.append("FOREIGN KEY declarada na tabela")
+        if any(_references_column(body, column)
+               for keyword in ("CHECK", "AS") for body in _clause_bodies(table_sql, keyword)):
+            problems.append("usada em CHECK ou coluna gerada")
+        
+        for row in database.fetchall(
+            "SELECT name, sql FROM sqlite_master WHERE type IN ('trigger', 'view') "
+            "AND tbl_name = ? AND sql IS NOT NULL", (table,)
+        ):
+            if f"{column}__migrating" not in row['name'] and _references_column(row['sql'], column):
+                problems.append(f"usada por {row['name']}")
+        
+        if problems:
+            raise ValueError(
+                f"Não é possível converter {table}.{column} em lotes ({'; '.join(problems)}); "
+                f"recrie a tabela manualmente ou remova as restrições antes da migração"
+            )
+    
+    def _column_definition(self, table: str, field: Field, name: str) -> str:
+        """Definição da coluna para ADD COLUMN: sem UNIQUE (vira índice) e com REFERENCES inline"""
+        definition = name + field.get_sql_definition()[len(field.name):].replace(" UNIQUE", "")
+        if field.foreign_key:
+            constraint = field.foreign_key.get_constraint_sql(table, field.name)
+            definition += " " + constraint[constraint.index("REFERENCES"):]
+        return definition
+    
+    def _add_column_statements(self, model: Type['Model'], field: Field) -> List[str]:
+        """
+        ALTER TABLE ADD COLUMN respeitando as restrições do SQLite
         
-        if self.default is not None and not self.primary_key:
-            if isinstance(self.default, str):
-                parts.append(f"DEFAULT '{self.default}'")
-            else:
-                parts.append(f"DEFAULT {self.default}")
+        ADD COLUMN não aceita UNIQUE (vira um índice único) e exige DEFAULT
+        em colunas NOT NULL; com DEFAULT constante o SQLite não reescreve as
+        linhas existentes, então a operação é instantânea.
+        """
+        table = model._table_name
+        if not field.nullable and field.default is None:
+            raise ValueError(
+                f"Não é possível adicionar {table}.{field.name} NOT NULL sem default; "
+                f"defina um default ou use nullable=True com add_backfill()"
+            )
         
-        return " ".join(parts)
-
-
-class Database:
-    """Gerenciador de conexão com SQLite"""
+        statements = [f"ALTER TABLE {table} ADD COLUMN {self._column_definition(table, field, field.name)}"]
+        if field.unique:
+            statements.append(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_{field.name} ON {table} ({field.name})"
+            )
+        return statements
     
-    _instance: Optional['Database'] = None
+    # ------------------------------------------------------------------
+    # Execução
+    # ------------------------------------------------------------------
     
-    def __init__(self, db_path: str = ":memory:"):
+    def run(self, operations: Optional[List[MigrationOperation]] = None) -> List[MigrationOperation]:
         """
-        Inicializa a conexão com o banco de dados
+        Executa as operações (padrão: plan()), pausando entre os lotes
         
-        Args:
-            db_path: Caminho do arquivo SQLite (":memory:" para banco em memória)
+        Returns:
+            Operações executadas
         """
-        self.db_path = db_path
-        self.connection: Optional[sqlite3.Connection] = None
-        self._connect()
+        if operations is None:
+            operations = self.plan()
+        
+        for status in self.steps(operations):
+            if self.progress is not None:
+                self.progress(status)
+            if self.pause and status['batched']:
+                time.sleep(self.pause)
+        
+        return operations
     
-    @classmethod
-    def get_instance(cls, db_path: str = ":memory:") -> 'Database':
-        """Singleton pattern para gerenciar uma única conexão"""
-        if cls._instance is None:
-            cls._instance = cls(db_path)
-        return cls._instance
+    def steps(self, operations: List[MigrationOperation]) -> Iterator[Dict[str, Any]]:
+        """
+        Executa as operações devolvendo o controle após cada lote
+        
+        Útil para intercalar a migração com outro trabalho (ex: um loop de
+        eventos); run() é o consumidor padrão.
+        
+        Yields:
+            Dict com operation, table, column, batched, done e total
+        """
+        for operation in operations:
+            if operation.kind == 'convert_column':
+                yield from self._convert_column(operation)
+            elif operation.kind == 'backfill':
+                yield from self._backfill(operation)
+            else:
+                with self.database.transaction():
+                    for sql in operation.statements:
+                        self.database.execute(sql)
+                yield self._status(operation, False, 1, 1)
     
-    def _connect(self):
-        """Estabelece conexão com o banco de dados"""
-        try:
-            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.connection.row_factory = sqlite3.Row
-            # Ativa suporte a chaves estrangeiras
-            self.connection.execute("PRAGMA foreign_keys = ON")
-        except sqlite3.Error as e:
-            raise RuntimeError(f"Erro ao conectar ao banco de dados: {e}")
+    def _status(self, operation: MigrationOperation, batched: bool, done: int, total: int) -> Dict[str, Any]:
+        """Monta o dict de progresso"""
+        return {
+            "operation": operation.kind,
+            "table": operation.table,
+            "column": operation.column,
+            "batched": batched,
+            "done": done,
+            "total": total,
+        }
     
-    def execute(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
-        """Executa uma query no banco de dados"""
-        if self.connection is None:
-            raise RuntimeError("Banco de dados não conectado")
-        
-        try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, params)
-            return cursor
-        except sqlite3.Error as e:
-            raise RuntimeError(f"Erro ao executar query: {e}\nQuery: {query}")
+    def _batches(self, operation: MigrationOperation, columns: str,
+                 condition: str) -> Iterator[List[sqlite3.Row]]:
+        """Percorre a tabela em faixas de rowid, sem manter transação aberta entre lotes"""
+        last_rowid = 0
+        while True:
+            rows = self.database.fetchall(
+                f"SELECT rowid AS _rowid, {columns} FROM {operation.table} "
+                f"WHERE rowid > ? AND {condition} ORDER BY rowid LIMIT ?",
+                (last_rowid, self.batch_size),
+                model=operation.model.__name__
+            )
+            if not rows:
+                return
+            yield rows
+            last_rowid = rows[-1]['_rowid']
     
-    def commit(self):
-        """Confirma transação"""
-        if self.connection:
-            self.connection.commit()
+    def _count(self, operation: MigrationOperation, condition: str) -> int:
+        """Quantidade de linhas a processar, para o progresso"""
+        row = self.database.execute(
+            f"SELECT COUNT(*) AS total FROM {operation.table} WHERE {condition}"
+        ).fetchone()
+        return row['total']
     
-    def rollback(self):
-        """Desfaz transação"""
-        if self.connection:
-            self.connection.rollback()
+    def _write_batch(self, operation: MigrationOperation, column: str, updates: List[tuple]):
+        """Grava um lote de valores em uma transação curta"""
+        with self.database.transaction():
+            self.database.executemany(
+                f"UPDATE {operation.table} SET {column} = ? WHERE rowid = ?",
+                updates,
+                model=operation.model.__name__
+            )
     
-    def close(self):
-        """Fecha conexão com o banco de dados"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
-            Database._instance = None
+    def _backfill(self, operation: MigrationOperation) -> Iterator[Dict[str, Any]]:
+        """Preenche as linhas com a coluna NULL usando a função registrada"""
+        model = operation.model
+        if not model._initialized:
+            # A hidratação não deve criar a tabela em Database.get_instance()
+            model._database = self.database
+            model._initialized = True
+        
+        field = model._fields[operation.column]
+        condition = f"{operation.column} IS NULL"
+        total = self._count(operation, condition)
+        done = 0
+        
+        for rows in self._batches(operation, model._column_list(), condition):
+            updates = [
+                (field.to_db(operation.backfill(model._from_row(row))), row['_rowid'])
+                for row in rows
+            ]
+            self._write_batch(operation, operation.column, updates)
+            done += len(updates)
+            yield self._status(operation, True, done, total)
     
-    def create_table(self, table_name: str, fields: Dict[str, Field]):
-        """Cria uma tabela no banco de dados"""
-        field_defs = []
-        constraints = []
+    def _convert_column(self, operation: MigrationOperation) -> Iterator[Dict[str, Any]]:
+        """
+        Troca o tipo de uma coluna: ADD COLUMN temporária, cópia convertida
+        em lotes e DROP/RENAME recriando os índices
+        
+        Triggers registram em uma tabela auxiliar as linhas inseridas ou
+        alteradas pela aplicação durante a cópia; essas linhas são
+        convertidas de novo antes da troca (a última parte dentro da
+        própria transação do DROP/RENAME), então nenhuma escrita é perdida.
+        
+        A coluna temporária recebe NOT NULL, DEFAULT e REFERENCES do campo,
+        e UNIQUE vira um índice único após o RENAME. Restrições que impedem
+        o DROP COLUMN são recusadas no plano (_check_convertible); se a
+        conversão falhar mesmo assim, coluna temporária, triggers e tabela
+        auxiliar são removidos e a tabela fica como antes.
+        """
+        database = self.database
+        table = operation.table
+        column = operation.column
+        field = operation.model._fields[column]
+        temp_column = f"{column}__migrating"
+        dirty = f"{table}_{column}__migrating_dirty"
+        triggers = [f"trg_{table}_{column}__migrating_insert", f"trg_{table}_{column}__migrating_update"]
+        
+        with database.transaction():
+            columns = {row['name'] for row in database.fetchall(f"PRAGMA table_xinfo({table})")}
+            if temp_column not in columns:
+                definition = self._column_definition(table, field, temp_column)
+                database.execute(f"ALTER TABLE {table} ADD COLUMN {definition}")
+            database.execute(f"CREATE TABLE IF NOT EXISTS {dirty} (row INTEGER PRIMARY KEY)")
+            for name, event in zip(triggers, ("INSERT", f"UPDATE OF {column}")):
+                database.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table} "
+                    f"BEGIN INSERT OR IGNORE INTO {dirty} (row) VALUES (NEW.rowid); END"
+                )
         
-        for field_name, field in fields.items():
-            field.name = field_name
-            field_defs.append(field.get_sql_definition())
-            
-            # Adiciona constraint de chave estrangeira se existir
-            if field.foreign_key:
-                constraint_sql = field.foreign_key.get_constraint_sql(table_name, field_name)
-                constraints.append(constraint_sql)
+        def convert(rows: List[sqlite3.Row]) -> List[tuple]:
+            return [
+                (None if row[column] is None else field.to_db(field.to_python(row[column])), row['_rowid'])
+                for row in rows
+            ]
         
-        # Combina definições de campos e constraints
-        all_parts = field_defs + constraints
-        sql = f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(all_parts)})"
+        def copy_dirty(limit: int = -1) -> int:
+            """
+            Converte de novo as linhas registradas pelos triggers; deve rodar
+            em uma transação IMMEDIATE, para que nenhuma escrita entre a
+            leitura e a limpeza da tabela auxiliar
+            """
+            rows = database.fetchall(
+                f"SELECT d.row AS _rowid, t.{column} AS {column}, t.rowid IS NOT NULL AS present "
+                f"FROM {dirty} d LEFT JOIN {table} t ON t.rowid = d.row ORDER BY d.row LIMIT ?", (limit,)
+            )
+            database.executemany(
+                f"UPDATE {table} SET {temp_column} = ? WHERE rowid = ?",
+                convert([row for row in rows if row['present']]),
+                model=operation.model.__name__
+            )
+            database.executemany(f"DELETE FROM {dirty} WHERE row = ?", [(row['_rowid'],) for row in rows])
+            return len(rows)
         
+        condition = f"{column} IS NOT NULL"
+        total = self._count(operation, condition)
+        done = 0
+        try:
+            for rows in self._batches(operation, column, condition):
+                self._write_batch(operation, temp_column, convert(rows))
+                done += len(rows)
+                yield self._status(operation, True, done, total)
+            
+            # Alcança as escritas feitas durante a cópia, em lotes curtos
+            while True:
+                with database.transaction(immediate=True):
+                    copied = copy_dirty(self.batch_size)
+                if copied < self.batch_size:
+                    break
+                yield self._status(operation, True, done, total)
+            
+            # Índices que usam a coluna (inclusive em expressões e WHERE parciais)
+            # impedem o DROP COLUMN: são recriados após o RENAME
+            indexes = [
+                (row['name'], row['sql']) for row in database.fetchall(
+                    "SELECT name, sql FROM sqlite_master "
+                    "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+                )
+                if _references_column(row['sql'], column)
+            ]
+            
+            with database.transaction(immediate=True):
+                for name in triggers:
+                    database.execute(f"DROP TRIGGER IF EXISTS {name}")
+                copy_dirty()
+                database.execute(f"DROP TABLE {dirty}")
+                for name, _ in indexes:
+                    database.execute(f"DROP INDEX {name}")
+                database.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+                database.execute(f"ALTER TABLE {table} RENAME COLUMN {temp_column} TO {column}")
+                for _, sql in indexes:
+                    database.execute(sql)
+                if field.unique:
+                    database.execute(
+                        f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_{column} ON {table} ({column})"
+                    )
+        except Exception:
+            self._abort_conversion(table, temp_column, dirty, triggers)
+            raise
+        
+        yield self._status(operation, False, done, total)
+    
+    def _abort_conversion(self, table: str, temp_column: str, dirty: str, triggers: List[str]):
+        """Desfaz a preparação de uma conversão que falhou, deixando a coluna original intacta"""
+        database = self.database
         try:
-            self.execute(sql)
-            self.commit()
+            with database.transaction(immediate=True):
+                for name in triggers:
+                    database.execute(f"DROP TRIGGER IF EXISTS {name}")
+                database.execute(f"DROP TABLE IF EXISTS {dirty}")
+                columns = {row['name'] for row in database.fetchall(f"PRAGMA table_xinfo({table})")}
+                if temp_column in columns:
+                    database.execute(f"ALTER TABLE {table} DROP COLUMN {temp_column}")
         except RuntimeError as e:
-            raise RuntimeError(f"Erro ao criar tabela {table_name}: {e}")
+            logger.error("Falha ao desfazer a conversão de %s.%s: %s", table, temp_column, e)
 
 
 class QueryProperty:
@@ -394,7 +2192,72 @@ class RelatedManager:
         return self.related_model.query.filter(**{f"{self.foreign_key_field}__eq": parent_pk_value})
 
 
-class Model:
+class ModelMeta(type):
+    """
+    Metaclasse dos modelos
+    
+    Coleta os Fields uma única vez, na criação da classe (atributos e/ou
+    dicionário _fields, incluindo os herdados), valida a chave primária e
+    registra o modelo em ModelMeta.registry para uso em Database.create_all().
+    """
+    
+    # Modelos registrados, indexados pelo nome da tabela
+    registry: Dict[str, Type['Model']] = {}
+    
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        cls = super().__new__(mcs, name, bases, namespace, **kwargs)
+        
+        # A própria classe Model não é um modelo concreto
+        if not any(isinstance(base, ModelMeta) for base in bases):
+            return cls
+        
+        # Campos herdados dos modelos base (na ordem das bases)
+        fields: Dict[str, Field] = {}
+        for base in reversed(cls.__mro__[1:]):
+            if isinstance(base, ModelMeta):
+                fields.update(base.__dict__.get('_fields', {}))
+        
+        # Campos declarados no dicionário _fields da classe
+        fields.update(namespace.get('_fields', {}))
+        
+        # Campos declarados como atributos (em ordem alfabética, como dir())
+        for attr_name, attr_value in sorted(namespace.items()):
+            if isinstance(attr_value, Field) and not attr_name.startswith('_'):
+                fields[attr_name] = attr_value
+                # Remove o Field do namespace da classe para evitar conflitos
+                delattr(cls, attr_name)
+        
+        for field_name, field in fields.items():
+            field.name = field_name
+        
+        cls._fields = fields
+        abstract = namespace.get('_abstract', False)
+        if not abstract:
+            cls._validate_primary_key()
+        
+        # Cada modelo é inicializado (ligado ao banco) de forma independente da base
+        if '_database' not in namespace:
+            cls._database = None
+        cls._initialized = False
+        
+        if '_table_name' not in namespace or namespace['_table_name'] is None:
+            cls._table_name = name.lower()
+        
+        if not abstract:
+            registered = ModelMeta.registry.get(cls._table_name)
+            # Recarregar o módulo que define o modelo substitui o registro
+            if registered is not None and (registered.__module__, registered.__qualname__) != (
+                    cls.__module__, cls.__qualname__):
+                raise RuntimeError(
+                    f"Tabela '{cls._table_name}' do modelo {name} já pertence ao modelo "
+                    f"{registered.__module__}.{registered.__qualname__}"
+                )
+            ModelMeta.registry[cls._table_name] = cls
+        
+        return cls
+
+
+class Model(metaclass=ModelMeta):
     """Classe base para modelos de dados"""
     
     # Deve ser definido nas subclasses
@@ -402,6 +2265,9 @@ class Model:
     _fields: Dict[str, Field] = {}
     _database: Optional[Database] = None
     _initialized: bool = False
+    _abstract: bool = False  # Modelos abstratos não são registrados nem criados
+    _write_behind: bool = False  # Usa a fila de escrita em lote quando o banco a ativa
+    _track_changes: bool = False  # Mantém um changelog por triggers (ver changes_since)
     
     # Descriptor para acessar query como propriedade
     query = QueryProperty()
@@ -417,39 +2283,38 @@ class Model:
             if field_name in kwargs:
                 setattr(self, field_name, kwargs[field_name])
             elif field.default is not None:
-                setattr(self, field_name, field.default)
+                default = field.default
+                if field.field_type == FieldType.JSON:
+                    # Evita compartilhar o mesmo dict/list entre instâncias
+                    default = copy.deepcopy(default)
+                setattr(self, field_name, default)
             else:
                 setattr(self, field_name, None)
     
-    @classmethod
-    def _extract_fields(cls):
-        """Extrai automaticamente os Fields definidos como atributos da classe"""
-        extracted_fields = {}
-        
-        # Varre os atributos da classe procurando por Fields
-        for attr_name in dir(cls):
-            # Pula atributos privados, métodos herdados e métodos especiais
-            if attr_name.startswith('_'):
-                continue
-            
-            # Obtém o atributo da classe (não da instância)
-            try:
-                attr_value = getattr(cls, attr_name)
-            except AttributeError:
-                continue
-            
-            # Se for um Field, adiciona aos campos extraídos
-            if isinstance(attr_value, Field):
-                attr_value.name = attr_name
-                extracted_fields[attr_name] = attr_value
-                
-                # Remove o Field do namespace da classe para evitar conflitos
-                try:
-                    delattr(cls, attr_name)
-                except AttributeError:
-                    pass
-        
-        return extracted_fields
+    def __getattr__(self, name: str) -> Any:
+        """Carrega sob demanda campos adiados (defer/only/lazy)"""
+        # Só é chamado quando o atributo não existe na instância
+        deferred = self.__dict__.get('_deferred_fields')
+        if deferred and name in deferred:
+            self._load_deferred(name)
+            return self.__dict__[name]
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
+    
+    def _load_deferred(self, field_name: str):
+        """Carrega um campo adiado com uma query direcionada pela chave primária"""
+        pk_field = self._get_pk_field_name()
+        pk_value = self.__dict__.get(pk_field)
+        
+        value = None
+        if pk_value is not None:
+            sql = f"SELECT {field_name} FROM {self._table_name} WHERE {pk_field} = ?"
+            database = self._database.route(self.__class__, pk=pk_value)
+            rows = database.fetchall(sql, (pk_value,), model=self.__class__.__name__)
+            if rows:
+                value = self._fields[field_name].to_python(rows[0][field_name])
+        
+        self.__dict__[field_name] = value
+        self._deferred_fields.discard(field_name)
     
     @classmethod
     def _validate_primary_key(cls):
@@ -475,6 +2340,16 @@ class Model:
                 return field_name
         return "id"  # Fallback
     
+    @classmethod
+    def _lazy_fields(cls) -> FrozenSet[str]:
+        """Retorna os campos marcados com lazy=True"""
+        return frozenset(name for name, field in cls._fields.items() if field.lazy)
+    
+    @classmethod
+    def _column_list(cls, deferred: FrozenSet[str] = frozenset()) -> str:
+        """Monta a lista de colunas do SELECT, excluindo os campos adiados"""
+        return ', '.join(name for name in cls._fields if name not in deferred)
+    
     @classmethod
     def _initialize_model(cls, database: Optional[Database] = None):
         """Inicializa metadados do modelo e cria a tabela"""
@@ -482,20 +2357,7 @@ class Model:
         if cls._initialized:
             return
         
-        if cls._table_name is None:
-            cls._table_name = cls.__name__.lower()
-        
-        # Garante que cls._fields seja específico dessa classe, não herdado
-        if cls._fields == cls.__bases__[0]._fields if cls.__bases__ else False:
-            cls._fields = {}
-        
-        # Extrai os Fields definidos como atributos
-        extracted_fields = cls._extract_fields()
-        cls._fields.update(extracted_fields)
-        
-        # Valida a chave primária
-        cls._validate_primary_key()
-        
+        # Os campos já foram coletados por ModelMeta na criação da classe
         if database is None:
             database = Database.get_instance()
         
@@ -503,7 +2365,7 @@ class Model:
         
         # Cria a tabela se houver campos
         if cls._fields:
-            cls._database.create_table(cls._table_name, cls._fields)
+            cls._database.create_table(cls._table_name, cls._fields, cls._track_changes)
         
         # Marca o modelo como inicializado
         cls._initialized = True
@@ -549,12 +2411,13 @@ class Model:
         )
         setattr(cls, relation_name, related_manager)
     
-    def save(self) -> int:
+    def save(self) -> Union[int, 'PendingWrite']:
         """
         Salva a instância no banco de dados
         
         Returns:
-            ID da linha inserida/atualizada
+            ID da linha inserida/atualizada, ou um PendingWrite quando o
+            modelo usa write-behind e o banco está com a fila ativa
         """
         if self._database is None:
             self._initialize_model()
@@ -571,32 +2434,18 @@ class Model:
         
         # INSERT
         if pk_value is None:
-            fields_to_insert = []
-            values_to_insert = []
-            placeholders = []
-            
-            for field_name, field in self._fields.items():
-                if not field.primary_key:
-                    value = getattr(self, field_name, None)
-                    fields_to_insert.append(field_name)
-                    
-                    # Converte tipos especiais
-                    if isinstance(value, bool):
-                        values_to_insert.append(1 if value else 0)
-                    elif isinstance(value, datetime):
-                        values_to_insert.append(value.isoformat())
-                    else:
-                        values_to_insert.append(value)
-                    
-                    placeholders.append("?")
+            # Em bancos fragmentados a linha vai para o shard da sua chave
+            database = self._database.route(self.__class__, instance=self)
             
-            sql = f"""
-                INSERT INTO {self._table_name} ({', '.join(fields_to_insert)})
-                VALUES ({', '.join(placeholders)})
-            """
+            # Modo write-behind: enfileira e retorna um handle sem esperar o commit
+            if self._write_behind and database.write_behind is not None:
+                return database.write_behind.put(self)
             
-            cursor = self._database.execute(sql, tuple(values_to_insert))
-            self._database.commit()
+            sql, prefix, _ = self._insert_sql(database)
+            # O lock mantém o INSERT e o commit juntos frente a outras threads da conexão
+            with database._lock:
+                cursor = database.execute(sql, prefix + self._insert_values(), model=self.__class__.__name__)
+                database.commit()
             
             # Atualiza o ID da linha inserida
             if pk_field:
@@ -610,17 +2459,11 @@ class Model:
             values = []
             
             for field_name, field in self._fields.items():
-                if not field.primary_key:
-                    value = getattr(self, field_name, None)
+                # Campos adiados e não carregados mantêm o valor do banco
+                if not field.primary_key and field_name in self.__dict__:
                     set_clauses.append(f"{field_name} = ?")
-                    
                     # Converte tipos especiais
-                    if isinstance(value, bool):
-                        values.append(1 if value else 0)
-                    elif isinstance(value, datetime):
-                        values.append(value.isoformat())
-                    else:
-                        values.append(value)
+                    values.append(field.to_db(self.__dict__[field_name]))
             
             values.append(pk_value)
             
@@ -630,31 +2473,91 @@ class Model:
                 WHERE {pk_field} = ?
             """
             
-            self._database.execute(sql, tuple(values))
-            self._database.commit()
+            database = self._database.route(self.__class__, pk=pk_value)
+            with database._lock:
+                database.execute(sql, tuple(values), model=self.__class__.__name__)
+                database.commit()
             
             return pk_value
     
     @classmethod
-    def find_all(cls) -> List['Model']:
+    def bulk_create(cls, instances: List['Model']) -> int:
         """
-        Retorna todas as instâncias da tabela
+        Insere várias instâncias com um único executemany e um único commit
+        
+        As chaves primárias não são preenchidas nas instâncias; use save()
+        quando precisar do ID de cada registro.
+        
+        Args:
+            instances: Instâncias novas do modelo
         
         Returns:
-            Lista de instâncias do modelo
+            Quantidade de registros inseridos
         """
         if cls._database is None:
             cls._initialize_model()
         
-        sql = f"SELECT * FROM {cls._table_name}"
-        cursor = cls._database.execute(sql)
+        if not instances:
+            return 0
+        
+        # Agrupa as instâncias por shard (um único grupo em bancos comuns)
+        groups: Dict[Any, List['Model']] = {}
+        for obj in instances:
+            groups.setdefault(cls._database.route(cls, instance=obj), []).append(obj)
+        
+        for database, group in groups.items():
+            sql, prefix, _ = cls._insert_sql(database)
+            with database._lock:
+                database.executemany(sql, [prefix + obj._insert_values() for obj in group], model=cls.__name__)
+                database.commit()
+        
+        return len(instances)
+    
+    @classmethod
+    def _insert_sql(cls, database: Database) -> Tuple[str, tuple, int]:
+        """
+        Monta o INSERT do modelo para um banco (ou shard)
+        
+        Returns:
+            Tupla (sql, parâmetros iniciais da expressão de chave primária,
+            incremento entre IDs consecutivos)
+        """
+        names = []
+        placeholders = []
+        prefix: tuple = ()
+        step = 1
+        
+        pk_expression = cls._database.insert_pk_expression(cls, database)
+        if pk_expression is not None:
+            names.append(cls._get_pk_field_name())
+            placeholders.append(pk_expression[0])
+            prefix, step = pk_expression[1], pk_expression[2]
         
-        results = []
-        for row in cursor.fetchall():
-            obj = cls._from_row(row)
-            results.append(obj)
+        for field_name, field in cls._fields.items():
+            if not field.primary_key:
+                names.append(field_name)
+                placeholders.append("?")
+        
+        sql = f"INSERT INTO {cls._table_name} ({', '.join(names)}) VALUES ({', '.join(placeholders)})"
+        return sql, prefix, step
+    
+    def _insert_values(self) -> tuple:
+        """Valores da instância para o INSERT, já convertidos para o banco"""
+        return tuple(
+            field.to_db(getattr(self, field_name, None))
+            for field_name, field in self._fields.items()
+            if not field.primary_key
+        )
+    
+    @classmethod
+    def find_all(cls) -> List['Model']:
+        """
+        Retorna todas as instâncias da tabela
         
-        return results
+        Returns:
+            Lista de instâncias do modelo
+        """
+        return cls._select(deferred=cls._lazy_fields())
     
     @classmethod
     def filter(cls, **kwargs) -> List['Model']:
@@ -693,6 +2596,16 @@ class Model:
         if not kwargs:
             return cls.find_all()
         
+        return cls._select(kwargs, cls._lazy_fields())
+    
+    @classmethod
+    def _build_where(cls, kwargs: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        """
+        Compila os kwargs de filtro (campo__operador=valor) em cláusulas WHERE
+        
+        Returns:
+            Tupla (cláusulas, valores) para uso com placeholders
+        """
         where_clauses = []
         values = []
         
@@ -706,50 +2619,56 @@ class Model:
             if field_name not in cls._fields:
                 raise ValueError(f"Campo '{field_name}' não existe no modelo {cls.__name__}")
             
+            column = field_name
+            field = cls._fields[field_name]
+            if field.field_type == FieldType.JSON:
+                column, operator, value = cls._json_lookup(field, parts[1:], value)
+            elif operator == 'in':
+                if isinstance(value, (list, tuple)):
+                    value = [field.to_db(item) for item in value]
+            elif operator in _COMPARISON_OPERATORS:
+                # Compara com a representação armazenada (ex: datetime em epoch_ms)
+                value = field.to_db(value)
+            
             # Constrói a cláusula WHERE baseada no operador
             if operator == 'eq':
-                where_clauses.append(f"{field_name} = ?")
-                if isinstance(value, bool):
-                    values.append(1 if value else 0)
-                elif isinstance(value, datetime):
-                    values.append(value.isoformat())
-                else:
-                    values.append(value)
+                where_clauses.append(f"{column} = ?")
+                values.append(value)
             
             elif operator == 'gt':
-                where_clauses.append(f"{field_name} > ?")
+                where_clauses.append(f"{column} > ?")
                 values.append(value)
             
             elif operator == 'gte':
-                where_clauses.append(f"{field_name} >= ?")
+                where_clauses.append(f"{column} >= ?")
                 values.append(value)
             
             elif operator == 'lt':
-                where_clauses.append(f"{field_name} < ?")
+                where_clauses.append(f"{column} < ?")
                 values.append(value)
             
             elif operator == 'lte':
-                where_clauses.append(f"{field_name} <= ?")
+                where_clauses.append(f"{column} <= ?")
                 values.append(value)
             
             elif operator == 'ne':
-                where_clauses.append(f"{field_name} != ?")
+                where_clauses.append(f"{column} != ?")
                 values.append(value)
             
             elif operator == 'like':
-                where_clauses.append(f"{field_name} LIKE ?")
+                where_clauses.append(f"{column} LIKE ?")
                 values.append(value)
             
             elif operator == 'contains':
-                where_clauses.append(f"{field_name} LIKE ?")
+                where_clauses.append(f"{column} LIKE ?")
                 values.append(f"%{value}%")
             
             elif operator == 'startswith':
-                where_clauses.append(f"{field_name} LIKE ?")
+                where_clauses.append(f"{column} LIKE ?")
                 values.append(f"{value}%")
             
             elif operator == 'endswith':
-                where_clauses.append(f"{field_name} LIKE ?")
+                where_clauses.append(f"{column} LIKE ?")
                 values.append(f"%{value}")
             
             elif operator == 'in':
@@ -758,26 +2677,97 @@ class Model:
                     raise ValueError(f"Operador '__in' requer uma lista/tupla, recebido {type(value)}")
                 
                 placeholders = ','.join(['?' for _ in value])
-                where_clauses.append(f"{field_name} IN ({placeholders})")
+                where_clauses.append(f"{column} IN ({placeholders})")
                 values.extend(value)
             
             else:
                 raise ValueError(f"Operador '{operator}' não é suportado. Operadores válidos: "
                                  "gt, gte, lt, lte, ne, like, contains, startswith, endswith, in")
         
-        sql = f"""
-            SELECT * FROM {cls._table_name}
-            WHERE {' AND '.join(where_clauses)}
+        return where_clauses, values
+    
+    @classmethod
+    def _json_lookup(cls, field: Field, parts: List[str], value: Any) -> Tuple[str, str, Any]:
+        """
+        Resolve um filtro em campo JSON: campo__caminho__...__operador
+        
+        O caminho é compilado para json_extract, ou para a coluna gerada
+        quando ele está em json_indexes (o que permite usar o índice).
+        
+        Returns:
+            Tupla (expressão da coluna, operador, valor convertido)
+        """
+        operator = 'eq'
+        if parts and parts[-1] in _LOOKUP_OPERATORS:
+            operator = parts[-1]
+            parts = parts[:-1]
+        
+        if not parts:
+            # Comparação com o documento inteiro
+            if operator == 'in':
+                return field.name, operator, [field.to_db(item) for item in value]
+            if operator in ('eq', 'ne'):
+                return field.name, operator, field.to_db(value)
+            return field.name, operator, value
+        
+        path = _parse_json_path(parts)
+        if path in field.json_indexes:
+            column = field.generated_column(path)
+        else:
+            column = f"json_extract({field.name}, '{_json_path_expression(path)}')"
+        
+        if operator == 'in':
+            if not isinstance(value, (list, tuple)):
+                raise ValueError(f"Operador '__in' requer uma lista/tupla, recebido {type(value)}")
+            return column, operator, [_json_scalar(item) for item in value]
+        return column, operator, _json_scalar(value)
+    
+    @classmethod
+    def _select(cls, filters: Optional[Dict[str, Any]] = None,
+                deferred: FrozenSet[str] = frozenset(),
+                order_fields: Optional[List[Tuple[str, str]]] = None,
+                limit: Optional[int] = None) -> List['Model']:
+        """
+        Executa um SELECT com filtros opcionais, omitindo as colunas adiadas
+        
+        Args:
+            filters: kwargs no formato aceito por filter()
+            deferred: Campos que não entram no SELECT (carregados sob demanda)
+            order_fields: Lista de (campo, 'ASC'|'DESC') para o ORDER BY
+            limit: Quantidade máxima de registros
         """
+        if cls._database is None:
+            cls._initialize_model()
+        
+        # Campos de ordenação precisam estar na linha para o merge entre shards
+        columns = deferred - {name for name, _ in order_fields or ()}
+        sql = f"SELECT {cls._column_list(columns)} FROM {cls._table_name}"
+        values: List[Any] = []
+        
+        if filters:
+            where_clauses, values = cls._build_where(filters)
+            sql += f" WHERE {' AND '.join(where_clauses)}"
         
-        cursor = cls._database.execute(sql, tuple(values))
+        if order_fields:
+            sql += " ORDER BY " + ", ".join(f"{name} {direction}" for name, direction in order_fields)
         
-        results = []
-        for row in cursor.fetchall():
-            obj = cls._from_row(row)
-            results.append(obj)
+        if limit is not None:
+            sql += " LIMIT ?"
+            values.append(limit)
         
-        return results
+        shards = cls._database.shards_for(cls)
+        if len(shards) == 1:
+            rows = shards[0].fetchall(sql, tuple(values), model=cls.__name__)
+        else:
+            # Cada shard já devolve suas linhas ordenadas e limitadas; basta o merge
+            rows = [row for shard_rows in cls._database.fan_out(shards, sql, tuple(values), cls.__name__)
+                    for row in shard_rows]
+            if order_fields:
+                rows = _sort_rows(rows, order_fields)
+            if limit is not None:
+                rows = rows[:limit]
+        
+        return [cls._from_row(row, columns) for row in rows]
     
     @classmethod
     def find_one(cls, **kwargs) -> Optional['Model']:
@@ -817,11 +2807,12 @@ class Model:
         if pk_field is None:
             raise RuntimeError(f"Modelo {cls.__name__} não tem chave primária definida")
         
-        sql = f"SELECT * FROM {cls._table_name} WHERE {pk_field} = ?"
-        cursor = cls._database.execute(sql, (pk_value,))
-        row = cursor.fetchone()
+        deferred = cls._lazy_fields()
+        sql = f"SELECT {cls._column_list(deferred)} FROM {cls._table_name} WHERE {pk_field} = ?"
+        database = cls._database.route(cls, pk=pk_value)
+        rows = database.fetchall(sql, (pk_value,), model=cls.__name__)
         
-        return cls._from_row(row) if row else None
+        return cls._from_row(rows[0], deferred) if rows else None
     
     @classmethod
     def delete_by_id(cls, pk_value: int) -> bool:
@@ -848,8 +2839,10 @@ class Model:
             raise RuntimeError(f"Modelo {cls.__name__} não tem chave primária definida")
         
         sql = f"DELETE FROM {cls._table_name} WHERE {pk_field} = ?"
-        cursor = cls._database.execute(sql, (pk_value,))
-        cls._database.commit()
+        database = cls._database.route(cls, pk=pk_value)
+        with database._lock:
+            cursor = database.execute(sql, (pk_value,), model=cls.__name__)
+            database.commit()
         
         return cursor.rowcount > 0
     
@@ -874,10 +2867,12 @@ class Model:
             cls._initialize_model()
         
         sql = f"SELECT COUNT(*) as total FROM {cls._table_name}"
-        cursor = cls._database.execute(sql)
-        row = cursor.fetchone()
+        total = 0
+        for database in cls._database.shards_for(cls):
+            row = database.execute(sql, model=cls.__name__).fetchone()
+            total += row['total'] if row else 0
         
-        return row['total'] if row else 0
+        return total
     
     @classmethod
     def delete_all(cls) -> int:
@@ -886,36 +2881,184 @@ class Model:
             cls._initialize_model()
         
         sql = f"DELETE FROM {cls._table_name}"
-        cursor = cls._database.execute(sql)
-        cls._database.commit()
+        deleted = 0
+        for database in cls._database.shards_for(cls):
+            with database._lock:
+                cursor = database.execute(sql, model=cls.__name__)
+                database.commit()
+            deleted += cursor.rowcount
+        
+        return deleted
+    
+    @classmethod
+    def _changelog_database(cls) -> Database:
+        """Retorna o banco do changelog de um modelo com _track_changes = True"""
+        if not cls._initialized:
+            cls._initialize_model()
         
+        if not cls._track_changes:
+            raise RuntimeError(f"Modelo {cls.__name__} não tem _track_changes = True")
+        
+        shards = cls._database.shards_for(cls)
+        if len(shards) > 1:
+            raise RuntimeError(
+                f"Changelog de {cls.__name__} não é suportado com shard_by: "
+                f"as versões de cada shard são independentes"
+            )
+        return shards[0]
+    
+    @classmethod
+    def changes_since(cls, version: int = 0, batch_size: int = 500) -> Iterator['Change']:
+        """
+        Itera sobre as linhas alteradas depois de uma versão do changelog
+        
+        Cada chave primária aparece uma vez, com a última operação e a linha
+        atual; a leitura é paginada pela versão, então o custo é proporcional
+        à quantidade de alterações e não ao tamanho da tabela.
+        
+        Args:
+            version: Última versão já processada pelo consumidor
+            batch_size: Quantidade de alterações lidas por consulta
+        
+        Yields:
+            Change em ordem crescente de versão
+        """
+        database = cls._changelog_database()
+        changelog = f"{cls._table_name}_changelog"
+        pk_field = cls._get_pk_field_name()
+        columns = ', '.join(f"t.{name}" for name in cls._fields)
+        sql = (
+            f"SELECT c.version AS _cdc_version, c.op AS _cdc_op, c.pk AS _cdc_pk, "
+            f"t.{pk_field} AS _cdc_exists, {columns} "
+            f"FROM {changelog} c LEFT JOIN {cls._table_name} t ON t.{pk_field} = c.pk "
+            f"WHERE c.version > ? "
+            f"AND c.version = (SELECT MAX(version) FROM {changelog} WHERE pk = c.pk) "
+            f"ORDER BY c.version LIMIT ?"
+        )
+        
+        while True:
+            rows = database.fetchall(sql, (version, batch_size), model=cls.__name__)
+            for row in rows:
+                instance = None
+                if row['_cdc_op'] != 'delete' and row['_cdc_exists'] is not None:
+                    instance = cls._from_row(row)
+                yield Change(row['_cdc_version'], row['_cdc_op'], row['_cdc_pk'], instance)
+            
+            if len(rows) < batch_size:
+                break
+            version = rows[-1]['_cdc_version']
+    
+    @classmethod
+    def change_version(cls) -> int:
+        """Retorna a versão mais recente do changelog (0 se vazio)"""
+        database = cls._changelog_database()
+        row = database.execute(
+            f"SELECT IFNULL(MAX(version), 0) AS version FROM {cls._table_name}_changelog",
+            model=cls.__name__
+        ).fetchone()
+        return row['version']
+    
+    @classmethod
+    def prune_changes(cls, version: int) -> int:
+        """Remove do changelog as entradas até a versão informada (inclusive)"""
+        database = cls._changelog_database()
+        with database._lock:
+            cursor = database.execute(
+                f"DELETE FROM {cls._table_name}_changelog WHERE version <= ?",
+                (version,),
+                model=cls.__name__
+            )
+            database.commit()
         return cursor.rowcount
     
     @classmethod
-    def _from_row(cls, row: sqlite3.Row) -> 'Model':
-        """Converte uma linha do banco de dados para instância do modelo"""
+    def migrate_datetime_storage(cls, field_name: str, batch_size: int = 1000,
+                                 progress: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Converte uma coluna DATETIME existente para o storage declarado no Field
+        
+        Usado ao trocar um campo para storage='epoch_ms' (ou de volta para
+        'iso') em uma tabela que já tem dados. A conversão é feita em etapas:
+        
+        1. ADD COLUMN com o novo tipo
+        2. Conversão em Python em lotes de batch_size linhas (um commit por lote);
+           linhas gravadas pela aplicação durante a cópia são convertidas de novo
+        3. DROP COLUMN da coluna antiga e RENAME da nova, recriando os índices
+        
+        Uma migração interrompida pode ser executada de novo. A nova coluna
+        não herda NOT NULL/UNIQUE/DEFAULT da antiga.
+        
+        Args:
+            field_name: Campo DATETIME a converter
+            batch_size: Linhas convertidas por transação
+            progress: Callback progress(linhas_convertidas) após cada lote
+        
+        Returns:
+            Quantidade de linhas convertidas (0 se a coluna já está no formato)
+        """
+        if not cls._initialized:
+            cls._initialize_model()
+        
+        field = cls._fields.get(field_name)
+        if field is None or field.field_type != FieldType.DATETIME:
+            raise ValueError(f"Campo '{field_name}' não é um DATETIME do modelo {cls.__name__}")
+        
+        converted = 0
+        for database in cls._database.shards_for(cls):
+            migrator = Migrator(database, batch_size=batch_size, pause=0)
+            operations = [
+                operation for operation in migrator.plan([cls])
+                if operation.kind == 'convert_column' and operation.column == field_name
+            ]
+            done = 0
+            for status in migrator.steps(operations):
+                if status['batched']:
+                    done = status['done']
+                    if progress is not None:
+                        progress(converted + done)
+            converted += done
+        
+        return converted
+    
+    @classmethod
+    def _from_row(cls, row: sqlite3.Row, deferred: FrozenSet[str] = frozenset()) -> 'Model':
+        """
+        Converte uma linha do banco de dados para instância do modelo
+        
+        Args:
+            row: Linha retornada pelo SELECT
+            deferred: Campos ausentes da linha, carregados no primeiro acesso
+        """
         data = {}
         
         for field_name, field in cls._fields.items():
-            value = row[field_name]
-            
+            if field_name in deferred:
+                continue
             # Converte tipos especiais de volta
-            if field.field_type == FieldType.BOOLEAN and value is not None:
-                data[field_name] = bool(value)
-            elif field.field_type == FieldType.DATETIME and value:
-                try:
-                    data[field_name] = datetime.fromisoformat(value)
-                except (ValueError, TypeError):
-                    data[field_name] = value
-            else:
-                data[field_name] = value
+            data[field_name] = field.to_python(row[field_name])
+        
+        obj = cls(**data)
+        
+        if deferred:
+            # Remove os valores padrão para que __getattr__ faça o carregamento
+            for field_name in deferred:
+                obj.__dict__.pop(field_name, None)
+            obj._deferred_fields = set(deferred)
         
-        return cls(**data)
+        return obj
     
     def to_dict(self) -> Dict[str, Any]:
-        """Converte a instância para um dicionário"""
+        """
+        Converte a instância para um dicionário
+        
+        Campos adiados ainda não carregados ficam de fora, para não
+        disparar uma query por campo e por instância.
+        """
         result = {}
+        unloaded = self.__dict__.get('_deferred_fields') or ()
         for field_name in self._fields:
+            if field_name in unloaded:
+                continue
             value = getattr(self, field_name, None)
             if isinstance(value, datetime):
                 result[field_name] = value.isoformat()
@@ -938,10 +3081,12 @@ class Model:
         else:
             status = pk_value
         
-        # Mostra também o primeiro campo texto como resumo
+        # Mostra também o primeiro campo texto já carregado como resumo
+        unloaded = self.__dict__.get('_deferred_fields') or ()
         text_fields = [
             field_name for field_name, field in self._fields.items()
             if field.field_type == FieldType.TEXT and field_name != pk_field_name
+            and field_name not in unloaded
         ]
         
         if text_fields:
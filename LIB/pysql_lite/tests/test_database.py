@@ -5,12 +5,15 @@ Valida funcionamento de Field, Database e Model
 
 import sys
 import os
+import tempfile
+import threading
+import time
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from database import Database, Model, Field, FieldType
+from database import Database, ShardedDatabase, Model, ModelMeta, Field, FieldType, PendingWrite, Change, Migrator
 
 
 # ============================================================================
@@ -41,6 +44,81 @@ class TestProduct(Model):
     }
 
 
+class TestDocument(Model):
+    """Modelo com coluna BLOB lazy para testes de carregamento adiado"""
+    _table_name = "test_documents"
+    _fields = {
+        "id": Field(FieldType.INTEGER, primary_key=True),
+        "title": Field(FieldType.TEXT),
+        "summary": Field(FieldType.TEXT),
+        "payload": Field(FieldType.BLOB, lazy=True),
+    }
+
+
+class TestTimestamped(Model):
+    """Modelo abstrato com campos herdados"""
+    _abstract = True
+    created_at = Field(FieldType.DATETIME)
+
+
+class TestEvent(TestTimestamped):
+    """Modelo com Fields como atributos e índice"""
+    _table_name = "test_events"
+    kind = Field(FieldType.TEXT, index=True)
+    value = Field(FieldType.REAL)
+
+
+class TestLogEntry(Model):
+    """Modelo com escrita em lote (write-behind)"""
+    _table_name = "test_log_entries"
+    _write_behind = True
+    message = Field(FieldType.TEXT)
+    level = Field(FieldType.INTEGER)
+
+
+class TestTrackedItem(Model):
+    """Modelo com changelog (CDC) para testes"""
+    _table_name = "test_tracked_items"
+    _track_changes = True
+    _fields = {
+        "id": Field(FieldType.INTEGER, primary_key=True),
+        "name": Field(FieldType.TEXT),
+        "qty": Field(FieldType.INTEGER, default=0),
+    }
+
+
+class TestCatalogItem(Model):
+    """Modelo com campo JSON para testes"""
+    _table_name = "test_catalog_items"
+    _fields = {
+        "id": Field(FieldType.INTEGER, primary_key=True),
+        "sku": Field(FieldType.TEXT),
+        "attrs": Field(FieldType.JSON, default={}, json_indexes=["color"]),
+    }
+
+
+class TestReading(Model):
+    """Série temporal com DATETIME em epoch_ms para testes"""
+    _table_name = "test_readings"
+    _fields = {
+        "id": Field(FieldType.INTEGER, primary_key=True),
+        "taken_at": Field(FieldType.DATETIME, storage="epoch_ms", index=True),
+        "value": Field(FieldType.REAL),
+    }
+
+
+class TestProfile(Model):
+    """Versão atual de um modelo que evoluiu, para testes de migração"""
+    _table_name = "test_profiles"
+    _fields = {
+        "id": Field(FieldType.INTEGER, primary_key=True),
+        "name": Field(FieldType.TEXT),
+        "slug": Field(FieldType.TEXT, index=True),
+        "level": Field(FieldType.INTEGER, nullable=False, default=1),
+        "joined_at": Field(FieldType.DATETIME, storage="epoch_ms"),
+    }
+
+
 # ============================================================================
 # Testes
 # ============================================================================
@@ -278,6 +356,16 @@ class TestModel(unittest.TestCase):
         found_product = TestProduct.find_by_id(product1.id)
         self.assertAlmostEqual(found_product.price, 19.99, places=2)
     
+    def test_bulk_create(self):
+        """Testa inserção em lote com bulk_create"""
+        inserted = TestProduct.bulk_create([
+            TestProduct(name=f"Product{i}", price=float(i)) for i in range(5)
+        ])
+        
+        self.assertEqual(inserted, 5)
+        self.assertEqual(TestProduct.count(), 5)
+        self.assertEqual(TestProduct.find_one(name="Product3").price, 3.0)
+    
     def test_default_values(self):
         """Testa valores padrão"""
         user = TestUser(name="User", email="user@example.com")
@@ -369,6 +457,15 @@ class TestQuerySet(unittest.TestCase):
         ages = [u.age for u in results]
         self.assertEqual(ages, [35, 30, 28, 25])
     
+    def test_queryset_order_by_nulls(self):
+        """Testa que NULL fica no início em ASC e no fim em DESC"""
+        TestUser(name="Eve", email="eve@example.com").save()
+        
+        ages = [u.age for u in TestUser.query.order_by('age', 'ASC').all()]
+        self.assertEqual(ages, [None, 25, 28, 30, 35])
+        ages = [u.age for u in TestUser.query.order_by('age', 'DESC').all()]
+        self.assertEqual(ages, [35, 30, 28, 25, None])
+    
     def test_queryset_limit(self):
         """Testa limite de registros com QuerySet"""
         results = TestUser.query.limit(2).all()
@@ -448,6 +545,1109 @@ class TestModelRepresentation(unittest.TestCase):
         self.assertIn("Test User", repr_str)
 
 
+class TestDeferredFields(unittest.TestCase):
+    """Testes para defer(), only() e Field(lazy=True)"""
+    
+    def setUp(self):
+        """Configuração antes de cada teste"""
+        self.db = Database(":memory:")
+        TestDocument.set_database(self.db)
+        self.doc_id = TestDocument(title="Relatório", summary="Resumo", payload=b"\x00" * 1024).save()
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+    
+    def test_lazy_field_not_loaded_by_default(self):
+        """Testa que campo lazy fica fora do SELECT e carrega no acesso"""
+        doc = TestDocument.find_all()[0]
+        self.assertNotIn("payload", doc.__dict__)
+        self.assertEqual(doc.payload, b"\x00" * 1024)
+        self.assertIn("payload", doc.__dict__)
+    
+    def test_lazy_field_find_by_id(self):
+        """Testa que find_by_id também adia o campo lazy"""
+        doc = TestDocument.find_by_id(self.doc_id)
+        self.assertNotIn("payload", doc.__dict__)
+        self.assertEqual(len(doc.payload), 1024)
+    
+    def test_queryset_defer(self):
+        """Testa adiamento explícito de campos com defer()"""
+        doc = TestDocument.query.defer("summary").first()
+        self.assertNotIn("summary", doc.__dict__)
+        self.assertEqual(doc.title, "Relatório")
+        self.assertEqual(doc.summary, "Resumo")
+    
+    def test_queryset_only(self):
+        """Testa carregamento restrito com only()"""
+        doc = TestDocument.query.only("title").first()
+        self.assertEqual(doc.id, self.doc_id)
+        self.assertIn("title", doc.__dict__)
+        self.assertNotIn("summary", doc.__dict__)
+        self.assertNotIn("payload", doc.__dict__)
+    
+    def test_only_loads_lazy_field(self):
+        """Testa que only() pode incluir um campo lazy"""
+        doc = TestDocument.query.only("payload").first()
+        self.assertIn("payload", doc.__dict__)
+    
+    def test_defer_primary_key_raises(self):
+        """Testa que a chave primária não pode ser adiada"""
+        with self.assertRaises(ValueError):
+            TestDocument.query.defer("id")
+    
+    def test_to_dict_and_repr_skip_unloaded_fields(self):
+        """Testa que to_dict() e repr() não carregam campos adiados"""
+        queries = []
+        self.db.add_before_hook(lambda sql, params: queries.append(sql))
+        doc = TestDocument.query.only("summary").first()
+        
+        self.assertEqual(doc.to_dict(), {"id": self.doc_id, "summary": "Resumo"})
+        self.assertEqual(repr(doc), f"<TestDocument pk={self.doc_id} summary='Resumo'>")
+        self.assertEqual(len(queries), 1)
+        
+        doc.title
+        self.assertIn("title", doc.to_dict())
+    
+    def test_save_keeps_unloaded_deferred_fields(self):
+        """Testa que o UPDATE não sobrescreve campos adiados não carregados"""
+        doc = TestDocument.find_by_id(self.doc_id)
+        doc.title = "Novo título"
+        doc.save()
+        
+        reloaded = TestDocument.query.only("title", "payload").first()
+        self.assertEqual(reloaded.title, "Novo título")
+        self.assertEqual(reloaded.payload, b"\x00" * 1024)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Testes para hooks de execução, log de queries lentas e contadores"""
+    
+    def setUp(self):
+        """Configuração antes de cada teste"""
+        self.db = Database(":memory:")
+        TestUser.set_database(self.db)
+        TestUser(name="Alice", email="alice@example.com", age=25).save()
+        TestUser(name="Bob", email="bob@example.com", age=30).save()
+        self.db.reset_stats()
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+    
+    def test_before_and_after_hooks(self):
+        """Testa que os hooks recebem SQL, parâmetros, duração e rowcount"""
+        before_calls = []
+        after_calls = []
+        self.db.add_before_hook(lambda sql, params: before_calls.append(sql))
+        self.db.add_after_hook(lambda sql, params, duration, rowcount: after_calls.append((params, duration, rowcount)))
+        
+        TestUser.filter(age__gt=20)
+        
+        self.assertEqual(len(before_calls), 1)
+        self.assertIn("SELECT", before_calls[0])
+        params, duration, rowcount = after_calls[0]
+        self.assertEqual(params, (20,))
+        self.assertGreaterEqual(duration, 0.0)
+        self.assertEqual(rowcount, 2)
+    
+    def test_remove_hook(self):
+        """Testa remoção de hook"""
+        calls = []
+        hook = lambda sql, params: calls.append(sql)
+        self.db.add_before_hook(hook)
+        self.db.remove_hook(hook)
+        TestUser.count()
+        self.assertEqual(calls, [])
+    
+    def test_slow_query_log_captures_plan(self):
+        """Testa que queries acima do limite são registradas com EXPLAIN QUERY PLAN"""
+        self.db.enable_slow_query_log(threshold_ms=0)
+        TestUser.filter(age__gt=20)
+        
+        entry = self.db.slow_queries[-1]
+        self.assertIn("test_users", entry["sql"])
+        self.assertTrue(any("SCAN" in detail for detail in entry["plan"]))
+        
+        self.db.disable_slow_query_log()
+        self.db.slow_queries.clear()
+        TestUser.filter(age__gt=20)
+        self.assertEqual(len(self.db.slow_queries), 0)
+    
+    def test_slow_query_log_from_threads(self):
+        """Testa EXPLAIN e contadores com várias threads na mesma conexão"""
+        self.db.enable_slow_query_log(threshold_ms=0)
+        errors = []
+        
+        def worker():
+            try:
+                for _ in range(50):
+                    TestUser.filter(age__gt=20)
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(errors, [])
+        self.assertEqual(self.db.model_stats["TestUser"], {"queries": 200, "rows": 400})
+        self.assertTrue(all(entry["plan"] for entry in self.db.slow_queries))
+    
+    def test_model_stats(self):
+        """Testa contadores de queries e linhas hidratadas por modelo"""
+        TestUser.find_all()
+        TestUser.find_by_id(1)
+        
+        stats = self.db.model_stats["TestUser"]
+        self.assertEqual(stats["queries"], 2)
+        self.assertEqual(stats["rows"], 3)
+
+
+class TestModelRegistry(unittest.TestCase):
+    """Testes para ModelMeta, registro de modelos e create_all()"""
+    
+    def setUp(self):
+        """Configuração antes de cada teste"""
+        self.db = Database(":memory:")
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+    
+    def test_fields_collected_at_class_creation(self):
+        """Testa que os Fields são coletados na criação da classe, com herança"""
+        self.assertEqual(list(TestEvent._fields), ["created_at", "kind", "value", "id"])
+        self.assertTrue(TestEvent._fields["id"].primary_key)
+        self.assertNotIn("kind", TestEvent.__dict__)
+    
+    def test_registry(self):
+        """Testa que modelos concretos são registrados e abstratos não"""
+        self.assertIs(ModelMeta.registry["test_events"], TestEvent)
+        self.assertNotIn("testtimestamped", ModelMeta.registry)
+    
+    def test_duplicate_table_name_raises(self):
+        """Testa que dois modelos não podem usar a mesma tabela"""
+        with self.assertRaises(RuntimeError):
+            class TestOtherEvent(Model):
+                _table_name = "test_events"
+                kind = Field(FieldType.TEXT)
+        self.assertIs(ModelMeta.registry["test_events"], TestEvent)
+    
+    def test_create_all_skips_models_bound_elsewhere(self):
+        """Testa que create_all() sem lista não toma modelos ligados a outro banco"""
+        other = Database(":memory:")
+        try:
+            TestProduct.set_database(other)
+            TestEvent._database = None
+            TestEvent._initialized = False
+            self.db.create_all()
+            
+            tables = {row["name"] for row in self.db.fetchall("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self.assertIn("test_events", tables)
+            self.assertNotIn("test_products", tables)
+            self.assertIs(TestEvent._database, self.db)
+            self.assertIs(TestProduct._database, other)
+        finally:
+            other.close()
+    
+    def test_create_all(self):
+        """Testa criação de tabelas e índices em uma única transação"""
+        statements = []
+        self.db.add_before_hook(lambda sql, params: statements.append(sql))
+        self.db.create_all([TestEvent, TestProduct])
+        
+        self.assertEqual(statements[0], "BEGIN")
+        tables = {row["name"] for row in self.db.fetchall("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertTrue({"test_events", "test_products"} <= tables)
+        indexes = {row["name"] for row in self.db.fetchall("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertIn("idx_test_events_kind", indexes)
+        
+        # O modelo já está ligado ao banco: o primeiro save não cria tabela
+        statements.clear()
+        TestEvent(kind="click", value=1.0).save()
+        self.assertFalse(any("CREATE" in sql for sql in statements))
+        self.assertIs(TestEvent._database, self.db)
+    
+    def test_transaction_single_commit(self):
+        """Testa que saves dentro de transaction() são confirmados juntos"""
+        TestProduct.set_database(self.db)
+        with self.db.transaction():
+            TestProduct(name="A", price=1.0).save()
+            TestProduct(name="B", price=2.0).save()
+            self.assertTrue(self.db.connection.in_transaction)
+        
+        self.assertFalse(self.db.connection.in_transaction)
+        self.assertEqual(TestProduct.count(), 2)
+    
+    def test_transaction_rollback(self):
+        """Testa rollback da transação em caso de exceção"""
+        TestProduct.set_database(self.db)
+        with self.assertRaises(ValueError):
+            with self.db.transaction():
+                TestProduct(name="A", price=1.0).save()
+                raise ValueError("falha")
+        
+        self.assertEqual(TestProduct.count(), 0)
+
+
+class TestShardedDatabase(unittest.TestCase):
+    """Testes para ShardedDatabase"""
+    
+    def setUp(self):
+        """Configuração antes de cada teste"""
+        self.db = ShardedDatabase([":memory:", ":memory:", ":memory:"])
+        self.db.shard_by(TestEvent, "kind")
+        self.db.route_model(TestProduct, 2)
+        self.db.create_all([TestEvent, TestProduct])
+        
+        self.kinds = ["click", "view", "buy", "share", "like", "scroll"]
+        for i in range(30):
+            TestEvent(kind=self.kinds[i % len(self.kinds)], value=float(i)).save()
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+    
+    def test_rows_distributed_by_shard_key(self):
+        """Testa que as linhas são distribuídas e cada chave fica em um único shard"""
+        per_shard = [shard.fetchall("SELECT DISTINCT kind FROM test_events") for shard in self.db.shards]
+        kinds_per_shard = [{row["kind"] for row in rows} for rows in per_shard]
+        
+        self.assertGreater(sum(1 for kinds in kinds_per_shard if kinds), 1)
+        self.assertEqual(sum(len(kinds) for kinds in kinds_per_shard), len(self.kinds))
+        self.assertEqual(TestEvent.count(), 30)
+    
+    def test_ids_unique_and_routable(self):
+        """Testa que IDs intercalados são únicos e find_by_id consulta o shard certo"""
+        events = TestEvent.find_all()
+        ids = [event.id for event in events]
+        self.assertEqual(len(ids), len(set(ids)))
+        
+        for event in events[:5]:
+            found = TestEvent.find_by_id(event.id)
+            self.assertEqual(found.value, event.value)
+    
+    def test_ordered_merge_with_limit(self):
+        """Testa merge ordenado entre shards com LIMIT"""
+        results = TestEvent.query.filter(value__gte=10).order_by("value", "DESC").limit(5).all()
+        self.assertEqual([event.value for event in results], [29.0, 28.0, 27.0, 26.0, 25.0])
+    
+    def test_ordered_merge_nulls(self):
+        """Testa que o merge entre shards posiciona NULL como o SQLite"""
+        for kind in self.kinds:
+            TestEvent(kind=kind).save()
+        
+        ascending = TestEvent.query.order_by("value", "ASC").limit(8).all()
+        self.assertEqual([event.value for event in ascending], [None] * 6 + [0.0, 1.0])
+        descending = TestEvent.query.order_by("value", "DESC").all()
+        self.assertEqual([event.value for event in descending[-7:]], [0.0] + [None] * 6)
+    
+    def test_filter_fan_out(self):
+        """Testa filtro executado em todos os shards"""
+        clicks = TestEvent.filter(kind="click")
+        self.assertEqual(len(clicks), 5)
+        self.assertEqual(len(TestEvent.filter(value__lt=10)), 10)
+    
+    def test_update_and_delete_by_id(self):
+        """Testa UPDATE e DELETE roteados pela chave primária"""
+        event = TestEvent.find_one(kind="buy")
+        event.value = 100.0
+        event.save()
+        self.assertEqual(TestEvent.find_by_id(event.id).value, 100.0)
+        
+        self.assertTrue(TestEvent.delete_by_id(event.id))
+        self.assertIsNone(TestEvent.find_by_id(event.id))
+        self.assertEqual(TestEvent.count(), 29)
+    
+    def test_deleted_ids_not_reused(self):
+        """Testa que o ID da última linha removida não é gerado de novo"""
+        event = TestEvent(kind="click", value=1.0)
+        event.save()
+        self.assertTrue(TestEvent.delete_by_id(event.id))
+        
+        again = TestEvent(kind="click", value=2.0)
+        again.save()
+        self.assertGreater(again.id, event.id)
+        
+        TestEvent.bulk_create([TestEvent(kind="click", value=3.0)])
+        ids = [row["id"] for row in self.db.fetchall("SELECT id FROM test_events")]
+        self.assertNotIn(event.id, ids)
+        self.assertEqual(len(ids), len(set(ids)))
+    
+    def test_bulk_create_sharded(self):
+        """Testa bulk_create agrupando as linhas por shard"""
+        TestEvent.bulk_create([TestEvent(kind=kind, value=-1.0) for kind in self.kinds])
+        self.assertEqual(TestEvent.count(), 36)
+        ids = [event.id for event in TestEvent.find_all()]
+        self.assertEqual(len(ids), len(set(ids)))
+    
+    def test_route_model(self):
+        """Testa modelo fixado em um shard"""
+        TestProduct(name="Produto", price=9.9).save()
+        self.assertEqual(len(self.db.shards[2].fetchall("SELECT * FROM test_products")), 1)
+        self.assertEqual(len(self.db.shards[0].fetchall("SELECT * FROM test_products")), 0)
+        self.assertEqual(TestProduct.count(), 1)
+
+
+class TestWriteBehind(unittest.TestCase):
+    """Testes para o modo write-behind com group commit"""
+    
+    def setUp(self):
+        """Configuração antes de cada teste"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmpdir.name, "logs.db"))
+        TestLogEntry.set_database(self.db)
+        self.db.enable_write_behind(batch_size=50, flush_interval_ms=10)
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+        self.tmpdir.cleanup()
+    
+    def test_save_returns_pending_write(self):
+        """Testa que save() enfileira e o handle devolve o ID após o commit"""
+        entry = TestLogEntry(message="iniciado", level=1)
+        pending = entry.save()
+        
+        self.assertIsInstance(pending, PendingWrite)
+        rowid = pending.wait(timeout=5)
+        self.assertEqual(entry.id, rowid)
+        self.assertEqual(TestLogEntry.find_by_id(rowid).message, "iniciado")
+    
+    def test_concurrent_saves_and_flush(self):
+        """Testa saves de várias threads agrupados em lotes"""
+        handles = []
+        lock = threading.Lock()
+        
+        def worker(offset):
+            for i in range(100):
+                pending = TestLogEntry(message=f"msg{offset + i}", level=i % 5).save()
+                with lock:
+                    handles.append(pending)
+        
+        threads = [threading.Thread(target=worker, args=(n * 100,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.db.flush(timeout=5)
+        
+        self.assertEqual(TestLogEntry.count(), 400)
+        ids = [pending.wait(timeout=0) for pending in handles]
+        self.assertEqual(len(set(ids)), 400)
+        for pending in handles[:20]:
+            self.assertEqual(TestLogEntry.find_by_id(pending.rowid).message, pending.instance.message)
+    
+    def test_updates_bypass_queue(self):
+        """Testa que UPDATE de instância já gravada é síncrono"""
+        entry = TestLogEntry(message="a", level=1)
+        entry.save().wait(timeout=5)
+        entry.level = 9
+        self.assertEqual(entry.save(), entry.id)
+        self.assertEqual(TestLogEntry.find_by_id(entry.id).level, 9)
+    
+    def test_memory_database_mixed_sync_and_write_behind(self):
+        """Testa saves síncronos e transações concorrendo com o write-behind em :memory:"""
+        memory_db = Database(":memory:")
+        memory_db.create_all([TestLogEntry, TestProduct])
+        memory_db.enable_write_behind(batch_size=50, flush_interval_ms=1)
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # Força trocas de thread entre as queries
+        handles = []
+        
+        def producer():
+            for i in range(1000):
+                handles.append(TestLogEntry(message=f"msg{i}", level=i % 5).save())
+        
+        try:
+            thread = threading.Thread(target=producer)
+            thread.start()
+            for i in range(300):
+                TestProduct(name=f"item{i}", price=float(i)).save()
+                if i % 50 == 0:
+                    with memory_db.transaction():
+                        TestProduct(name=f"tx{i}", price=0.0).save()
+                        TestProduct(name=f"tx{i}b", price=0.0).save()
+            thread.join()
+            memory_db.flush(timeout=10)
+        finally:
+            sys.setswitchinterval(switch_interval)
+        
+        try:
+            self.assertEqual(TestProduct.count(), 312)
+            self.assertEqual(TestLogEntry.count(), 1000)
+            for pending in handles:
+                row = TestLogEntry.find_by_id(pending.wait(timeout=0))
+                self.assertEqual(row.message, pending.instance.message)
+        finally:
+            memory_db.close()
+    
+    def test_bad_row_fails_alone(self):
+        """Testa que uma linha inválida falha sozinha e as demais recebem o próprio ID"""
+        good = [TestLogEntry(message=f"ok{i}", level=i) for i in range(3)]
+        handles = [good[0].save(), TestLogEntry(message="ruim", level=object()).save()]
+        handles += [entry.save() for entry in good[1:]]
+        self.db.flush(timeout=5)
+        
+        with self.assertRaises(RuntimeError):
+            handles[1].wait(timeout=0)
+        for entry, pending in zip(good, handles[:1] + handles[2:]):
+            self.assertEqual(pending.wait(timeout=0), entry.id)
+            self.assertEqual(TestLogEntry.find_by_id(entry.id).message, entry.message)
+        self.assertEqual(TestLogEntry.count(), 3)
+    
+    def test_put_after_close_raises(self):
+        """Testa que a fila recusa linhas depois de encerrada"""
+        queue = self.db.write_behind
+        self.db.disable_write_behind()
+        with self.assertRaises(RuntimeError):
+            queue.put(TestLogEntry(message="tarde", level=0))
+        queue.close()
+    
+    def test_close_flushes_pending_rows(self):
+        """Testa que fechar o banco grava as linhas pendentes"""
+        pending = TestLogEntry(message="final", level=0).save()
+        self.db.disable_write_behind()
+        self.assertTrue(pending.done())
+        self.assertEqual(TestLogEntry.count(), 1)
+
+
+class TestBackup(unittest.TestCase):
+    """Testes para snapshot online e espelho em memória"""
+    
+    def setUp(self):
+        """Configuração antes de cada teste"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmpdir.name, "app.db"))
+        TestUser.set_database(self.db)
+        for i in range(20):
+            TestUser(name=f"user{i}", email=f"user{i}@example.com", age=20 + i).save()
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+        self.tmpdir.cleanup()
+    
+    def test_snapshot_copies_database(self):
+        """Testa que o snapshot contém os dados e reporta progresso"""
+        steps = []
+        path = self.db.snapshot(
+            os.path.join(self.tmpdir.name, "backup.db"),
+            pages=1,
+            sleep=0,
+            progress=lambda status, remaining, total: steps.append(remaining)
+        )
+        
+        copy = Database(path)
+        try:
+            rows = copy.fetchall("SELECT COUNT(*) AS total FROM test_users")
+            self.assertEqual(rows[0]["total"], 20)
+        finally:
+            copy.close()
+        self.assertGreater(len(steps), 1)
+        self.assertEqual(steps[-1], 0)
+    
+    def test_mirror_is_read_only(self):
+        """Testa que o espelho em memória aceita leitura e recusa escrita"""
+        mirror = self.db.load_into_memory()
+        try:
+            rows = mirror.fetchall("SELECT name FROM test_users WHERE age = ?", (25,))
+            self.assertEqual(rows[0]["name"], "user5")
+            with self.assertRaises(RuntimeError):
+                mirror.execute("DELETE FROM test_users")
+        finally:
+            mirror.close()
+    
+    def test_mirror_refresh(self):
+        """Testa que refresh() traz escritas feitas após a cópia"""
+        mirror = self.db.load_into_memory()
+        try:
+            TestUser(name="novo", email="novo@example.com", age=99).save()
+            self.assertEqual(len(mirror.fetchall("SELECT id FROM test_users")), 20)
+            
+            mirror.refresh()
+            self.assertEqual(len(mirror.fetchall("SELECT id FROM test_users")), 21)
+        finally:
+            mirror.close()
+    
+    def test_periodic_refresh(self):
+        """Testa a recarga periódica em segundo plano"""
+        mirror = self.db.load_into_memory(refresh_interval=0.01)
+        try:
+            TestUser(name="novo", email="novo@example.com", age=99).save()
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                if len(mirror.fetchall("SELECT id FROM test_users")) == 21:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(len(mirror.fetchall("SELECT id FROM test_users")), 21)
+        finally:
+            mirror.close()
+        self.assertIsNone(mirror._refresh_thread)
+    
+    def test_snapshot_waits_for_open_transaction(self):
+        """Testa que o snapshot não corre junto com uma transação na mesma conexão"""
+        started = threading.Event()
+        release = threading.Event()
+        
+        def writer():
+            with self.db.transaction():
+                TestUser(name="tx", email="tx@example.com", age=1).save()
+                started.set()
+                release.wait(5)
+        
+        thread = threading.Thread(target=writer)
+        thread.start()
+        started.wait(5)
+        path = os.path.join(self.tmpdir.name, "backup.db")
+        snapshot = threading.Thread(target=self.db.snapshot, args=(path,), kwargs={"sleep": 0})
+        snapshot.start()
+        snapshot.join(0.2)
+        self.assertTrue(snapshot.is_alive())
+        
+        release.set()
+        thread.join()
+        snapshot.join(5)
+        copy = Database(path)
+        try:
+            self.assertEqual(copy.fetchall("SELECT COUNT(*) AS total FROM test_users")[0]["total"], 21)
+        finally:
+            copy.close()
+    
+    def test_close_keeps_other_singleton(self):
+        """Testa que fechar um banco qualquer não descarta o singleton"""
+        instance = Database.get_instance()
+        try:
+            mirror = self.db.load_into_memory()
+            mirror.close()
+            self.assertIs(Database._instance, instance)
+        finally:
+            instance.close()
+        self.assertIsNone(Database._instance)
+    
+    def test_refresh_requires_mirror(self):
+        """Testa que refresh() só funciona em espelhos"""
+        with self.assertRaises(RuntimeError):
+            self.db.refresh()
+
+
+class TestChangeDataCapture(unittest.TestCase):
+    """Testes para o changelog mantido por triggers"""
+    
+    def setUp(self):
+        """Configuração antes de cada teste"""
+        self.db = Database(":memory:")
+        TestTrackedItem.set_database(self.db)
+        TestUser.set_database(self.db)
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+    
+    def test_changes_since_collapses_per_row(self):
+        """Testa que cada linha aparece uma vez com a última operação"""
+        a = TestTrackedItem(name="a", qty=1)
+        a.save()
+        b = TestTrackedItem(name="b", qty=2)
+        b.save()
+        a.qty = 10
+        a.save()
+        b.delete()
+        
+        changes = list(TestTrackedItem.changes_since(0))
+        
+        self.assertEqual([(c.op, c.pk) for c in changes], [("update", a.id), ("delete", b.id)])
+        self.assertIsInstance(changes[0], Change)
+        self.assertEqual(changes[0].instance.qty, 10)
+        self.assertIsNone(changes[1].instance)
+    
+    def test_changes_since_version(self):
+        """Testa que só as alterações após a versão são retornadas"""
+        TestTrackedItem(name="a").save()
+        version = TestTrackedItem.change_version()
+        c = TestTrackedItem(name="c")
+        c.save()
+        
+        changes = list(TestTrackedItem.changes_since(version))
+        
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0].op, "insert")
+        self.assertEqual(changes[0].instance.name, "c")
+        self.assertEqual(TestTrackedItem.change_version(), changes[0].version)
+    
+    def test_changes_since_paginates(self):
+        """Testa a leitura em lotes e alterações em massa"""
+        TestTrackedItem.bulk_create([TestTrackedItem(name=f"i{n}", qty=n) for n in range(25)])
+        
+        changes = list(TestTrackedItem.changes_since(0, batch_size=10))
+        
+        self.assertEqual(len(changes), 25)
+        self.assertEqual(len({c.pk for c in changes}), 25)
+        self.assertEqual([c.instance.qty for c in changes], list(range(25)))
+    
+    def test_prune_changes(self):
+        """Testa a remoção de entradas já consumidas"""
+        for n in range(3):
+            TestTrackedItem(name=f"i{n}").save()
+        version = TestTrackedItem.change_version()
+        
+        self.assertEqual(TestTrackedItem.prune_changes(version), 3)
+        self.assertEqual(list(TestTrackedItem.changes_since(0)), [])
+        self.assertEqual(TestTrackedItem.count(), 3)
+    
+    def test_requires_opt_in(self):
+        """Testa que modelos sem _track_changes não têm changelog"""
+        with self.assertRaises(RuntimeError):
+            list(TestUser.changes_since(0))
+
+
+class TestJSONField(unittest.TestCase):
+    """Testes para FieldType.JSON e filtros por caminho"""
+    
+    def setUp(self):
+        """Configuração antes de cada teste"""
+        self.db = Database(":memory:")
+        TestCatalogItem.set_database(self.db)
+        TestCatalogItem(sku="a", attrs={"color": "red", "size": {"w": 3}, "tags": ["x", "y"], "new": True}).save()
+        TestCatalogItem(sku="b", attrs={"color": "blue", "size": {"w": 5}, "tags": ["z"], "new": False}).save()
+        TestCatalogItem(sku="c").save()
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+    
+    def test_round_trip(self):
+        """Testa que o valor é serializado no save e decodificado na leitura"""
+        item = TestCatalogItem.filter(sku="a")[0]
+        self.assertEqual(item.attrs["size"], {"w": 3})
+        self.assertEqual(item.attrs["tags"], ["x", "y"])
+        self.assertIs(item.attrs["new"], True)
+        self.assertEqual(TestCatalogItem.filter(sku="c")[0].attrs, {})
+    
+    def test_default_not_shared(self):
+        """Testa que o default mutável não é compartilhado entre instâncias"""
+        first = TestCatalogItem()
+        first.attrs["k"] = 1
+        self.assertEqual(TestCatalogItem().attrs, {})
+    
+    def test_path_lookups(self):
+        """Testa filtros campo__caminho__operador compilados para json_extract"""
+        def skus(**kwargs):
+            return sorted(item.sku for item in TestCatalogItem.filter(**kwargs))
+        
+        self.assertEqual(skus(attrs__color="red"), ["a"])
+        self.assertEqual(skus(attrs__size__w__gt=4), ["b"])
+        self.assertEqual(skus(attrs__tags__0="x"), ["a"])
+        self.assertEqual(skus(attrs__new=True), ["a"])
+        self.assertEqual(skus(attrs__color__in=["red", "blue"]), ["a", "b"])
+        self.assertEqual(skus(attrs__tags=["z"]), ["b"])
+        self.assertEqual(TestCatalogItem.query.filter(attrs__color__startswith="bl").count(), 1)
+    
+    def test_indexed_path_uses_index(self):
+        """Testa que o caminho em json_indexes é resolvido pelo índice da coluna gerada"""
+        self.db.enable_slow_query_log(threshold_ms=0)
+        TestCatalogItem.filter(attrs__color="red")
+        plan = self.db.slow_queries[-1]["plan"]
+        self.assertIn("idx_test_catalog_items_attrs__color", " ".join(plan))
+    
+    def test_invalid_path(self):
+        """Testa que caminhos inválidos são rejeitados"""
+        with self.assertRaises(ValueError):
+            TestCatalogItem.filter(**{"attrs__bad-key": 1})
+        with self.assertRaises(ValueError):
+            Field(FieldType.TEXT, json_indexes=["color"])
+
+
+class TestEpochDatetime(unittest.TestCase):
+    """Testes para DATETIME armazenado em epoch_ms"""
+    
+    def setUp(self):
+        """Configuração antes de cada teste"""
+        self.db = Database(":memory:")
+        self.base = datetime(2024, 3, 1, 12, 0, 0, 250000)
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+    
+    def test_storage_and_round_trip(self):
+        """Testa que o valor é gravado como INTEGER e volta como datetime"""
+        TestReading.set_database(self.db)
+        TestReading(taken_at=self.base, value=1.0).save()
+        
+        raw = self.db.fetchall("SELECT taken_at, typeof(taken_at) AS kind FROM test_readings")[0]
+        self.assertEqual(raw["kind"], "integer")
+        self.assertEqual(raw["taken_at"], 1709294400250)
+        self.assertEqual(TestReading.find_by_id(1).taken_at, self.base)
+    
+    def test_aware_datetime_stored_as_utc(self):
+        """Testa que datetimes com fuso são convertidos para UTC"""
+        field = Field(FieldType.DATETIME, storage="epoch_ms")
+        aware = datetime(2024, 3, 1, 9, 0, tzinfo=timezone(timedelta(hours=-3)))
+        self.assertEqual(field.to_python(field.to_db(aware)), datetime(2024, 3, 1, 12, 0))
+    
+    def test_range_filters_compare_integers(self):
+        """Testa que __gt/__lt com datetime viram comparações inteiras"""
+        TestReading.set_database(self.db)
+        TestReading.bulk_create([
+            TestReading(taken_at=self.base + timedelta(minutes=n), value=float(n)) for n in range(10)
+        ])
+        
+        results = TestReading.filter(taken_at__gte=self.base + timedelta(minutes=3),
+                                     taken_at__lt=self.base + timedelta(minutes=6))
+        self.assertEqual(sorted(r.value for r in results), [3.0, 4.0, 5.0])
+        self.assertEqual(len(TestReading.filter(taken_at=self.base)), 1)
+    
+    def test_invalid_storage(self):
+        """Testa que epoch_ms só é aceito em DATETIME"""
+        with self.assertRaises(ValueError):
+            Field(FieldType.INTEGER, storage="epoch_ms")
+        with self.assertRaises(ValueError):
+            Field(FieldType.DATETIME, storage="unix")
+    
+    def test_migrate_iso_table(self):
+        """Testa a conversão em lotes de uma tabela existente em ISO"""
+        self.db.execute(
+            "CREATE TABLE test_readings (id INTEGER PRIMARY KEY AUTOINCREMENT, taken_at TEXT, value REAL)"
+        )
+        self.db.execute("CREATE INDEX idx_test_readings_taken_at ON test_readings (taken_at)")
+        self.db.executemany(
+            "INSERT INTO test_readings (taken_at, value) VALUES (?, ?)",
+            [((self.base + timedelta(hours=n)).isoformat(), float(n)) for n in range(25)]
+            + [(None, 99.0)]
+        )
+        self.db.commit()
+        TestReading.set_database(self.db)
+        
+        steps = []
+        converted = TestReading.migrate_datetime_storage("taken_at", batch_size=10, progress=steps.append)
+        
+        self.assertEqual(converted, 25)
+        self.assertEqual(steps, [10, 20, 25])
+        columns = {row["name"]: row["type"] for row in self.db.fetchall("PRAGMA table_info(test_readings)")}
+        self.assertEqual(columns["taken_at"], "INTEGER")
+        self.assertNotIn("taken_at__migrating", columns)
+        self.assertEqual(TestReading.find_by_id(6).taken_at, self.base + timedelta(hours=5))
+        self.assertIsNone(TestReading.find_by_id(26).taken_at)
+        
+        self.db.enable_slow_query_log(threshold_ms=0)
+        TestReading.filter(taken_at__gt=self.base + timedelta(hours=20))
+        self.assertIn("idx_test_readings_taken_at", " ".join(self.db.slow_queries[-1]["plan"]))
+        
+        # Executar de novo não altera nada
+        self.assertEqual(TestReading.migrate_datetime_storage("taken_at"), 0)
+    
+    def test_migrate_keeps_writes_made_during_conversion(self):
+        """Testa que atualizações de linhas já convertidas durante a migração são mantidas"""
+        self.db.execute(
+            "CREATE TABLE test_readings (id INTEGER PRIMARY KEY AUTOINCREMENT, taken_at TEXT, value REAL)"
+        )
+        self.db.executemany(
+            "INSERT INTO test_readings (taken_at, value) VALUES (?, ?)",
+            [((self.base + timedelta(hours=n)).isoformat(), float(n)) for n in range(25)]
+        )
+        self.db.commit()
+        TestReading.set_database(self.db)
+        moved = datetime(2030, 1, 1)
+        
+        def write_during_migration(done):
+            # A aplicação continua gravando entre os lotes
+            if done == 20:
+                reading = TestReading.find_by_id(1)
+                reading.taken_at = moved
+                reading.save()
+                TestReading(taken_at=moved, value=100.0).save()
+        
+        TestReading.migrate_datetime_storage("taken_at", batch_size=10, progress=write_during_migration)
+        
+        self.assertEqual(TestReading.find_by_id(1).taken_at, moved)
+        self.assertEqual(TestReading.find_one(value=100.0).taken_at, moved)
+        self.assertEqual(TestReading.find_by_id(2).taken_at, self.base + timedelta(hours=1))
+
+
+def _stock_value(product):
+    """Função de mapeamento de parallel_map (precisa ser de módulo para pickle)"""
+    return product.price * product.quantity
+
+
+def _add(a, b):
+    """Redução associativa para parallel_map"""
+    return a + b
+
+
+class TestParallelMap(unittest.TestCase):
+    """Testes para QuerySet.parallel_map()"""
+    
+    def setUp(self):
+        """Configuração antes de cada teste"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmpdir.name, "scan.db"))
+        TestProduct.set_database(self.db)
+        TestProduct.bulk_create([
+            TestProduct(name=f"p{n}", price=float(n), quantity=n % 3) for n in range(1, 101)
+        ])
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+        self.tmpdir.cleanup()
+    
+    def test_map_preserves_rowid_order(self):
+        """Testa que os resultados voltam na ordem de rowid"""
+        results = TestProduct.query.parallel_map(_stock_value, workers=2)
+        expected = [float(n) * (n % 3) for n in range(1, 101)]
+        self.assertEqual(results, expected)
+    
+    def test_map_with_filters_and_reduce(self):
+        """Testa filtros e redução por faixa"""
+        total = TestProduct.query.filter(quantity__gt=0).parallel_map(
+            _stock_value, workers=3, reduce=_add, initial=0.0
+        )
+        self.assertEqual(total, sum(float(n) * (n % 3) for n in range(1, 101)))
+        
+        empty = TestProduct.query.filter(price__gt=1000).parallel_map(_stock_value, workers=2, reduce=_add)
+        self.assertIsNone(empty)
+    
+    def test_rejects_ordering_and_memory(self):
+        """Testa que order_by/limit e bancos em memória são rejeitados"""
+        with self.assertRaises(ValueError):
+            TestProduct.query.order_by("price").parallel_map(_stock_value)
+        
+        memory_db = Database(":memory:")
+        try:
+            TestProduct.set_database(memory_db)
+            with self.assertRaises(ValueError):
+                TestProduct.query.parallel_map(_stock_value)
+        finally:
+            memory_db.close()
+    
+    def test_read_only_connection(self):
+        """Testa que Database(read_only=True) recusa escrita"""
+        reader = Database(self.db.db_path, read_only=True)
+        try:
+            self.assertEqual(len(reader.fetchall("SELECT id FROM test_products")), 100)
+            with self.assertRaises(RuntimeError):
+                reader.execute("DELETE FROM test_products")
+        finally:
+            reader.close()
+    
+    def test_read_only_path_with_uri_characters(self):
+        """Testa read_only=True em caminhos com caracteres especiais de URI"""
+        directory = os.path.join(self.tmpdir.name, "a#b?c%20")
+        os.makedirs(directory)
+        path = os.path.join(directory, "x.db")
+        writer = Database(path)
+        writer.execute("CREATE TABLE t (v INTEGER)")
+        writer.execute("INSERT INTO t (v) VALUES (1)")
+        writer.commit()
+        writer.close()
+        
+        reader = Database(path, read_only=True)
+        try:
+            self.assertEqual(reader.fetchall("SELECT v FROM t")[0]["v"], 1)
+            with self.assertRaises(RuntimeError):
+                reader.execute("INSERT INTO t (v) VALUES (2)")
+        finally:
+            reader.close()
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "a")))
+
+
+class TestMigrator(unittest.TestCase):
+    """Testes para o motor de migração de schema"""
+    
+    def setUp(self):
+        """Cria a versão antiga da tabela, com dados"""
+        self.db = Database(":memory:")
+        self.db.execute("CREATE TABLE test_profiles (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, joined_at TEXT)")
+        self.db.executemany(
+            "INSERT INTO test_profiles (name, joined_at) VALUES (?, ?)",
+            [(f"User{n}", datetime(2024, 1, 1 + n).isoformat()) for n in range(25)]
+        )
+        self.db.commit()
+    
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.db.close()
+        Database._instance = None
+    
+    def test_plan_diffs_fields_against_table(self):
+        """Testa que o plano contém apenas o que falta"""
+        operations = Migrator(self.db).plan([TestProfile])
+        
+        self.assertEqual(
+            [(op.kind, op.column) for op in operations],
+            [("add_column", "slug"), ("add_column", "level"),
+             ("convert_column", "joined_at"), ("add_index", None)]
+        )
+    
+    def test_run_with_backfill_and_progress(self):
+        """Testa a execução em lotes com backfill e progresso"""
+        statuses = []
+        migrator = Migrator(self.db, batch_size=10, pause=0, progress=statuses.append)
+        migrator.add_backfill(TestProfile, "slug", lambda profile: profile.name.lower())
+        migrator.run(migrator.plan([TestProfile]))
+        
+        backfill = [s["done"] for s in statuses if s["operation"] == "backfill"]
+        self.assertEqual(backfill, [10, 20, 25])
+        self.assertTrue(all(s["total"] == 25 for s in statuses if s["batched"]))
+        
+        TestProfile.set_database(self.db)
+        profile = TestProfile.find_by_id(3)
+        self.assertEqual(profile.slug, "user2")
+        self.assertEqual(profile.level, 1)
+        self.assertEqual(profile.joined_at, datetime(2024, 1, 3))
+        self.assertEqual(TestProfile.filter(slug="user7")[0].id, 8)
+        
+        # Banco alinhado: nada mais a fazer
+        self.assertEqual(Migrator(self.db).plan([TestProfile]), [])
+    
+    def test_steps_yield_between_batches(self):
+        """Testa que outras escritas podem ocorrer entre os lotes"""
+        migrator = Migrator(self.db, batch_size=5, pause=0)
+        operations = [op for op in migrator.plan([TestProfile]) if op.kind == "convert_column"]
+        
+        steps = migrator.steps(operations)
+        next(steps)
+        self.db.execute("INSERT INTO test_profiles (name, joined_at) VALUES (?, ?)",
+                        ("Late", "2024-06-01T00:00:00"))
+        self.db.commit()
+        for _ in steps:
+            pass
+        
+        rows = self.db.fetchall("SELECT joined_at FROM test_profiles WHERE name = 'Late'")
+        self.assertEqual(rows[0]["joined_at"], 1717200000000)
+    
+    def test_rows_changed_during_copy_are_reconverted(self):
+        """Testa que escritas em linhas já copiadas não se perdem na troca da coluna"""
+        migrator = Migrator(self.db, batch_size=5, pause=0)
+        operations = [op for op in migrator.plan([TestProfile]) if op.kind == "convert_column"]
+        
+        steps = migrator.steps(operations)
+        next(steps)
+        next(steps)
+        self.db.execute("UPDATE test_profiles SET joined_at = ? WHERE id = 1", ("2030-01-01T00:00:00",))
+        self.db.execute("UPDATE test_profiles SET joined_at = NULL WHERE id = 2")
+        self.db.execute("DELETE FROM test_profiles WHERE id = 3")
+        self.db.commit()
+        for _ in steps:
+            pass
+        
+        rows = {row["id"]: row["joined_at"] for row in self.db.fetchall("SELECT id, joined_at FROM test_profiles")}
+        self.assertEqual(rows[1], 1893456000000)
+        self.assertIsNone(rows[2])
+        self.assertNotIn(3, rows)
+        self.assertEqual(rows[4], 1704326400000)
+        
+        leftovers = self.db.fetchall("SELECT name FROM sqlite_master WHERE name LIKE '%migrating%'")
+        self.assertEqual(leftovers, [])
+    
+    def test_migrate_creates_missing_tables(self):
+        """Testa que Database.migrate() cria tabelas inexistentes e liga os modelos"""
+        operations = self.db.migrate([TestProfile, TestProduct], pause=0)
+        
+        self.assertIn("create_table", [op.kind for op in operations])
+        self.assertIs(TestProduct._database, self.db)
+        TestProduct(name="x", price=1.0).save()
+        self.assertEqual(TestProduct.count(), 1)
+    
+    def test_not_null_without_default_is_rejected(self):
+        """Testa que ADD COLUMN NOT NULL sem default é recusado no plano"""
+        class TestStrictProfile(Model):
+            _table_name = "test_profiles"
+            _abstract = True
+            _fields = {
+                "id": Field(FieldType.INTEGER, primary_key=True),
+                "nickname": Field(FieldType.TEXT, nullable=False),
+            }
+        
+        with self.assertRaises(ValueError):
+            Migrator(self.db).plan([TestStrictProfile])
+    
+    def test_plan_compares_type_affinity(self):
+        """Testa que tipos declarados com a mesma afinidade não geram conversão"""
+        self.db.execute("CREATE TABLE test_labels (id INTEGER PRIMARY KEY, title VARCHAR(255), hits BIGINT)")
+        
+        class TestLabel(Model):
+            _table_name = "test_labels"
+            _abstract = True
+            _fields = {
+                "id": Field(FieldType.INTEGER, primary_key=True),
+                "title": Field(FieldType.TEXT),
+                "hits": Field(FieldType.INTEGER),
+            }
+        
+        self.assertEqual(Migrator(self.db).plan([TestLabel]), [])
+    
+    def test_constrained_columns_are_refused(self):
+        """Testa que colunas UNIQUE ou com FOREIGN KEY de tabela são recusadas antes de qualquer cópia"""
+        self.db.execute(
+            "CREATE TABLE test_accounts (id INTEGER PRIMARY KEY, code TEXT UNIQUE, owner_id TEXT, "
+            "FOREIGN KEY (owner_id) REFERENCES test_profiles(id))"
+        )
+        
+        for column in ("code", "owner_id"):
+            class TestAccount(Model):
+                _table_name = "test_accounts"
+                _abstract = True
+                _fields = {
+                    "id": Field(FieldType.INTEGER, primary_key=True),
+                    column: Field(FieldType.INTEGER),
+                }
+            
+            with self.assertRaises(ValueError):
+                Migrator(self.db).plan([TestAccount])
+        
+        columns = [row["name"] for row in self.db.fetchall("PRAGMA table_xinfo(test_accounts)")]
+        self.assertEqual(columns, ["id", "code", "owner_id"])
+    
+    def test_convert_keeps_constraints_and_indexes(self):
+        """Testa que NOT NULL, DEFAULT e índices da coluna sobrevivem à conversão"""
+        self.db.execute("CREATE TABLE test_scores (id INTEGER PRIMARY KEY, score TEXT NOT NULL DEFAULT '0')")
+        self.db.execute("CREATE INDEX idx_test_scores_high ON test_scores (score) WHERE score > 10")
+        self.db.executemany("INSERT INTO test_scores (score) VALUES (?)", [(str(n),) for n in range(12)])
+        self.db.commit()
+        
+        class TestScore(Model):
+            _table_name = "test_scores"
+            _abstract = True
+            _fields = {
+                "id": Field(FieldType.INTEGER, primary_key=True),
+                "score": Field(FieldType.INTEGER, nullable=False, default=0),
+            }
+        
+        migrator = Migrator(self.db, batch_size=5, pause=0)
+        operations = migrator.plan([TestScore])
+        self.assertEqual([op.kind for op in operations], ["convert_column"])
+        migrator.run(operations)
+        
+        info = {row["name"]: row for row in self.db.fetchall("PRAGMA table_xinfo(test_scores)")}
+        self.assertEqual(info["score"]["type"], "INTEGER")
+        self.assertEqual(info["score"]["notnull"], 1)
+        self.assertEqual(info["score"]["dflt_value"], "0")
+        self.assertNotIn("score__migrating", info)
+        
+        indexes = [row["name"] for row in self.db.fetchall("PRAGMA index_list(test_scores)")]
+        self.assertIn("idx_test_scores_high", indexes)
+        self.db.execute("INSERT INTO test_scores DEFAULT VALUES")
+        rows = self.db.fetchall("SELECT score FROM test_scores ORDER BY id")
+        self.assertEqual([row["score"] for row in rows], list(range(12)) + [0])
+        self.assertEqual(migrator.plan([TestScore]), [])
+
+
 # ============================================================================
 # Executar testes
 # ============================================================================
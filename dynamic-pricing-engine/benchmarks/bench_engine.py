@@ -0,0 +1,296 @@
+"""
+Benchmarks do PricingRulesEngine
+Mede latência por contexto (percentis), throughput em lote, pico de
+memória e crescimento do price_history sobre catálogos sintéticos com
+distribuições realistas (0 a 20 concorrentes, faixas de estoque e idade
+de estoque).
+
+Uso:
+    cd dynamic-pricing-engine
+    python benchmarks/bench_engine.py --sizes 1000,100000,1000000
+    python benchmarks/bench_engine.py --output base.json
+    python benchmarks/bench_engine.py --baseline base.json --tolerance 0.15
+
+A saída é JSON; com --baseline, sai com código 1 se alguma métrica
+piorar além da tolerância.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.rules_engine.engine import PriceContext, PricingRulesEngine
+
+
+# ============================================================================
+# Catálogo sintético
+# ============================================================================
+
+MAX_COMPETITORS = 20
+INVENTORY_TIERS = np.array([0, 10, 50, 200, 800, 1500, 4000, 8000])
+INVENTORY_WEIGHTS = np.array([0.03, 0.12, 0.20, 0.25, 0.18, 0.12, 0.07, 0.03])
+
+
+def make_catalog(rows: int, rng: np.random.Generator, offset: int = 0) -> Dict[str, Any]:
+    """
+    Gera um bloco de catálogo em arrays (struct-of-arrays)
+
+    - custo log-normal (mediana ~40) e preço atual com markup de 10% a 90%
+    - concorrentes: 10% sem nenhum, demais entre 1 e 20 (mais comuns poucos)
+    - estoque em faixas, do esgotado ao crítico; idade do estoque exponencial
+    """
+    cost = np.round(rng.lognormal(mean=3.7, sigma=0.8, size=rows), 2)
+    current_price = np.round(cost * rng.uniform(1.1, 1.9, rows), 2)
+
+    counts = np.minimum(rng.geometric(0.25, rows), MAX_COMPETITORS)
+    counts[rng.random(rows) < 0.10] = 0
+    width = int(counts.max()) if rows else 0
+    competitor_prices = current_price[:, None] * rng.normal(1.0, 0.12, (rows, width))
+    competitor_prices = np.round(np.maximum(competitor_prices, 0.01), 2)
+    competitor_prices[np.arange(width)[None, :] >= counts[:, None]] = np.nan
+
+    tiers = rng.choice(len(INVENTORY_TIERS), size=rows, p=INVENTORY_WEIGHTS)
+    inventory_level = (INVENTORY_TIERS[tiers] * rng.uniform(0.5, 1.5, rows)).astype(np.int64)
+    days_in_stock = np.minimum(rng.exponential(90, rows), 720).astype(np.int64)
+    demand_forecast = rng.beta(2, 2, rows)
+
+    return {
+        "skus": np.array([f"SKU{offset + i:08d}" for i in range(rows)], dtype=object),
+        "current_price": current_price,
+        "cost": cost,
+        "competitor_prices": competitor_prices,
+        "inventory_level": inventory_level,
+        "days_in_stock": days_in_stock,
+        "demand_forecast": demand_forecast,
+    }
+
+
+def catalog_contexts(catalog: Dict[str, Any]) -> List[PriceContext]:
+    """Converte um bloco do catálogo em PriceContext (caminho escalar)"""
+    contexts = []
+    for i in range(len(catalog["cost"])):
+        competitors = catalog["competitor_prices"][i]
+        contexts.append(PriceContext(
+            sku=catalog["skus"][i],
+            current_price=float(catalog["current_price"][i]),
+            cost=float(catalog["cost"][i]),
+            competitor_prices=competitors[~np.isnan(competitors)].tolist(),
+            inventory_level=int(catalog["inventory_level"][i]),
+            days_in_stock=int(catalog["days_in_stock"][i]),
+            demand_forecast=float(catalog["demand_forecast"][i]),
+            margin_constraints=(0.10, 0.50),
+        ))
+    return contexts
+
+
+# ============================================================================
+# Cenários
+# ============================================================================
+
+def bench_single_latency(engine: PricingRulesEngine, contexts: List[PriceContext]) -> Dict[str, Any]:
+    """Latência de calculate_decision por contexto, em microssegundos"""
+    samples = np.empty(len(contexts))
+    clock = time.perf_counter_ns
+    for i, context in enumerate(contexts):
+        start = clock()
+        engine.calculate_decision(context)
+        samples[i] = clock() - start
+    samples /= 1000.0
+
+    return {
+        "ops": len(contexts),
+        "ops_per_sec": len(contexts) / (samples.sum() / 1e6),
+        "latency_us": {
+            "mean": float(samples.mean()),
+            "p50": float(np.percentile(samples, 50)),
+            "p90": float(np.percentile(samples, 90)),
+            "p99": float(np.percentile(samples, 99)),
+            "p999": float(np.percentile(samples, 99.9)),
+            "max": float(samples.max()),
+        },
+    }
+
+
+def bench_batch(engine: PricingRulesEngine, rows: int, chunk_size: int,
+                rng: np.random.Generator) -> Dict[str, Any]:
+    """
+    Throughput de calculate_prices_columnar sobre o catálogo inteiro, em blocos
+
+    O tempo cobre só o engine (geração do catálogo fica de fora); o pico de
+    memória é medido com tracemalloc no primeiro bloco; o histórico é
+    amostrado após cada bloco.
+    """
+    elapsed = 0.0
+    peak = None
+    history_growth = []
+
+    for offset in range(0, rows, chunk_size):
+        catalog = make_catalog(min(chunk_size, rows - offset), rng, offset)
+        measure_memory = peak is None
+        if measure_memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        engine.calculate_prices_columnar(**catalog)
+        elapsed += time.perf_counter() - start
+
+        if measure_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        history_growth.append({
+            "priced": offset + len(catalog["cost"]),
+            "history_rows": len(engine.price_history),
+            "history_bytes": engine.price_history.nbytes,
+        })
+
+    return {
+        "ops": rows,
+        "seconds": elapsed,
+        "ops_per_sec": rows / elapsed if elapsed > 0 else None,
+        "peak_memory_bytes": peak,
+        "chunk_size": chunk_size,
+        "history_growth": history_growth,
+    }
+
+
+def run_size(rows: int, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Executa os cenários para um tamanho de catálogo"""
+    rng = np.random.default_rng(args.seed)
+    engine = PricingRulesEngine(history_max_rows=args.history_max_rows)
+    engine.warmup()
+
+    results: List[Dict[str, Any]] = []
+
+    sample = make_catalog(min(rows, args.sample), rng)
+    single = bench_single_latency(engine, catalog_contexts(sample))
+    single.update({"rows": rows, "operation": "single_context"})
+    results.append(single)
+
+    batch = bench_batch(engine, rows, args.chunk_size, rng)
+    batch.update({"rows": rows, "operation": "batch_columnar"})
+    results.append(batch)
+
+    return results
+
+
+# ============================================================================
+# Comparação com baseline
+# ============================================================================
+
+# (métrica, maior é melhor)
+TRACKED_METRICS = [
+    ("ops_per_sec", True),
+    ("latency_us.p50", False),
+    ("latency_us.p99", False),
+    ("peak_memory_bytes", False),
+]
+
+
+def _metric(result: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = result
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Métricas que pioraram mais que `tolerance` (fração) em relação ao baseline"""
+    previous = {(r["operation"], r["rows"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        base = previous.get((result["operation"], result["rows"]))
+        if base is None:
+            continue
+        for path, higher_is_better in TRACKED_METRICS:
+            current, old = _metric(result, path), _metric(base, path)
+            if not current or not old:
+                continue
+            change = (current - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({
+                    "operation": result["operation"],
+                    "rows": result["rows"],
+                    "metric": path,
+                    "baseline": old,
+                    "current": current,
+                    "change": change,
+                })
+    return regressions
+
+
+def main(argv: List[str] = None) -> Dict[str, Any]:
+    """Ponto de entrada do runner"""
+    parser = argparse.ArgumentParser(description="Benchmarks do PricingRulesEngine")
+    parser.add_argument("--sizes", default="1000,100000,1000000",
+                        help="Tamanhos de catálogo separados por vírgula (ex.: até 10000000)")
+    parser.add_argument("--sample", type=int, default=10_000,
+                        help="Contextos medidos individualmente (latência)")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000,
+                        help="SKUs por lote no cenário de throughput")
+    parser.add_argument("--history-max-rows", type=int, default=1_000_000,
+                        help="Limite de linhas do price_history do engine")
+    parser.add_argument("--seed", type=int, default=42, help="Semente dos dados sintéticos")
+    parser.add_argument("--output", help="Arquivo para gravar o JSON (padrão: stdout)")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Piora relativa tolerada por métrica (padrão: 0.10)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+        },
+        "results": [],
+    }
+
+    for rows in sizes:
+        report["results"].extend(run_size(rows, args))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        report["regressions"] = compare(report, baseline, args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(output)
+    else:
+        print(output)
+
+    if report.get("regressions"):
+        for regression in report["regressions"]:
+            print(
+                f"REGRESSÃO {regression['operation']} rows={regression['rows']} "
+                f"{regression['metric']}: {regression['baseline']:.4g} -> "
+                f"{regression['current']:.4g} ({regression['change']:+.1%})",
+                file=sys.stderr,
+            )
+        sys.exit(1)
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
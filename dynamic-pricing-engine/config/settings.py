@@ -37,9 +37,21 @@ class Settings(BaseSettings):
     MINIMUM_MARGIN: float = float(os.getenv("MINIMUM_MARGIN", "0.10"))
     MAXIMUM_MARGIN: float = float(os.getenv("MAXIMUM_MARGIN", "0.50"))
     ELASTICITY_FACTOR: float = float(os.getenv("ELASTICITY_FACTOR", "1.5"))
+    REVENUE_OPTIMIZATION: bool = os.getenv("REVENUE_OPTIMIZATION", "false").lower() == "true"
+    # Point price elasticity of demand used by revenue optimization (negative, e.g. -1.5)
+    PRICE_ELASTICITY: float = float(os.getenv("PRICE_ELASTICITY", "-1.5"))
+
+    # Decision Memo
+    DECISION_MEMO_ENABLED: bool = os.getenv("DECISION_MEMO_ENABLED", "true").lower() == "true"
+    DECISION_MEMO_PRICE_TOLERANCE: float = float(os.getenv("DECISION_MEMO_PRICE_TOLERANCE", "0.01"))
+    DECISION_MEMO_DEMAND_TOLERANCE: float = float(os.getenv("DECISION_MEMO_DEMAND_TOLERANCE", "0.01"))
+    DECISION_MEMO_MAX_ENTRIES: int = int(os.getenv("DECISION_MEMO_MAX_ENTRIES", "100000"))
+    DECISION_MEMO_MAX_AGE: float = float(os.getenv("DECISION_MEMO_MAX_AGE", "1800"))
 
     # Performance
     BATCH_SIZE: int = int(os.getenv("BATCH_SIZE", "1000"))
+    RULES_BATCH_MODE: bool = os.getenv("RULES_BATCH_MODE", "true").lower() == "true"
+    RULES_BATCH_TIMEOUT_MS: int = int(os.getenv("RULES_BATCH_TIMEOUT_MS", "100"))
     WORKER_THREADS: int = int(os.getenv("WORKER_THREADS", "4"))
 
     @property
@@ -13,6 +13,7 @@ from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel
 from config.settings import settings
 from src.common import setup_json_logger
+from src.reasons import describe_reason
 from .models import DatabaseManager
 
 
@@ -35,6 +36,7 @@ class PricingDecisionResponse(BaseModel):
     recommended_price: float
     margin_pct: float
     confidence: float
+    reason_code: Optional[int] = None
     reason: str
     created_at: str
 
@@ -83,7 +85,8 @@ async def get_sku_decisions(
                 recommended_price=d.recommended_price,
                 margin_pct=d.margin_pct,
                 confidence=d.confidence,
-                reason=d.reason,
+                reason_code=d.reason_code,
+                reason=describe_reason(d.reason_code, d.reason),
                 created_at=d.created_at.isoformat()
             )
             for d in decisions
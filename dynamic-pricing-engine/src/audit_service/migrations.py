@@ -0,0 +1,71 @@
+"""
+Migrações do banco de auditoria.
+Executadas uma vez no deploy, antes de subir o Audit Service:
+
+    python -m src.audit_service.migrations
+"""
+import logging
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
+from config.settings import settings
+from src.common import setup_json_logger
+from src.reasons import parse_reason
+
+
+logger = setup_json_logger("audit_migrations")
+
+
+def add_reason_code(engine: Engine) -> int:
+    """
+    Acrescenta pricing_decisions.reason_code e o preenche a partir do texto
+    legado em reason (ver parse_reason)
+
+    Idempotente: a coluna só é criada se faltar e só linhas com reason_code
+    nulo são atualizadas. Textos fora do formato do engine ficam com
+    reason_code nulo e continuam exibidos como gravados (describe_reason).
+
+    Returns:
+        Número de decisões preenchidas
+    """
+    columns = {column['name'] for column in inspect(engine).get_columns("pricing_decisions")}
+    updated = 0
+    with engine.begin() as connection:
+        if "reason_code" not in columns:
+            connection.execute(text("ALTER TABLE pricing_decisions ADD COLUMN reason_code SMALLINT"))
+            logger.info("Coluna pricing_decisions.reason_code adicionada")
+
+        # Poucos textos distintos: um UPDATE por texto, não por linha
+        reasons = connection.execute(text(
+            "SELECT DISTINCT reason FROM pricing_decisions "
+            "WHERE reason_code IS NULL AND reason IS NOT NULL"
+        )).scalars().all()
+        for reason in reasons:
+            code = parse_reason(reason)
+            if code is None:
+                logger.warning(f"Razão legada sem código correspondente: {reason[:50]}")
+                continue
+            result = connection.execute(
+                text("UPDATE pricing_decisions SET reason_code = :code WHERE reason_code IS NULL AND reason = :reason"),
+                {"code": code, "reason": reason}
+            )
+            updated += result.rowcount
+    logger.info(f"reason_code preenchido em {updated} decisões")
+    return updated
+
+
+def main():
+    """Aplica as migrações pendentes no banco configurado"""
+    engine = create_engine(settings.database_url)
+    try:
+        add_reason_code(engine)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,13 @@ Modelos ORM SQLAlchemy para auditoria de preços.
 Garante persistência e rastreabilidade de todas as decisões.
 """
 from sqlalchemy import (
-    Column, String, Float, DateTime, Integer, JSON,
+    Column, String, Float, DateTime, Integer, SmallInteger, JSON,
     create_engine, Index, func
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from datetime import datetime
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,7 +30,8 @@ class PricingDecisionAudit(Base):
     recommended_price = Column(Float, nullable=False)
     margin_pct = Column(Float, nullable=False)
     confidence = Column(Float, nullable=False)
-    reason = Column(String(500), nullable=True)
+    reason_code = Column(SmallInteger, nullable=True)  # ReasonCode (src.reasons)
+    reason = Column(String(500), nullable=True)  # Legado: texto das decisões anteriores ao reason_code
     competitor_prices = Column(JSON, nullable=True)
     
     # Rastreabilidade
@@ -109,10 +111,16 @@ class DatabaseManager:
         recommended_price: float,
         margin_pct: float,
         confidence: float,
-        reason: str,
-        competitor_prices: list
+        reason_code: Optional[int],
+        competitor_prices: list,
+        reason: Optional[str] = None
     ) -> PricingDecisionAudit:
-        """Registra uma decisão de preço"""
+        """
+        Registra uma decisão de preço
+
+        Args:
+            reason: Texto legado, presente só em mensagens anteriores ao reason_code
+        """
         session = self.get_session()
         try:
             decision = PricingDecisionAudit(
@@ -121,6 +129,7 @@ class DatabaseManager:
                 recommended_price=recommended_price,
                 margin_pct=margin_pct,
                 confidence=confidence,
+                reason_code=reason_code,
                 reason=reason,
                 competitor_prices=competitor_prices
             )
@@ -109,8 +109,9 @@ class AuditServiceWorker:
                 recommended_price=data.get("recommended_price", 0.0),
                 margin_pct=data.get("margin_pct", 0.0),
                 confidence=data.get("confidence", 0.0),
-                reason=data.get("reason", ""),
-                competitor_prices=data.get("competitor_prices", [])
+                reason_code=data.get("reason_code"),
+                competitor_prices=data.get("competitor_prices", []),
+                reason=data.get("reason")
             )
             
             logger.debug(f"Decisão registrada: {data.get('sku')}")
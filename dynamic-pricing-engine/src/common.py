@@ -38,14 +38,18 @@ class KafkaMessage:
         self.timestamp = timestamp or datetime.utcnow()
         self.metadata = metadata or {}
 
-    def to_json(self) -> str:
-        """Serializa para JSON"""
-        return json.dumps({
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte para dicionário (já serializável em JSON)"""
+        return {
             "event_type": self.event_type,
             "timestamp": self.timestamp.isoformat(),
             "data": self.data,
             "metadata": self.metadata
-        })
+        }
+
+    def to_json(self) -> str:
+        """Serializa para JSON"""
+        return json.dumps(self.to_dict())
 
     @staticmethod
     def from_json(json_str: str) -> "KafkaMessage":
@@ -69,7 +73,7 @@ class PricingDecision:
         recommended_price: float,
         margin_pct: float,
         confidence: float,
-        reason: str,
+        reason_code: int,
         competitor_prices: Optional[list] = None
     ):
         self.sku = sku
@@ -77,7 +81,7 @@ class PricingDecision:
         self.recommended_price = recommended_price
         self.margin_pct = margin_pct
         self.confidence = confidence
-        self.reason = reason
+        self.reason_code = int(reason_code)  # ReasonCode (src.reasons); texto só nas APIs
         self.competitor_prices = competitor_prices or []
         self.created_at = datetime.utcnow()
 
@@ -89,7 +93,7 @@ class PricingDecision:
             "recommended_price": self.recommended_price,
             "margin_pct": self.margin_pct,
             "confidence": self.confidence,
-            "reason": self.reason,
+            "reason_code": self.reason_code,
             "competitor_prices": self.competitor_prices,
             "created_at": self.created_at.isoformat()
         }
@@ -15,6 +15,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from config.settings import settings
 from src.common import setup_json_logger
+from src.reasons import describe_reason
 from .cache import RedisCache
 from .service import PricingService
 
@@ -45,6 +46,7 @@ class PriceRecommendationResponse(BaseModel):
     recommended_price: float
     margin_pct: float
     confidence: float
+    reason_code: Optional[int] = None
     reason: str
     source: str
     retrieved_at: str
@@ -54,6 +56,19 @@ class BatchPriceRequest(BaseModel):
     skus: list[str]
 
 
+def with_reason_text(price_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Acrescenta o texto da razão; decisões trafegam só com reason_code, mas
+    entradas do cache anteriores a ele têm apenas o texto em 'reason'
+    """
+    reason_code = price_data.get('reason_code')
+    return {
+        **price_data,
+        'reason_code': reason_code,
+        'reason': describe_reason(reason_code, price_data.get('reason')),
+    }
+
+
 @app.on_event("startup")
 async def startup():
     """Inicialização da aplicação"""
@@ -106,7 +121,7 @@ async def get_recommended_price(
                 detail=f"Preço não disponível para SKU {sku}"
             )
         
-        response = PriceRecommendationResponse(**price_data)
+        response = PriceRecommendationResponse(**with_reason_text(price_data))
         
         # Adiciona métricas se solicitado
         if include_metrics:
@@ -147,7 +162,7 @@ async def get_batch_prices(request: BatchPriceRequest) -> Dict[str, Any]:
         results = await asyncio.gather(*tasks, return_exceptions=False)
         
         response = {
-            sku: result
+            sku: with_reason_text(result)
             for sku, result in zip(request.skus, results)
             if result is not None
         }
@@ -8,6 +8,8 @@ from typing import Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
 
+from src.reasons import ReasonCode
+
 logger = logging.getLogger(__name__)
 
 
@@ -74,7 +76,7 @@ class PricingService:
                 'current_price': fallback_price,
                 'margin_pct': 0.20,  # Margem padrão
                 'confidence': 0.3,  # Confiança baixa
-                'reason': 'Fallback pricing - cache indisponível',
+                'reason_code': int(ReasonCode.FALLBACK),
                 'source': PricingSource.FALLBACK.value,
                 'retrieved_at': datetime.utcnow().isoformat()
             }
@@ -0,0 +1,109 @@
+"""
+Códigos de razão das decisões de preço
+Cada decisão carrega um bitmask pequeno em vez de texto livre; o texto
+só é montado na borda (APIs), a partir do código.
+"""
+from enum import IntFlag
+from typing import Optional
+
+
+class ReasonCode(IntFlag):
+    """Flags de razão de uma decisão (sem flag de direção = estável)"""
+    STABLE = 0
+    INCREASE = 1
+    DISCOUNT = 2
+    AGGRESSIVE_POSITIONING = 4
+    PREMIUM_POSITIONING = 8
+    FALLBACK = 16
+
+
+def encode_reason(direction_code, positioning_code):
+    """
+    Combina os códigos de direção (0 estável, 1 aumento, 2 desconto) e de
+    posicionamento (0 neutro, 1 agressivo, 2 premium) em um ReasonCode
+
+    Funciona com inteiros e com arrays NumPy de inteiros.
+    """
+    return direction_code | (positioning_code << 2)
+
+
+# Valores inteiros das flags: operações com IntFlag são lentas no caminho quente
+_INCREASE = int(ReasonCode.INCREASE)
+_DISCOUNT = int(ReasonCode.DISCOUNT)
+_AGGRESSIVE = int(ReasonCode.AGGRESSIVE_POSITIONING)
+_PREMIUM = int(ReasonCode.PREMIUM_POSITIONING)
+_FALLBACK = int(ReasonCode.FALLBACK)
+
+
+def render_reason(code: int, inventory_level: Optional[int] = None) -> str:
+    """
+    Texto legível de um código de razão
+
+    Args:
+        inventory_level: Incluído no texto de desconto quando conhecido
+    """
+    code = int(code)
+    if code & _FALLBACK:
+        return "Fallback pricing - cache indisponível"
+
+    if code & _INCREASE:
+        reason = "INCREASE: High demand or favorable competition"
+    elif code & _DISCOUNT:
+        if inventory_level is None:
+            reason = "DISCOUNT: High inventory or low demand"
+        else:
+            reason = f"DISCOUNT: High inventory ({inventory_level}) or low demand"
+    else:
+        reason = "STABLE: Market aligned"
+
+    if code & _AGGRESSIVE:
+        reason += " | Aggressive positioning"
+    elif code & _PREMIUM:
+        reason += " | Premium positioning"
+    return reason
+
+
+def describe_reason(reason_code: Optional[int], legacy_reason: Optional[str] = None,
+                    inventory_level: Optional[int] = None) -> str:
+    """
+    Texto da razão de uma decisão armazenada
+
+    Decisões gravadas antes do reason_code (cache e auditoria) só têm o
+    texto: nesse caso ele é devolvido como está.
+    """
+    if reason_code is None:
+        return legacy_reason or ""
+    return render_reason(reason_code, inventory_level)
+
+
+def parse_reason(text: Optional[str]) -> Optional[int]:
+    """
+    ReasonCode de um texto de razão legado (inverso de render_reason)
+
+    Usado para preencher reason_code das decisões gravadas antes dele.
+
+    Returns:
+        O código, ou None se o texto não segue o formato gerado pelo engine
+    """
+    if not text:
+        return None
+    if text.startswith("Fallback pricing"):
+        return _FALLBACK
+
+    direction, *positioning = text.split(" | ")
+    if direction.startswith("INCREASE:"):
+        code = _INCREASE
+    elif direction.startswith("DISCOUNT:"):
+        code = _DISCOUNT
+    elif direction.startswith("STABLE:"):
+        code = 0
+    else:
+        return None
+
+    if positioning == ["Aggressive positioning"]:
+        code |= _AGGRESSIVE
+    elif positioning == ["Premium positioning"]:
+        code |= _PREMIUM
+    elif positioning:
+        return None
+    return code
@@ -1,10 +1,67 @@
 """Pricing rules engine with complex business logic."""
+import inspect
+import time
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 from dataclasses import dataclass
-from datetime import datetime
-from numba import jit
+from datetime import datetime, timedelta
+
+from ..reasons import encode_reason, render_reason
+from .history import PriceHistoryStore
+from .pipeline import RulePipeline
+from .trends import TrendTracker
+
+
+def pad_competitor_prices(price_lists: Sequence[Sequence[float]]) -> np.ndarray:
+    """Converte listas de preços de concorrentes em uma matriz (n, k) preenchida com NaN"""
+    width = max((len(prices) for prices in price_lists), default=0)
+    matrix = np.full((len(price_lists), width), np.nan)
+    for row, prices in enumerate(price_lists):
+        matrix[row, :len(prices)] = prices
+    return matrix
+
+
+def competitor_features(competitor_prices: np.ndarray, rows: int) -> Dict[str, np.ndarray]:
+    """
+    Estatísticas de concorrência por linha, independentes dos parâmetros
+
+    Returns:
+        Dict com num_competitors, median_price e mean_price (NaN sem concorrentes)
+    """
+    competitor_prices = np.asarray(competitor_prices, dtype=np.float64)
+    if competitor_prices.ndim != 2 or competitor_prices.shape[0] != rows:
+        raise ValueError("competitor_prices deve ser uma matriz (n, k) alinhada aos demais arrays")
+    num_competitors = np.count_nonzero(~np.isnan(competitor_prices), axis=1)
+    has_competitors = num_competitors > 0
+
+    median_price = np.full(rows, np.nan)
+    mean_price = np.full(rows, np.nan)
+    if has_competitors.any():
+        present = competitor_prices[has_competitors]
+        median_price[has_competitors] = np.nanmedian(present, axis=1)
+        mean_price[has_competitors] = np.nanmean(present, axis=1)
+
+    return {
+        'num_competitors': num_competitors,
+        'median_price': median_price,
+        'mean_price': mean_price,
+    }
+
+
+def _round_prices(prices: np.ndarray) -> np.ndarray:
+    """
+    Arredonda para 2 casas com o mesmo resultado de round() do Python
+
+    np.round multiplica por 100 antes de arredondar e pode divergir de
+    round() perto de x.xx5; esses poucos casos são refeitos em Python.
+    """
+    rounded = np.round(prices, 2)
+    scaled = prices * 100
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for index in ties:
+        rounded[index] = round(float(prices[index]), 2)
+    return rounded
 
 
 @dataclass
@@ -51,7 +108,16 @@ class PricingRulesEngine:
         confidence_boost_demand: float = 0.15,
         min_demand_confidence: float = 0.3,
         max_demand_confidence: float = 0.7,
+        revenue_optimization: bool = False,
+        price_elasticity: float = -1.5,
+        history_max_rows: Optional[int] = 1_000_000,
+        history_retention: Optional[timedelta] = None,
+        trend_ewma_alpha: float = 0.1,
+        trend_window: Optional[int] = None,
     ):
+        # Elasticidade-preço da demanda: negativa, a demanda cai quando o preço sobe
+        if price_elasticity >= 0:
+            raise ValueError("price_elasticity deve ser < 0")
         self.min_margin = min_margin
         self.max_margin = max_margin
         self.elasticity_factor = elasticity_factor
@@ -75,173 +141,266 @@ class PricingRulesEngine:
         self.confidence_boost_demand = confidence_boost_demand
         self.min_demand_confidence = min_demand_confidence
         self.max_demand_confidence = max_demand_confidence
+        self.revenue_optimization = revenue_optimization
+        self.price_elasticity = price_elasticity
         self._default_price = 100.0
-        self.price_history = pd.DataFrame()
+        self.price_history = PriceHistoryStore(
+            max_rows=history_max_rows,
+            retention=history_retention
+        )
+        self.trends = TrendTracker(ewma_alpha=trend_ewma_alpha, window=trend_window)
+        self._parallel = None
+        self.pipeline = RulePipeline()
 
     def calculate_price(self, context: PriceContext) -> Tuple[float, str, float]:
-        min_price = self._calculate_minimum_price(context.cost)
-        competitive_price = self._analyze_competition(context.competitor_prices)
-        demand_adjusted_price = self._apply_demand_elasticity(
-            competitive_price,
-            context.demand_forecast
-        )
-        inventory_adjusted_price = self._adjust_for_inventory(
-            demand_adjusted_price,
-            context.inventory_level,
-            context.days_in_stock
-        )
-        final_price = self._enforce_margin_constraints(
-            inventory_adjusted_price,
-            context.cost,
-            min_price
+        """Como calculate_decision, com a razão já convertida em texto"""
+        price, reason_code, confidence = self.calculate_decision(context)
+        return price, render_reason(reason_code, context.inventory_level), confidence
+
+    def calculate_decision(self, context: PriceContext) -> Tuple[float, int, float]:
+        """
+        Calcula o preço de um contexto com o kernel escalar do pipeline
+
+        Returns:
+            (preço recomendado, ReasonCode, confiança)
+        """
+        final_price, confidence, direction_code, positioning_code = self.pipeline.evaluate_one(
+            self._kernel_params(),
+            float(context.cost),
+            float(context.current_price),
+            np.asarray(context.competitor_prices, dtype=np.float64),
+            # Tipos fixos: uma única especialização do kernel, compilada no warmup()
+            float(context.inventory_level),
+            float(context.days_in_stock),
+            float(context.demand_forecast),
         )
-        confidence = self._calculate_confidence(context)
-        reason = self._generate_reason(
-            context,
-            min_price,
-            competitive_price,
-            demand_adjusted_price,
-            final_price
+        return round(final_price, 2), encode_reason(direction_code, positioning_code), confidence
+
+    def warmup(self) -> float:
+        """
+        Compila (ou carrega do cache em disco) os kernels Numba
+
+        Deve ser chamado na inicialização do worker, para que a primeira
+        decisão não pague a compilação JIT.
+
+        Returns:
+            Tempo gasto em segundos
+        """
+        start = time.perf_counter()
+        for competitor_prices in ([], [100.0, 98.0, 102.0]):
+            self.calculate_price(PriceContext(
+                sku="__warmup__",
+                current_price=100.0,
+                cost=50.0,
+                competitor_prices=competitor_prices,
+                inventory_level=100,
+                days_in_stock=30,
+                demand_forecast=0.5,
+                margin_constraints=(self.min_margin, self.max_margin)
+            ))
+        self.evaluate_arrays(
+            np.array([100.0]), np.array([50.0]), pad_competitor_prices([[100.0, 98.0, 102.0]]),
+            np.array([100]), np.array([30]), np.array([0.5])
         )
-        return round(final_price, 2), reason, confidence
+        return time.perf_counter() - start
+
+    def _kernel_params(self) -> Tuple[float, ...]:
+        """Parâmetros do engine na ordem esperada pelos kernels do pipeline"""
+        return self.pipeline.params(self)
+
+    def rule_key(self) -> Tuple:
+        """
+        Identifica as regras em uso: estágios do pipeline e valores dos
+        seus parâmetros (ver DecisionMemo.fingerprint)
+        """
+        return self.pipeline.stage_names + self._kernel_params()
 
     def calculate_batch_prices(
         self,
-        contexts: List[PriceContext]
+        contexts: List[PriceContext],
+        workers: Optional[int] = None
     ) -> pd.DataFrame:
-        results = []
-        for context in contexts:
-            price, reason, confidence = self.calculate_price(context)
-            margin = (price - context.cost) / context.cost if context.cost > 0 else 0
-            results.append({
-                'sku': context.sku,
-                'current_price': context.current_price,
-                'recommended_price': price,
-                'margin_pct': margin,
-                'confidence': confidence,
-                'reason': reason,
-                'cost': context.cost,
-                'demand_forecast': context.demand_forecast,
-                'inventory_level': context.inventory_level,
-                'timestamp': datetime.utcnow()
-            })
-        
-        df = pd.DataFrame(results)
-        self.price_history = pd.concat([self.price_history, df], ignore_index=True)
-        return df
-
-    def _calculate_minimum_price(self, cost: float) -> float:
-        """Preço mínimo: custo + margem mínima"""
-        return cost * (1 + self.min_margin)
-
-    def _analyze_competition(self, competitor_prices: List[float]) -> float:
-        if not competitor_prices:
-            return self._default_price
-        prices_series = pd.Series(competitor_prices)
-        median_price = prices_series.median()
-        return median_price * (1 - self.competitive_discount)
-
-    def _apply_demand_elasticity(
-        self,
-        base_price: float,
-        demand_forecast: float
-    ) -> float:
-        return self._elasticity_calc(base_price, demand_forecast, self.elasticity_factor)
-
-    @staticmethod
-    @jit(nopython=True)
-    def _elasticity_calc(base_price: float, demand: float, factor: float) -> float:
-        deviation = (demand - 0.5) * 2
-        elasticity_multiplier = 1.0 + (deviation * factor * 0.1)
-        return base_price * elasticity_multiplier
-
-    def _adjust_for_inventory(
+        """
+        Calcula preços de um lote de contextos pelo caminho colunar
+
+        Args:
+            workers: Se > 1, avalia o lote em shards paralelos
+                     (ver ParallelPricingEngine)
+        """
+        return self.calculate_prices_columnar(
+            skus=[context.sku for context in contexts],
+            current_price=np.array([context.current_price for context in contexts], dtype=np.float64),
+            cost=np.array([context.cost for context in contexts], dtype=np.float64),
+            competitor_prices=pad_competitor_prices([context.competitor_prices for context in contexts]),
+            inventory_level=np.array([context.inventory_level for context in contexts], dtype=np.int64),
+            days_in_stock=np.array([context.days_in_stock for context in contexts], dtype=np.int64),
+            demand_forecast=np.array([context.demand_forecast for context in contexts], dtype=np.float64),
+            workers=workers,
+        )
+
+    def calculate_prices_columnar(
         self,
-        base_price: float,
-        inventory_level: int,
-        days_in_stock: int
-    ) -> float:
-        inventory_discount = 1.0
-        
-        if inventory_level > self.critical_inventory_threshold:
-            inventory_discount *= (1 - self.critical_inventory_discount)
-        elif inventory_level > self.high_inventory_threshold:
-            inventory_discount *= (1 - self.high_inventory_discount)
-        
-        if days_in_stock > self.critical_stock_days_threshold:
-            inventory_discount *= (1 - self.critical_stock_discount)
-        elif days_in_stock > self.old_stock_days_threshold:
-            inventory_discount *= (1 - self.old_stock_discount)
-        
-        return base_price * inventory_discount
-
-    def _enforce_margin_constraints(
+        skus: Sequence[str],
+        current_price: np.ndarray,
+        cost: np.ndarray,
+        competitor_prices: np.ndarray,
+        inventory_level: np.ndarray,
+        days_in_stock: np.ndarray,
+        demand_forecast: np.ndarray,
+        workers: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Calcula preços para arrays de SKUs (struct-of-arrays)
+
+        Estatísticas de concorrência em NumPy e regras no mesmo kernel
+        do caminho escalar, com resultados idênticos a calculate_price.
+
+        Args:
+            competitor_prices: Matriz (n, k) com NaN nas posições vazias
+                               (ver pad_competitor_prices)
+            workers: Se > 1, avalia o lote em shards paralelos; histórico
+                     e tendências continuam atualizados neste processo
+        """
+        # O tempo por estágio (profile) só é medido no processo atual
+        use_parallel = workers and workers > 1 and not self.pipeline.profile
+        evaluator = self.parallel(workers) if use_parallel else self
+        arrays = evaluator.evaluate_arrays(
+            current_price, cost, competitor_prices,
+            inventory_level, days_in_stock, demand_forecast
+        )
+        price = arrays['recommended_price']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            margin = np.where(cost > 0, (price - cost) / cost, 0.0)
+
+        columns = {
+            'sku': np.asarray(skus, dtype=object),
+            'current_price': current_price,
+            'recommended_price': price,
+            'margin_pct': margin,
+            'confidence': arrays['confidence'],
+            'reason_code': encode_reason(
+                arrays['direction_code'].astype(np.uint8), arrays['positioning_code'].astype(np.uint8)
+            ),
+            'cost': cost,
+            'demand_forecast': demand_forecast,
+            'inventory_level': inventory_level,
+            'timestamp': np.datetime64(datetime.utcnow(), 'ns'),
+        }
+        self.price_history.append(columns)
+        self.trends.update(columns['sku'], price, margin, columns['confidence'])
+        return pd.DataFrame(columns, index=pd.RangeIndex(len(price)))
+
+    def use_pipeline(self, pipeline: Optional[RulePipeline] = None) -> RulePipeline:
+        """
+        Troca o pipeline de regras do engine
+
+        Vale para todos os caminhos: calculate_decision, lote, shards
+        paralelos e simulação.
+
+        Args:
+            pipeline: RulePipeline a usar (padrão: estágios padrão, com
+                      contadores zerados)
+
+        Returns:
+            O pipeline em uso; pipeline.stats() traz as medições
+        """
+        self.pipeline = pipeline if pipeline is not None else RulePipeline()
+        return self.pipeline
+
+    def parallel(self, workers: Optional[int] = None):
+        """
+        ParallelPricingEngine associado a este engine
+
+        O pool é mantido entre chamadas e recriado se workers mudar;
+        use close() para encerrá-lo.
+        """
+        from .parallel import ParallelPricingEngine
+
+        if self._parallel is None or (workers and self._parallel.workers != workers):
+            self.close()
+            self._parallel = ParallelPricingEngine(self, workers=workers)
+        return self._parallel
+
+    def close(self):
+        """Encerra o pool de processos da precificação paralela, se houver"""
+        if self._parallel is not None:
+            self._parallel.close()
+            self._parallel = None
+
+    def evaluate_arrays(
         self,
-        suggested_price: float,
-        cost: float,
-        min_price: float
-    ) -> float:
-        price = max(suggested_price, min_price)
-        max_price = cost * (1 + self.max_margin)
-        return min(price, max_price)
-
-    def _calculate_confidence(self, context: PriceContext) -> float:
-        confidence = self.base_confidence
-        
-        num_competitors = len(context.competitor_prices)
-        if num_competitors >= 3:
-            confidence += self.confidence_boost_many_competitors
-        elif num_competitors >= 1:
-            confidence += self.confidence_boost_few_competitors
-        
-        if context.inventory_level > 0:
-            confidence += self.confidence_boost_inventory
-        
-        if self.min_demand_confidence < context.demand_forecast < self.max_demand_confidence:
-            confidence += self.confidence_boost_demand
-        
-        return min(confidence, 1.0)
-
-    def _generate_reason(
+        current_price: np.ndarray,
+        cost: np.ndarray,
+        competitor_prices: np.ndarray,
+        inventory_level: np.ndarray,
+        days_in_stock: np.ndarray,
+        demand_forecast: np.ndarray,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Avalia todas as regras sobre arrays, sem montar DataFrame
+
+        Returns:
+            Dict com recommended_price, confidence, direction_code
+            (0 estável, 1 aumento, 2 desconto) e positioning_code
+            (0 neutro, 1 agressivo, 2 premium)
+        """
+        return self.apply_rules(
+            competitor_features(competitor_prices, len(cost)),
+            current_price, cost, inventory_level, days_in_stock, demand_forecast
+        )
+
+    def apply_rules(
         self,
-        context: PriceContext,
-        min_price: float,
-        competitive_price: float,
-        demand_adjusted_price: float,
-        final_price: float
-    ) -> str:
-        price_delta = ((final_price - context.current_price) / context.current_price * 100)
-        reasons = []
-        
-        if price_delta > self.price_increase_threshold:
-            reasons.append("INCREASE: High demand or favorable competition")
-        elif price_delta < -self.price_decrease_threshold:
-            reasons.append(f"DISCOUNT: High inventory ({context.inventory_level}) or low demand")
-        else:
-            reasons.append("STABLE: Market aligned")
-        
-        if context.competitor_prices:
-            avg_comp = np.mean(context.competitor_prices)
-            if final_price < avg_comp * (1 - self.aggressive_positioning_threshold):
-                reasons.append("Aggressive positioning")
-            elif final_price > avg_comp * (1 + self.premium_positioning_threshold):
-                reasons.append("Premium positioning")
-        
-        return " | ".join(reasons)
-
-    def get_price_history(self) -> pd.DataFrame:
-        return self.price_history.copy()
+        features: Dict[str, np.ndarray],
+        current_price: np.ndarray,
+        cost: np.ndarray,
+        inventory_level: np.ndarray,
+        days_in_stock: np.ndarray,
+        demand_forecast: np.ndarray,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Aplica as regras a partir de estatísticas de concorrência já calculadas
 
-    def analyze_price_trends(self, sku: Optional[str] = None) -> Dict:
-        if self.price_history.empty:
-            return {}
-        df = self.price_history if not sku else self.price_history[self.price_history['sku'] == sku]
-        if df.empty:
-            return {}
+        As estatísticas não dependem dos parâmetros do engine, então podem
+        ser reaproveitadas entre avaliações (ver simulation.ParameterSweep).
+
+        Args:
+            features: Resultado de competitor_features
+        """
+        final_price, confidence, direction_code, positioning_code = self.pipeline.evaluate(
+            self._kernel_params(),
+            np.asarray(features['num_competitors'], dtype=np.int64),
+            features['median_price'],
+            features['mean_price'],
+            np.asarray(cost, dtype=np.float64),
+            np.asarray(current_price, dtype=np.float64),
+            # Tipos fixos, como em calculate_price: uma única especialização do kernel
+            np.asarray(inventory_level, dtype=np.float64),
+            np.asarray(days_in_stock, dtype=np.float64),
+            np.asarray(demand_forecast, dtype=np.float64),
+        )
         return {
-            'mean_recommended_price': df['recommended_price'].mean(),
-            'mean_margin': df['margin_pct'].mean(),
-            'price_volatility': df['recommended_price'].std(),
-            'total_decisions': len(df),
-            'avg_confidence': df['confidence'].mean()
+            'recommended_price': _round_prices(final_price),
+            'confidence': confidence,
+            'direction_code': direction_code,
+            'positioning_code': positioning_code,
         }
+
+    def get_price_history(self, sku: Optional[str] = None) -> pd.DataFrame:
+        return self.price_history.to_frame(sku)
+
+    def analyze_price_trends(self, sku: Optional[str] = None) -> Dict:
+        """
+        Estatísticas de tendência de um SKU (ou de todas as decisões)
+
+        Lidas dos acumuladores incrementais em O(1); cobrem todas as decisões
+        produzidas, inclusive as que já saíram da retenção do histórico.
+        """
+        return self.trends.stats(sku or None)
+
+
+# Parâmetros de regra do construtor (histórico e tendências não afetam as decisões)
+RULE_PARAMETERS: Tuple[str, ...] = tuple(
+    name for name in inspect.signature(PricingRulesEngine.__init__).parameters
+    if name != 'self' and not name.startswith(('history_', 'trend_'))
+)
@@ -0,0 +1,192 @@
+"""
+Histórico de decisões de preço em colunas.
+Armazena as decisões em blocos de arrays pré-alocados, com append O(1)
+amortizado e retenção por quantidade de linhas ou janela de tempo.
+"""
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Colunas do histórico e seus dtypes
+HISTORY_COLUMNS: Dict[str, object] = {
+    'sku': object,
+    'current_price': np.float64,
+    'recommended_price': np.float64,
+    'margin_pct': np.float64,
+    'confidence': np.float64,
+    'reason_code': np.uint8,
+    'cost': np.float64,
+    'demand_forecast': np.float64,
+    'inventory_level': np.int64,
+    'timestamp': 'datetime64[ns]',
+}
+
+
+class _Chunk:
+    """Bloco de arrays pré-alocados; as linhas válidas ficam em [start, size)"""
+
+    __slots__ = ('columns', 'start', 'size')
+
+    def __init__(self, capacity: int):
+        self.columns = {
+            name: np.empty(capacity, dtype=dtype) for name, dtype in HISTORY_COLUMNS.items()
+        }
+        self.start = 0
+        self.size = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self.columns['sku'])
+
+    def view(self, name: str) -> np.ndarray:
+        """View (sem cópia) das linhas válidas de uma coluna"""
+        return self.columns[name][self.start:self.size]
+
+
+class PriceHistoryStore:
+    """
+    Histórico limitado de decisões de preço
+
+    As linhas são gravadas em blocos de chunk_size linhas; blocos antigos
+    são descartados inteiros quando o limite de linhas ou a janela de
+    retenção é ultrapassado, sem reconstruir o histórico a cada lote.
+    """
+
+    def __init__(
+        self,
+        max_rows: Optional[int] = 1_000_000,
+        retention: Optional[timedelta] = None,
+        chunk_size: int = 65_536,
+    ):
+        """
+        Args:
+            max_rows: Quantidade máxima de linhas mantidas (None = sem limite)
+            retention: Janela de tempo mantida, pelo timestamp das decisões
+            chunk_size: Linhas por bloco pré-alocado
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size deve ser > 0")
+        if max_rows is not None and max_rows <= 0:
+            raise ValueError("max_rows deve ser > 0")
+
+        self.max_rows = max_rows
+        self.retention = retention
+        self.chunk_size = chunk_size
+        self._chunks: Deque[_Chunk] = deque()
+        self._rows = 0
+
+    def __len__(self) -> int:
+        return self._rows
+
+    @property
+    def empty(self) -> bool:
+        return self._rows == 0
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes alocados pelos blocos (a coluna sku conta só as referências)"""
+        return sum(
+            column.nbytes for chunk in self._chunks for column in chunk.columns.values()
+        )
+
+    def append(self, columns: Mapping[str, object]):
+        """
+        Acrescenta um lote de decisões
+
+        Args:
+            columns: Array (ou escalar, para timestamp) por coluna de HISTORY_COLUMNS
+        """
+        count = len(columns['sku'])
+        if count == 0:
+            return
+
+        values = {}
+        for name, dtype in HISTORY_COLUMNS.items():
+            column = columns[name]
+            if np.ndim(column) == 0:
+                column = np.full(count, column, dtype=dtype)
+            values[name] = np.asarray(column, dtype=dtype)
+
+        offset = 0
+        while offset < count:
+            if not self._chunks or self._chunks[-1].size == self._chunks[-1].capacity:
+                self._chunks.append(_Chunk(self.chunk_size))
+            chunk = self._chunks[-1]
+            take = min(count - offset, chunk.capacity - chunk.size)
+            for name, column in values.items():
+                chunk.columns[name][chunk.size:chunk.size + take] = column[offset:offset + take]
+            chunk.size += take
+            offset += take
+
+        self._rows += count
+        self._evict()
+
+    def _evict(self):
+        """Aplica o limite de linhas e a janela de retenção"""
+        if self.max_rows is not None:
+            excess = self._rows - self.max_rows
+            while excess > 0:
+                chunk = self._chunks[0]
+                available = chunk.size - chunk.start
+                if available <= excess:
+                    self._chunks.popleft()
+                    self._rows -= available
+                    excess -= available
+                else:
+                    chunk.start += excess
+                    self._rows -= excess
+                    excess = 0
+
+        if self.retention is not None and self._chunks:
+            cutoff = np.datetime64(datetime.utcnow() - self.retention, 'ns')
+            while self._chunks:
+                chunk = self._chunks[0]
+                timestamps = chunk.view('timestamp')
+                # Timestamps crescentes: busca binária pelo primeiro que fica
+                keep_from = int(np.searchsorted(timestamps, cutoff, side='left'))
+                if keep_from == 0:
+                    break
+                self._rows -= keep_from
+                if keep_from == len(timestamps) and chunk is not self._chunks[-1]:
+                    self._chunks.popleft()
+                else:
+                    chunk.start += keep_from
+                    if keep_from < len(timestamps):
+                        break
+
+    def clear(self):
+        """Remove todas as linhas"""
+        self._chunks.clear()
+        self._rows = 0
+
+    def column(self, name: str, sku: Optional[str] = None) -> np.ndarray:
+        """
+        Retorna uma coluna do histórico, opcionalmente filtrada por SKU
+
+        Apenas a coluna pedida é copiada (concatenando os blocos).
+        """
+        if name not in HISTORY_COLUMNS:
+            raise KeyError(f"Coluna desconhecida: {name}")
+        return self.columns([name], sku)[name]
+
+    def columns(self, names: List[str], sku: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Retorna várias colunas do histórico, opcionalmente filtradas por SKU"""
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        for chunk in self._chunks:
+            mask = None if sku is None else chunk.view('sku') == sku
+            for name in names:
+                view = chunk.view(name)
+                parts[name].append(view if mask is None else view[mask])
+
+        return {
+            name: np.concatenate(arrays) if arrays else np.empty(0, dtype=HISTORY_COLUMNS[name])
+            for name, arrays in parts.items()
+        }
+
+    def to_frame(self, sku: Optional[str] = None) -> pd.DataFrame:
+        """Materializa o histórico (ou as linhas de um SKU) como DataFrame"""
+        return pd.DataFrame(self.columns(list(HISTORY_COLUMNS), sku))
@@ -0,0 +1,110 @@
+"""
+Memoização de decisões por fingerprint das entradas.
+SKUs cujos dados não mudaram (dentro da tolerância de arredondamento)
+desde a última decisão reaproveitam o resultado anterior, sem recalcular
+nem republicar.
+"""
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from .engine import PriceContext
+
+
+# (recommended_price, reason_code, confidence), como em calculate_decision
+Decision = Tuple[float, int, float]
+
+
+class DecisionMemo:
+    """
+    Última decisão por SKU, indexada pelo fingerprint do PriceContext
+
+    Preços e demanda são quantizados pela tolerância configurada antes do
+    fingerprint; estoque e dias em estoque entram exatos (são comparados
+    com os limiares das regras). Os parâmetros do engine fazem parte do fingerprint,
+    então qualquer mudança de regra invalida as decisões anteriores.
+    """
+
+    def __init__(
+        self,
+        price_tolerance: float = 0.01,
+        demand_tolerance: float = 0.01,
+        max_entries: int = 100_000,
+        max_age: Optional[float] = None,
+    ):
+        """
+        Args:
+            price_tolerance: Passo de arredondamento dos preços (current, cost e concorrentes)
+            demand_tolerance: Passo de arredondamento de demand_forecast
+            max_entries: Quantidade máxima de SKUs lembrados (LRU)
+            max_age: Segundos após os quais a decisão é refeita mesmo sem
+                     mudança, para renovar caches downstream (None = nunca)
+        """
+        if price_tolerance <= 0 or demand_tolerance <= 0:
+            raise ValueError("As tolerâncias devem ser > 0")
+        if max_entries <= 0:
+            raise ValueError("max_entries deve ser > 0")
+
+        self.price_tolerance = price_tolerance
+        self.demand_tolerance = demand_tolerance
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: "OrderedDict[str, Tuple[Hashable, Decision, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _quantize(self, value: float, step: float) -> int:
+        return round(float(value) / step)
+
+    def fingerprint(self, context: PriceContext, params: Tuple = ()) -> Hashable:
+        """
+        Fingerprint das entradas que influenciam a decisão
+
+        Args:
+            params: Regras em uso (ex.: engine.rule_key(), com estágios e parâmetros)
+        """
+        # Mediana, média e contagem não dependem da ordem dos concorrentes
+        competitors = tuple(sorted(
+            self._quantize(price, self.price_tolerance) for price in context.competitor_prices
+        ))
+        return (
+            self._quantize(context.current_price, self.price_tolerance),
+            self._quantize(context.cost, self.price_tolerance),
+            competitors,
+            context.inventory_level,
+            context.days_in_stock,
+            self._quantize(context.demand_forecast, self.demand_tolerance),
+            tuple(params),
+        )
+
+    def lookup(self, sku: str, fingerprint: Hashable) -> Optional[Decision]:
+        """Decisão anterior do SKU, se o fingerprint for o mesmo e ela não tiver expirado"""
+        entry = self._entries.get(sku)
+        if (
+            entry is None
+            or entry[0] != fingerprint
+            or (self.max_age is not None and time.monotonic() - entry[2] > self.max_age)
+        ):
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(sku)
+        self.hits += 1
+        return entry[1]
+
+    def remember(self, sku: str, fingerprint: Hashable, decision: Decision):
+        """Registra a decisão publicada para o SKU"""
+        self._entries[sku] = (fingerprint, decision, time.monotonic())
+        self._entries.move_to_end(sku)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def forget(self, sku: Optional[str] = None):
+        """Descarta a decisão de um SKU (ou de todos)"""
+        if sku is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(sku, None)
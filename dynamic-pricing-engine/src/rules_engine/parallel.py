@@ -0,0 +1,208 @@
+"""
+Precificação em lote em múltiplos processos.
+Divide os SKUs em shards contíguos, avalia cada shard em um processo do
+pool e grava o resultado direto em memória compartilhada, sem serializar
+PriceContext nem arrays entre processos. Os workers usam o mesmo
+pipeline de regras do engine (ver RulePipeline).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .engine import RULE_PARAMETERS, PricingRulesEngine
+from .pipeline import RulePipeline
+
+
+# Arrays de entrada de evaluate_arrays, na ordem dos argumentos
+_INPUTS = (
+    'current_price', 'cost', 'competitor_prices',
+    'inventory_level', 'days_in_stock', 'demand_forecast',
+)
+# Arrays de saída e seus dtypes
+_OUTPUTS: Dict[str, object] = {
+    'recommended_price': np.float64,
+    'confidence': np.float64,
+    'direction_code': np.int8,
+    'positioning_code': np.int8,
+}
+
+# Engine do processo worker, reconstruído apenas quando os parâmetros mudam
+_worker_engine: Optional[Tuple[tuple, PricingRulesEngine]] = None
+
+
+def _rule_params(engine: PricingRulesEngine) -> Dict[str, object]:
+    """
+    Estágios e parâmetros de regra de um engine, para recriá-lo no worker
+
+    Estágios customizados precisam estar registrados também nos workers
+    (módulo importado antes da criação do pool, ou pool com fork).
+    """
+    params = {name: getattr(engine, name) for name in RULE_PARAMETERS}
+    # Atributos lidos por estágios além dos parâmetros do construtor (ex.: _default_price)
+    params.update({name: getattr(engine, name) for name in engine.pipeline.parameters})
+    params['_stages'] = engine.pipeline.stage_names
+    return params
+
+
+def _engine_for(params: Dict[str, object]) -> PricingRulesEngine:
+    """Engine do worker com os estágios e parâmetros pedidos"""
+    global _worker_engine
+    key = tuple(sorted(params.items()))
+    if _worker_engine is None or _worker_engine[0] != key:
+        settings = dict(params)
+        stages = settings.pop('_stages')
+        engine = PricingRulesEngine(
+            **{name: settings.pop(name) for name in RULE_PARAMETERS}, history_max_rows=1
+        )
+        for name, value in settings.items():
+            setattr(engine, name, value)
+        engine.use_pipeline(RulePipeline(stages))
+        _worker_engine = (key, engine)
+    return _worker_engine[1]
+
+
+def _price_shard(task) -> np.ndarray:
+    """
+    Avalia as linhas [start, stop) dos arrays compartilhados
+
+    Returns:
+        SKUs afetados por estágio no shard
+    """
+    layout, params, start, stop = task
+    engine = _engine_for(params)
+    affected_before = engine.pipeline._affected.copy()
+    blocks = []
+    arrays = {}
+    try:
+        for name, (block_name, shape, dtype) in layout.items():
+            # Workers do pool compartilham o resource tracker do processo pai,
+            # que é o dono dos blocos e faz o unlink
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+        result = engine.evaluate_arrays(
+            *(arrays[name][start:stop] for name in _INPUTS)
+        )
+        for name in _OUTPUTS:
+            arrays[name][start:stop] = result[name]
+    finally:
+        # As views precisam ser liberadas antes de fechar os blocos
+        arrays.clear()
+        for block in blocks:
+            block.close()
+    return engine.pipeline._affected - affected_before
+
+
+class ParallelPricingEngine:
+    """
+    Avalia as regras de um PricingRulesEngine em shards paralelos
+
+    O pool de processos é criado na primeira chamada e reaproveitado;
+    cada lote copia as entradas uma vez para memória compartilhada e os
+    workers escrevem as saídas nas posições originais, de modo que o
+    resultado é idêntico (e na mesma ordem) ao de engine.evaluate_arrays.
+    """
+
+    def __init__(
+        self,
+        engine: PricingRulesEngine,
+        workers: Optional[int] = None,
+        min_shard_size: int = 10_000,
+    ):
+        """
+        Args:
+            engine: Engine cujos parâmetros de regra são usados nos workers
+            workers: Quantidade de processos (padrão: os.cpu_count())
+            min_shard_size: Menor shard enviado a um worker; lotes menores
+                            que 2 * min_shard_size são avaliados no processo atual
+        """
+        if workers is not None and workers <= 0:
+            raise ValueError("workers deve ser > 0")
+        if min_shard_size <= 0:
+            raise ValueError("min_shard_size deve ser > 0")
+
+        self.engine = engine
+        self.workers = workers or os.cpu_count() or 1
+        self.min_shard_size = min_shard_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Encerra o pool de processos"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _shards(self, rows: int) -> List[Tuple[int, int]]:
+        """Intervalos [start, stop) contíguos, um por worker no máximo"""
+        count = min(self.workers, rows // self.min_shard_size)
+        bounds = np.linspace(0, rows, count + 1).astype(np.int64)
+        return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def evaluate_arrays(
+        self,
+        current_price: np.ndarray,
+        cost: np.ndarray,
+        competitor_prices: np.ndarray,
+        inventory_level: np.ndarray,
+        days_in_stock: np.ndarray,
+        demand_forecast: np.ndarray,
+    ) -> Dict[str, np.ndarray]:
+        """Mesmo contrato de PricingRulesEngine.evaluate_arrays, em paralelo"""
+        inputs = {
+            'current_price': current_price,
+            'cost': cost,
+            'competitor_prices': competitor_prices,
+            'inventory_level': inventory_level,
+            'days_in_stock': days_in_stock,
+            'demand_forecast': demand_forecast,
+        }
+        rows = len(cost)
+        shards = self._shards(rows)
+        if len(shards) < 2:
+            return self.engine.evaluate_arrays(*inputs.values())
+
+        competitor_prices = np.asarray(competitor_prices, dtype=np.float64)
+        if competitor_prices.ndim != 2 or competitor_prices.shape[0] != rows:
+            raise ValueError("competitor_prices deve ser uma matriz (n, k) alinhada aos demais arrays")
+        inputs['competitor_prices'] = competitor_prices
+
+        # Entradas mantêm o dtype recebido, como no caminho serial
+        arrays = [(name, np.asarray(inputs[name])) for name in _INPUTS]
+        arrays += [(name, np.empty(rows, dtype=dtype)) for name, dtype in _OUTPUTS.items()]
+
+        blocks: List[shared_memory.SharedMemory] = []
+        layout = {}
+        views = {}
+        try:
+            for name, array in arrays:
+                # SharedMemory não aceita tamanho zero (ex.: matriz sem concorrentes)
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks.append(block)
+                views[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+                if name in _INPUTS:
+                    views[name][...] = array
+                layout[name] = (block.name, array.shape, array.dtype.str)
+
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            params = _rule_params(self.engine)
+            tasks = [(layout, params, start, stop) for start, stop in shards]
+            affected = sum(self._pool.map(_price_shard, tasks))
+            self.engine.pipeline.record(rows, affected)
+
+            return {name: views[name].copy() for name in _OUTPUTS}
+        finally:
+            views.clear()
+            for block in blocks:
+                block.close()
+                block.unlink()
@@ -0,0 +1,579 @@
+"""
+Pipeline de regras configurável e instrumentado.
+Cada regra é um estágio registrado: uma função Numba que atualiza o vetor
+de estado de uma linha. O RulePipeline compõe os estágios em kernels
+compilados (lote e escalar), que são a única implementação das regras
+usada pelo engine, pelos workers paralelos e pela simulação, e conta os
+SKUs afetados por estágio a cada execução.
+"""
+import hashlib
+import operator
+import os
+import stat
+import sys
+import tempfile
+import time
+from types import ModuleType
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from numba import jit
+
+
+# Posições do vetor de estado de uma linha: entradas e resultados das regras
+COST = 0
+CURRENT_PRICE = 1
+NUM_COMPETITORS = 2
+MEDIAN_PRICE = 3
+MEAN_PRICE = 4
+INVENTORY_LEVEL = 5
+DAYS_IN_STOCK = 6
+DEMAND_FORECAST = 7
+PRICE = 8
+CONFIDENCE = 9
+DIRECTION_CODE = 10
+POSITIONING_CODE = 11
+STATE_SIZE = 12
+
+
+class RuleStage(NamedTuple):
+    """Estágio registrado"""
+    name: str
+    # Dispatcher Numba: func(state, params) -> bool (linha alterada)
+    func: Callable
+    # Atributos do engine passados em params, nesta ordem
+    params: Tuple[str, ...]
+
+
+STAGES: Dict[str, RuleStage] = {}
+
+DEFAULT_STAGES: Tuple[str, ...] = (
+    'competition',
+    'demand_elasticity',
+    'inventory',
+    'revenue_optimization',
+    'margin_constraints',
+    'confidence',
+    'decision',
+)
+
+
+def rule_stage(name: str, params: Sequence[str] = ()) -> Callable:
+    """
+    Decorator que compila a função com Numba e a registra em STAGES
+
+    A função recebe o vetor de estado da linha (posições COST, PRICE, ...)
+    e uma tupla de floats com os atributos do engine listados em params, e
+    devolve True se alterou a linha. O estágio é expandido inline nos
+    kernels do pipeline. Estágios de módulos próprios precisam ser
+    importados antes de criar o RulePipeline que os usa.
+    """
+    def register(func: Callable) -> Callable:
+        if name in STAGES:
+            raise ValueError(f"Estágio já registrado: {name}")
+        dispatcher = jit(nopython=True, cache=True, inline="always")(func)
+        STAGES[name] = RuleStage(name, dispatcher, tuple(params))
+        return dispatcher
+    return register
+
+
+# cache=True grava o código compilado em __pycache__: só o primeiro processo compila
+@jit(nopython=True, cache=True)
+def _margin_optimal_price(reference_price, cost, elasticity):
+    """
+    Preço que maximiza a margem esperada (p - cost) * D(p)
+
+    A demanda é linear em torno do preço de referência (já ajustado por
+    concorrência, demanda prevista e estoque), com elasticidade-preço
+    e < 0 no ponto de referência: D(p) = D0 * (1 + e * (p / reference_price - 1)).
+    O lucro é côncavo em p, com máximo em
+    p* = reference_price * (e - 1) / (2e) + cost / 2; limitar p* às margens
+    mínima e máxima dá o ótimo restrito.
+    """
+    if elasticity >= 0 or reference_price <= 0:
+        return reference_price
+    return reference_price * (elasticity - 1) / (2 * elasticity) + cost / 2
+
+
+@rule_stage('competition', params=('competitive_discount', '_default_price'))
+def _competition(state, params):
+    """Preço competitivo: mediana dos concorrentes com desconto, ou preço padrão"""
+    if state[NUM_COMPETITORS] == 0:
+        state[PRICE] = params[1]
+        return False
+    state[PRICE] = state[MEDIAN_PRICE] * (1 - params[0])
+    return True
+
+
+@rule_stage('demand_elasticity', params=('elasticity_factor',))
+def _demand_elasticity(state, params):
+    """Ajuste linear pela previsão de demanda"""
+    deviation = (state[DEMAND_FORECAST] - 0.5) * 2
+    state[PRICE] = state[PRICE] * (1.0 + (deviation * params[0] * 0.1))
+    return deviation != 0
+
+
+@rule_stage('inventory', params=(
+    'high_inventory_threshold', 'high_inventory_discount',
+    'critical_inventory_threshold', 'critical_inventory_discount',
+    'old_stock_days_threshold', 'old_stock_discount',
+    'critical_stock_days_threshold', 'critical_stock_discount',
+))
+def _inventory(state, params):
+    """Descontos por volume de estoque e por tempo em estoque"""
+    discount = 1.0
+    if state[INVENTORY_LEVEL] > params[2]:
+        discount *= (1 - params[3])
+    elif state[INVENTORY_LEVEL] > params[0]:
+        discount *= (1 - params[1])
+    if state[DAYS_IN_STOCK] > params[6]:
+        discount *= (1 - params[7])
+    elif state[DAYS_IN_STOCK] > params[4]:
+        discount *= (1 - params[5])
+    state[PRICE] = state[PRICE] * discount
+    return discount != 1.0
+
+
+@rule_stage('revenue_optimization', params=('revenue_optimization', 'price_elasticity'))
+def _revenue_optimization(state, params):
+    """Preço de margem esperada máxima, se habilitado (ver _margin_optimal_price)"""
+    if params[0] == 0:
+        return False
+    price = state[PRICE]
+    state[PRICE] = _margin_optimal_price(price, state[COST], params[1])
+    return state[PRICE] != price
+
+
+@rule_stage('margin_constraints', params=('min_margin', 'max_margin'))
+def _margin_constraints(state, params):
+    """Limita o preço às margens mínima e máxima sobre o custo"""
+    cost = state[COST]
+    price = state[PRICE]
+    state[PRICE] = min(max(price, cost * (1 + params[0])), cost * (1 + params[1]))
+    return state[PRICE] != price
+
+
+@rule_stage('confidence', params=(
+    'base_confidence', 'confidence_boost_many_competitors', 'confidence_boost_few_competitors',
+    'confidence_boost_inventory', 'confidence_boost_demand',
+    'min_demand_confidence', 'max_demand_confidence',
+))
+def _confidence(state, params):
+    """Confiança pela quantidade de concorrentes, estoque e demanda"""
+    confidence = params[0]
+    if state[NUM_COMPETITORS] >= 3:
+        confidence += params[1]
+    elif state[NUM_COMPETITORS] >= 1:
+        confidence += params[2]
+    if state[INVENTORY_LEVEL] > 0:
+        confidence += params[3]
+    if params[5] < state[DEMAND_FORECAST] < params[6]:
+        confidence += params[4]
+    state[CONFIDENCE] = min(confidence, 1.0)
+    return state[CONFIDENCE] != params[0]
+
+
+@rule_stage('decision', params=(
+    'price_increase_threshold', 'price_decrease_threshold',
+    'aggressive_positioning_threshold', 'premium_positioning_threshold',
+))
+def _decision(state, params):
+    """Códigos de direção e de posicionamento frente aos concorrentes"""
+    price = state[PRICE]
+    current_price = state[CURRENT_PRICE]
+    if current_price != 0:
+        price_delta = ((price - current_price) / current_price * 100)
+    else:
+        # Mesmo resultado da divisão por zero em NumPy (inf/nan), sem exceção
+        price_delta = np.inf if price > 0 else (-np.inf if price < 0 else np.nan)
+    if price_delta > params[0]:
+        state[DIRECTION_CODE] = 1
+    elif price_delta < -params[1]:
+        state[DIRECTION_CODE] = 2
+    else:
+        state[DIRECTION_CODE] = 0
+
+    state[POSITIONING_CODE] = 0
+    if state[NUM_COMPETITORS] > 0:
+        if price < state[MEAN_PRICE] * (1 - params[2]):
+            state[POSITIONING_CODE] = 1
+        elif price > state[MEAN_PRICE] * (1 + params[3]):
+            state[POSITIONING_CODE] = 2
+    return state[DIRECTION_CODE] != 0
+
+
+@jit(nopython=True, cache=True)
+def _load_state(state, cost, current_price, num_competitors, median_price, mean_price,
+                inventory_level, days_in_stock, demand_forecast):
+    """Preenche o vetor de estado de uma linha; o preço parte do preço atual"""
+    state[COST] = cost
+    state[CURRENT_PRICE] = current_price
+    state[NUM_COMPETITORS] = num_competitors
+    state[MEDIAN_PRICE] = median_price
+    state[MEAN_PRICE] = mean_price
+    state[INVENTORY_LEVEL] = inventory_level
+    state[DAYS_IN_STOCK] = days_in_stock
+    state[DEMAND_FORECAST] = demand_forecast
+    state[PRICE] = current_price
+    state[CONFIDENCE] = 0.0
+    state[DIRECTION_CODE] = 0
+    state[POSITIONING_CODE] = 0
+
+
+# Kernels de uma lista de estágios. stage0, stage1, ... são os dispatchers
+# dos estágios, injetados no módulo antes da execução; os slices de params
+# de cada estágio entram no código como constantes.
+_KERNEL_SOURCE = '''\
+"""Kernels do RulePipeline para os estágios: {names}"""
+import numpy as np
+from numba import jit
+
+from {pipeline} import (
+    CONFIDENCE, DIRECTION_CODE, POSITIONING_CODE, PRICE, STATE_SIZE, _load_state,
+)
+
+
+@jit(nopython=True, cache=True)
+def run_stages(state, params, affected):
+{run_stages}
+
+
+@jit(nopython=True, cache=True)
+def run_stage(index, states, params, affected):
+    for i in range(states.shape[0]):
+        state = states[i]
+{run_stage}
+
+
+@jit(nopython=True, cache=True)
+def load_states(cost, current_price, num_competitors, median_price, mean_price,
+                inventory_level, days_in_stock, demand_forecast):
+    states = np.empty((cost.shape[0], STATE_SIZE))
+    for i in range(cost.shape[0]):
+        _load_state(states[i], cost[i], current_price[i], num_competitors[i], median_price[i],
+                    mean_price[i], inventory_level[i], days_in_stock[i], demand_forecast[i])
+    return states
+
+
+@jit(nopython=True, cache=True)
+def batch_kernel(cost, current_price, num_competitors, median_price, mean_price,
+                 inventory_level, days_in_stock, demand_forecast, params, affected):
+    rows = cost.shape[0]
+    price = np.empty(rows)
+    confidence = np.empty(rows)
+    direction_code = np.empty(rows, dtype=np.int8)
+    positioning_code = np.empty(rows, dtype=np.int8)
+{batch_setup}
+    state = np.empty(STATE_SIZE)
+    for i in range(rows):
+        _load_state(state, cost[i], current_price[i], num_competitors[i], median_price[i],
+                    mean_price[i], inventory_level[i], days_in_stock[i], demand_forecast[i])
+{batch_stages}
+        price[i] = state[PRICE]
+        confidence[i] = state[CONFIDENCE]
+        direction_code[i] = np.int8(state[DIRECTION_CODE])
+        positioning_code[i] = np.int8(state[POSITIONING_CODE])
+{batch_counts}
+    return price, confidence, direction_code, positioning_code
+
+
+@jit(nopython=True, cache=True)
+def scalar_kernel(cost, current_price, competitor_prices, inventory_level, days_in_stock,
+                  demand_forecast, params, affected):
+    num_competitors = competitor_prices.shape[0]
+    median_price = np.nan
+    mean_price = np.nan
+    if num_competitors > 0:
+        median_price = np.median(competitor_prices)
+        mean_price = np.mean(competitor_prices)
+    state = np.empty(STATE_SIZE)
+    _load_state(state, cost, current_price, num_competitors, median_price, mean_price,
+                inventory_level, days_in_stock, demand_forecast)
+    run_stages(state, params, affected)
+    return state[PRICE], state[CONFIDENCE], int(state[DIRECTION_CODE]), int(state[POSITIONING_CODE])
+'''
+
+# Diretório dos módulos gerados; no container é preenchido pelo warmup do build
+_KERNEL_DIRS = (
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'rule_kernels'),
+    os.path.join(tempfile.gettempdir(), f'pricing_rule_kernels_{os.getuid()}'),
+)
+_kernel_modules: Dict[Tuple[RuleStage, ...], ModuleType] = {}
+
+
+def _stage_digest(stage: RuleStage) -> bytes:
+    """Identificação do código de um estágio, para invalidar kernels gerados"""
+    code = stage.func.py_func.__code__
+    return repr((
+        stage.name, stage.params, stage.func.py_func.__module__, stage.func.py_func.__qualname__,
+        code.co_code, code.co_consts, code.co_names, stage.func.targetoptions,
+    )).encode()
+
+
+def _kernel_source(stages: Tuple[RuleStage, ...]) -> str:
+    offsets = np.cumsum([0] + [len(stage.params) for stage in stages])
+    calls = [
+        f"stage{index}(state, params[{offsets[index]}:{offsets[index + 1]}])"
+        for index in range(len(stages))
+    ]
+    run_stages = "\n".join(
+        f"    if {call}:\n        affected[{index}] += 1" for index, call in enumerate(calls)
+    ) or "    pass"
+    run_stage = "\n".join(
+        f"        {'if' if index == 0 else 'elif'} index == {index}:\n"
+        f"            if {call}:\n                affected[{index}] += 1"
+        for index, call in enumerate(calls)
+    ) or "        pass"
+    # No lote, slices de params e contadores ficam fora do laço por linha
+    batch_setup = "\n".join(
+        f"    params{index} = params[{offsets[index]}:{offsets[index + 1]}]\n    affected{index} = 0"
+        for index in range(len(stages))
+    )
+    batch_stages = "\n".join(
+        f"        affected{index} += stage{index}(state, params{index})"
+        for index in range(len(stages))
+    ) or "        pass"
+    batch_counts = "\n".join(
+        f"    affected[{index}] += affected{index}" for index in range(len(stages))
+    )
+    return _KERNEL_SOURCE.format(
+        names=", ".join(stage.name for stage in stages),
+        pipeline=__name__,
+        run_stages=run_stages,
+        run_stage=run_stage,
+        batch_setup=batch_setup,
+        batch_stages=batch_stages,
+        batch_counts=batch_counts,
+    )
+
+
+def _private_dir(directory: str) -> bool:
+    """
+    Cria o diretório (modo 0700) e confere que é do usuário do processo e
+    que ninguém mais pode escrever nele: o cache do Numba ao lado dos
+    kernels é carregado com pickle
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    return (
+        stat.S_ISDIR(info.st_mode)
+        and info.st_uid == os.getuid()
+        and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+    )
+
+
+def _write_source(path: str, source: str):
+    """Grava o código gerado, a menos que o arquivo já tenha exatamente esse conteúdo"""
+    try:
+        with open(path) as kernel_file:
+            if kernel_file.read() == source:
+                return
+    except FileNotFoundError:
+        pass
+    # Gravação atômica: outros processos podem estar lendo o mesmo arquivo
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as temp_file:
+        temp_file.write(source)
+    os.replace(temp_path, path)
+
+
+def _load_kernels(stages: Tuple[RuleStage, ...]) -> ModuleType:
+    """
+    Módulo com os kernels compilados de uma lista de estágios
+
+    O código gerado é compilado neste processo; o arquivo (nome pelo hash
+    do código e dos estágios, em diretório privado) só existe para que
+    cache=True do Numba reaproveite a compilação entre processos, como
+    nos demais kernels. O conteúdo do arquivo nunca é executado.
+    """
+    module = _kernel_modules.get(stages)
+    if module is not None:
+        return module
+
+    source = _kernel_source(stages)
+    digest = hashlib.sha1(source.encode() + b"".join(_stage_digest(stage) for stage in stages))
+    module_name = f"rule_kernels_{digest.hexdigest()[:16]}"
+    for directory in _KERNEL_DIRS:
+        path = os.path.join(directory, module_name + ".py")
+        try:
+            if _private_dir(directory):
+                _write_source(path, source)
+                break
+        except OSError:
+            continue
+    else:
+        raise OSError("Nenhum diretório privado gravável para os kernels do pipeline")
+
+    module = ModuleType(module_name)
+    module.__file__ = path
+    for index, stage in enumerate(stages):
+        setattr(module, f"stage{index}", stage.func)
+    # O cache do Numba reimporta o módulo pelo nome ao carregar os kernels
+    sys.modules[module_name] = module
+    exec(compile(source, path, "exec"), module.__dict__)
+    _kernel_modules[stages] = module
+    return module
+
+
+class RulePipeline:
+    """
+    Sequência de estágios registrados, com SKUs afetados por estágio
+
+    Os estágios são compostos em um kernel por linha (ver _KERNEL_SOURCE),
+    então acrescentar uma regra custa só o código dela no laço por SKU,
+    sem passes extras sobre o lote. Com profile=True cada estágio roda em um
+    passe próprio sobre o lote, para medir o tempo por estágio; o
+    resultado é o mesmo, mais lento, e não usa processos paralelos.
+    """
+
+    def __init__(self, stages: Sequence[str] = DEFAULT_STAGES, profile: bool = False):
+        unknown = [name for name in stages if name not in STAGES]
+        if unknown:
+            raise ValueError(f"Estágios não registrados: {unknown}")
+
+        self.stage_names: Tuple[str, ...] = tuple(stages)
+        self.profile = profile
+        self._stages: Tuple[RuleStage, ...] = tuple(STAGES[name] for name in self.stage_names)
+        # Atributos do engine na ordem de params (um trecho por estágio)
+        self.parameters: Tuple[str, ...] = tuple(
+            name for stage in self._stages for name in stage.params
+        )
+        self._kernels = _load_kernels(self._stages)
+        self._get_params = (
+            operator.attrgetter(*self.parameters) if len(self.parameters) > 1
+            else lambda engine: tuple(getattr(engine, name) for name in self.parameters)
+        )
+        self._param_values: Optional[tuple] = None
+        self._param_floats: Tuple[float, ...] = ()
+        self.reset_stats()
+
+    def with_stage(self, name: str, before: Optional[str] = None, after: Optional[str] = None) -> "RulePipeline":
+        """Novo pipeline com o estágio `name` inserido antes/depois de outro (ou no fim)"""
+        stages = list(self.stage_names)
+        if before is not None:
+            stages.insert(stages.index(before), name)
+        elif after is not None:
+            stages.insert(stages.index(after) + 1, name)
+        else:
+            stages.append(name)
+        return RulePipeline(stages, profile=self.profile)
+
+    def reset_stats(self):
+        """Zera os contadores por estágio"""
+        self._calls = 0
+        self._rows = 0
+        self._affected = np.zeros(len(self._stages), dtype=np.int64)
+        self._seconds = np.zeros(len(self._stages))
+
+    def params(self, engine) -> Tuple[float, ...]:
+        """
+        Valores de self.parameters no engine, convertidos para float
+
+        A conversão é reaproveitada enquanto os valores não mudam.
+        """
+        values = self._get_params(engine)
+        if values != self._param_values:
+            self._param_floats = tuple(float(value) for value in values)
+            self._param_values = values
+        return self._param_floats
+
+    def record(self, rows: int, affected: np.ndarray):
+        """Soma uma execução feita fora deste processo (ver ParallelPricingEngine)"""
+        self._calls += 1
+        self._rows += rows
+        self._affected += affected
+
+    def evaluate_one(
+        self,
+        params: Tuple[float, ...],
+        cost: float,
+        current_price: float,
+        competitor_prices: np.ndarray,
+        inventory_level: float,
+        days_in_stock: float,
+        demand_forecast: float,
+    ) -> Tuple[float, float, int, int]:
+        """
+        Regras de um SKU
+
+        Returns:
+            (preço sem arredondamento, confiança, código de direção, código de posicionamento)
+        """
+        if self.profile:
+            result = self.evaluate(
+                params,
+                num_competitors=np.array([competitor_prices.shape[0]], dtype=np.int64),
+                median_price=np.array([np.median(competitor_prices) if len(competitor_prices) else np.nan]),
+                mean_price=np.array([np.mean(competitor_prices) if len(competitor_prices) else np.nan]),
+                cost=np.array([cost]),
+                current_price=np.array([current_price]),
+                inventory_level=np.array([inventory_level]),
+                days_in_stock=np.array([days_in_stock]),
+                demand_forecast=np.array([demand_forecast]),
+            )
+            return (
+                float(result[0][0]), float(result[1][0]), int(result[2][0]), int(result[3][0])
+            )
+
+        self._calls += 1
+        self._rows += 1
+        return self._kernels.scalar_kernel(
+            cost, current_price, competitor_prices, inventory_level, days_in_stock,
+            demand_forecast, params, self._affected
+        )
+
+    def evaluate(
+        self,
+        params: Tuple[float, ...],
+        num_competitors: np.ndarray,
+        median_price: np.ndarray,
+        mean_price: np.ndarray,
+        cost: np.ndarray,
+        current_price: np.ndarray,
+        inventory_level: np.ndarray,
+        days_in_stock: np.ndarray,
+        demand_forecast: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Regras de um lote; arrays float64, exceto num_competitors (int64)
+
+        Returns:
+            (preço sem arredondamento, confiança, direction_code, positioning_code)
+        """
+        self._calls += 1
+        self._rows += len(cost)
+        inputs = (
+            cost, current_price, num_competitors, median_price, mean_price,
+            inventory_level, days_in_stock, demand_forecast,
+        )
+        if not self.profile:
+            return self._kernels.batch_kernel(*inputs, params, self._affected)
+
+        states = self._kernels.load_states(*inputs)
+        for index in range(len(self._stages)):
+            start = time.perf_counter()
+            self._kernels.run_stage(index, states, params, self._affected)
+            self._seconds[index] += time.perf_counter() - start
+        return (
+            states[:, PRICE].copy(),
+            states[:, CONFIDENCE].copy(),
+            states[:, DIRECTION_CODE].astype(np.int8),
+            states[:, POSITIONING_CODE].astype(np.int8),
+        )
+
+    def stats(self) -> pd.DataFrame:
+        """
+        Execuções, linhas e SKUs afetados por estágio, na ordem do pipeline
+
+        seconds e time_share só são medidos com profile=True.
+        """
+        frame = pd.DataFrame({
+            'calls': self._calls,
+            'rows': self._rows,
+            'affected': self._affected,
+            'seconds': self._seconds,
+        }, index=pd.Index(self.stage_names, name='stage'))
+        total = frame['seconds'].sum()
+        frame['time_share'] = frame['seconds'] / total if total > 0 else 0.0
+        return frame
@@ -0,0 +1,169 @@
+"""
+Simulação de parâmetros (what-if) sobre o catálogo.
+Avalia uma grade de conjuntos de parâmetros do PricingRulesEngine contra
+um snapshot do catálogo e resume margem, receita estimada e distribuição
+das mudanças de preço de cada conjunto.
+"""
+import copy
+import itertools
+from typing import Dict, Iterable, List, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .engine import (
+    RULE_PARAMETERS,
+    PriceContext,
+    PricingRulesEngine,
+    competitor_features,
+    pad_competitor_prices,
+)
+
+
+def parameter_grid(**axes: Iterable) -> List[Dict[str, object]]:
+    """
+    Produto cartesiano de valores por parâmetro
+
+    Ex.: parameter_grid(elasticity_factor=[1.0, 1.5], competitive_discount=[0.0, 0.02])
+    gera 4 conjuntos de parâmetros.
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def _valid_rows(values: np.ndarray):
+    """Índices das linhas com valor > 0 (ou slice(None) se todas forem)"""
+    valid = values > 0
+    return slice(None) if valid.all() else np.flatnonzero(valid)
+
+
+class ParameterSweep:
+    """
+    Avalia conjuntos de parâmetros contra um snapshot fixo do catálogo
+
+    As estatísticas de concorrência (mediana, média, contagem), que são a
+    parte cara e não dependem dos parâmetros, são calculadas uma vez; cada
+    conjunto da grade aplica apenas as regras elemento a elemento sobre
+    os arrays do catálogo. Histórico e tendências do engine não são tocados.
+    """
+
+    def __init__(
+        self,
+        engine: PricingRulesEngine,
+        current_price: np.ndarray,
+        cost: np.ndarray,
+        competitor_prices: np.ndarray,
+        inventory_level: np.ndarray,
+        days_in_stock: np.ndarray,
+        demand_forecast: np.ndarray,
+        percentiles: Sequence[float] = (5, 25, 50, 75, 95),
+    ):
+        """
+        Args:
+            engine: Engine base; cada conjunto da grade sobrescreve parte dos seus parâmetros
+            competitor_prices: Matriz (n, k) com NaN nas posições vazias
+            percentiles: Percentis reportados da variação de preço (%)
+        """
+        self.engine = engine
+        self.current_price = np.asarray(current_price, dtype=np.float64)
+        self.cost = np.asarray(cost, dtype=np.float64)
+        self.inventory_level = np.asarray(inventory_level)
+        self.days_in_stock = np.asarray(days_in_stock)
+        self.demand_forecast = np.asarray(demand_forecast, dtype=np.float64)
+        self.percentiles = tuple(percentiles)
+        self.features = competitor_features(competitor_prices, len(self.cost))
+
+        # Linhas válidas para margem e variação percentual (slice quando são todas)
+        self._cost_rows = _valid_rows(self.cost)
+        self._price_rows = _valid_rows(self.current_price)
+        self._valid_cost = self.cost[self._cost_rows]
+        self._valid_current_price = self.current_price[self._price_rows]
+        self._baseline_revenue = float(np.dot(self.current_price, self.demand_forecast))
+
+    @classmethod
+    def from_contexts(
+        cls,
+        engine: PricingRulesEngine,
+        contexts: Sequence[PriceContext],
+        **kwargs
+    ) -> "ParameterSweep":
+        """Monta o snapshot a partir de uma lista de PriceContext"""
+        return cls(
+            engine,
+            current_price=np.array([context.current_price for context in contexts], dtype=np.float64),
+            cost=np.array([context.cost for context in contexts], dtype=np.float64),
+            competitor_prices=pad_competitor_prices([context.competitor_prices for context in contexts]),
+            inventory_level=np.array([context.inventory_level for context in contexts], dtype=np.int64),
+            days_in_stock=np.array([context.days_in_stock for context in contexts], dtype=np.int64),
+            demand_forecast=np.array([context.demand_forecast for context in contexts], dtype=np.float64),
+            **kwargs
+        )
+
+    def engine_for(self, params: Mapping[str, object]) -> PricingRulesEngine:
+        """Cópia rasa do engine base com os parâmetros (do construtor ou dos estágios do pipeline) sobrescritos"""
+        unknown = set(params) - set(RULE_PARAMETERS) - set(self.engine.pipeline.parameters)
+        if unknown:
+            raise ValueError(f"Parâmetros desconhecidos: {sorted(unknown)}")
+        engine = copy.copy(self.engine)
+        for name, value in params.items():
+            setattr(engine, name, value)
+        return engine
+
+    def evaluate(self, params: Mapping[str, object]) -> Dict[str, np.ndarray]:
+        """Arrays de decisão (ver evaluate_arrays) para um conjunto de parâmetros"""
+        return self.engine_for(params).apply_rules(
+            self.features, self.current_price, self.cost,
+            self.inventory_level, self.days_in_stock, self.demand_forecast
+        )
+
+    def summarize(self, arrays: Mapping[str, np.ndarray]) -> Dict[str, float]:
+        """Métricas agregadas de uma avaliação do catálogo"""
+        price = arrays['recommended_price']
+        direction = arrays['direction_code']
+        rows = len(price)
+
+        margin = (price[self._cost_rows] - self._valid_cost) / self._valid_cost
+        change = (price[self._price_rows] - self._valid_current_price) / self._valid_current_price * 100
+        # Receita estimada: preço ponderado pela previsão de demanda
+        revenue = float(np.dot(price, self.demand_forecast))
+
+        summary = {
+            'mean_price': float(price.mean()),
+            'mean_margin_pct': float(margin.mean()) if len(margin) else float('nan'),
+            'revenue_proxy': revenue,
+            'revenue_change_pct': (
+                (revenue - self._baseline_revenue) / self._baseline_revenue * 100
+                if self._baseline_revenue else float('nan')
+            ),
+            'gross_margin_proxy': float(np.dot(price - self.cost, self.demand_forecast)),
+            'mean_confidence': float(arrays['confidence'].mean()),
+            'share_increase': float(np.count_nonzero(direction == 1) / rows),
+            'share_decrease': float(np.count_nonzero(direction == 2) / rows),
+            'share_stable': float(np.count_nonzero(direction == 0) / rows),
+            'mean_price_change_pct': float(change.mean()) if len(change) else float('nan'),
+        }
+        quantiles = (
+            np.percentile(change, self.percentiles) if len(change)
+            else np.full(len(self.percentiles), np.nan)
+        )
+        for percentile, value in zip(self.percentiles, quantiles):
+            summary[f'price_change_p{percentile:g}'] = float(value)
+        return summary
+
+    def run(self, grid: Sequence[Mapping[str, object]]) -> pd.DataFrame:
+        """
+        Avalia cada conjunto da grade
+
+        Returns:
+            DataFrame com uma linha por conjunto: os parâmetros sobrescritos
+            seguidos das métricas de summarize()
+        """
+        if len(self.cost) == 0:
+            raise ValueError("O snapshot do catálogo está vazio")
+
+        rows = []
+        for params in grid:
+            row = dict(params)
+            row.update(self.summarize(self.evaluate(params)))
+            rows.append(row)
+        return pd.DataFrame(rows)
@@ -0,0 +1,206 @@
+"""
+Estatísticas incrementais de tendência por SKU.
+Acumuladores online (Welford para média/variância, EWMA e janela
+deslizante opcional) atualizados a cada lote de decisões, para que
+consultas de tendência sejam leituras O(1) em vez de varreduras do histórico.
+"""
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class TrendTracker:
+    """
+    Acumuladores de tendência por SKU em arrays colunares
+
+    Cada lote é agregado por SKU com bincount e combinado ao estado
+    anterior com a fórmula de Chan (média/variância) e com os pesos
+    exponenciais do EWMA, sem laço em Python por decisão.
+    """
+
+    def __init__(self, ewma_alpha: float = 0.1, window: Optional[int] = None, capacity: int = 1024):
+        """
+        Args:
+            ewma_alpha: Peso da decisão mais recente no EWMA (0 < alpha <= 1)
+            window: Se informado, mantém também as últimas N decisões de cada SKU
+            capacity: Capacidade inicial de SKUs (cresce sob demanda)
+        """
+        if not 0 < ewma_alpha <= 1:
+            raise ValueError("ewma_alpha deve estar em (0, 1]")
+        if window is not None and window <= 0:
+            raise ValueError("window deve ser > 0")
+
+        self.ewma_alpha = ewma_alpha
+        self.window = window
+        self._index: Dict[str, int] = {}
+        self._size = 0
+        self._allocate(capacity)
+
+        # Acumulador global (todas as decisões, sku=None)
+        self._total = {'count': 0, 'mean_price': 0.0, 'm2_price': 0.0,
+                       'mean_margin': 0.0, 'mean_confidence': 0.0}
+
+    def _allocate(self, capacity: int):
+        """Aloca (ou aumenta) os arrays de estado por SKU"""
+        old_size = self._size
+        fields = {
+            'count': np.int64, 'mean_price': np.float64, 'm2_price': np.float64,
+            'mean_margin': np.float64, 'mean_confidence': np.float64,
+            'ewma_price': np.float64, 'ewma_margin': np.float64,
+        }
+        state = {}
+        for name, dtype in fields.items():
+            array = np.zeros(capacity, dtype=dtype)
+            if old_size:
+                array[:old_size] = self._state[name][:old_size]
+            state[name] = array
+        self._state = state
+
+        if self.window is not None:
+            ring = np.zeros((capacity, self.window))
+            if old_size:
+                ring[:old_size] = self._ring[:old_size]
+            self._ring = ring
+
+    def __len__(self) -> int:
+        """Quantidade de SKUs acompanhados"""
+        return self._size
+
+    def update(
+        self,
+        skus: Sequence[str],
+        prices: np.ndarray,
+        margins: np.ndarray,
+        confidences: np.ndarray,
+    ):
+        """Incorpora um lote de decisões, na ordem em que foram produzidas"""
+        prices = np.asarray(prices, dtype=np.float64)
+        margins = np.asarray(margins, dtype=np.float64)
+        confidences = np.asarray(confidences, dtype=np.float64)
+        if len(prices) == 0:
+            return
+
+        codes, uniques = pd.factorize(np.asarray(skus, dtype=object))
+        slots = self._slots(uniques)
+        groups = len(uniques)
+
+        counts = np.bincount(codes, minlength=groups)
+        batch_mean_price = np.bincount(codes, prices, groups) / counts
+        batch_m2_price = np.bincount(codes, (prices - batch_mean_price[codes]) ** 2, groups)
+        batch_mean_margin = np.bincount(codes, margins, groups) / counts
+        batch_mean_confidence = np.bincount(codes, confidences, groups) / counts
+
+        state = self._state
+        previous = state['count'][slots]
+        total = previous + counts
+
+        # Fórmula de Chan para combinar média e M2 de dois conjuntos
+        delta = batch_mean_price - state['mean_price'][slots]
+        state['mean_price'][slots] += delta * counts / total
+        state['m2_price'][slots] += batch_m2_price + delta ** 2 * previous * counts / total
+        state['mean_margin'][slots] += (batch_mean_margin - state['mean_margin'][slots]) * counts / total
+        state['mean_confidence'][slots] += (
+            (batch_mean_confidence - state['mean_confidence'][slots]) * counts / total
+        )
+
+        # Posição de cada decisão dentro do seu SKU, preservando a ordem do lote
+        order = np.argsort(codes, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        position = np.empty(len(codes), dtype=np.int64)
+        position[order] = np.arange(len(codes)) - np.repeat(starts, counts)
+
+        # EWMA: x_i pesa alpha * (1 - alpha)^(n - 1 - i); SKUs novos começam no primeiro valor
+        decay = 1 - self.ewma_alpha
+        weights = self.ewma_alpha * decay ** (counts[codes] - 1 - position)
+        first = order[starts]
+        carry = decay ** counts
+        for name, values in (('ewma_price', prices), ('ewma_margin', margins)):
+            old = np.where(previous > 0, state[name][slots], values[first])
+            state[name][slots] = carry * old + np.bincount(codes, weights * values, groups)
+
+        if self.window is not None:
+            # Só as últimas `window` decisões de cada SKU no lote entram no anel
+            keep = position >= counts[codes] - self.window
+            ring_slot = (previous[codes] + position) % self.window
+            self._ring[slots[codes[keep]], ring_slot[keep]] = prices[keep]
+
+        state['count'][slots] = total
+        self._update_total(len(prices), prices, margins, confidences)
+
+    def _slots(self, uniques: np.ndarray) -> np.ndarray:
+        """Mapeia SKUs para posições nos arrays de estado, criando as novas"""
+        slots = np.empty(len(uniques), dtype=np.int64)
+        for i, sku in enumerate(uniques):
+            slot = self._index.get(sku)
+            if slot is None:
+                if self._size == len(self._state['count']):
+                    self._allocate(len(self._state['count']) * 2)
+                slot = self._size
+                self._index[sku] = slot
+                self._size += 1
+            slots[i] = slot
+        return slots
+
+    def _update_total(self, count: int, prices: np.ndarray, margins: np.ndarray, confidences: np.ndarray):
+        """Combina o lote ao acumulador global"""
+        total = self._total
+        previous = total['count']
+        merged = previous + count
+        batch_mean = prices.mean()
+        delta = batch_mean - total['mean_price']
+        total['mean_price'] += delta * count / merged
+        total['m2_price'] += ((prices - batch_mean) ** 2).sum() + delta ** 2 * previous * count / merged
+        total['mean_margin'] += (margins.mean() - total['mean_margin']) * count / merged
+        total['mean_confidence'] += (confidences.mean() - total['mean_confidence']) * count / merged
+        total['count'] = merged
+
+    def stats(self, sku: Optional[str] = None) -> Dict:
+        """
+        Estatísticas acumuladas de um SKU (ou de todas as decisões)
+
+        Returns:
+            Dict vazio se não houver decisões; com window configurada,
+            inclui window_mean_price e window_price_volatility
+        """
+        if sku is None:
+            total = self._total
+            if total['count'] == 0:
+                return {}
+            return {
+                'mean_recommended_price': total['mean_price'],
+                'mean_margin': total['mean_margin'],
+                'price_volatility': _sample_std(total['m2_price'], total['count']),
+                'total_decisions': total['count'],
+                'avg_confidence': total['mean_confidence'],
+            }
+
+        slot = self._index.get(sku)
+        if slot is None:
+            return {}
+
+        state = self._state
+        count = int(state['count'][slot])
+        result = {
+            'mean_recommended_price': float(state['mean_price'][slot]),
+            'mean_margin': float(state['mean_margin'][slot]),
+            'price_volatility': _sample_std(float(state['m2_price'][slot]), count),
+            'total_decisions': count,
+            'avg_confidence': float(state['mean_confidence'][slot]),
+            'ewma_price': float(state['ewma_price'][slot]),
+            'ewma_margin': float(state['ewma_margin'][slot]),
+        }
+
+        if self.window is not None:
+            recent = self._ring[slot, :min(count, self.window)]
+            result['window_mean_price'] = float(recent.mean())
+            result['window_price_volatility'] = float(recent.std(ddof=1)) if len(recent) > 1 else float('nan')
+
+        return result
+
+
+def _sample_std(m2: float, count: int) -> float:
+    """Desvio padrão amostral (ddof=1) a partir do M2 de Welford"""
+    if count < 2:
+        return float('nan')
+    return float(np.sqrt(max(m2, 0.0) / (count - 1)))
@@ -7,7 +7,7 @@ import json
 import logging
 import sys
 import os
-from typing import Optional
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
 from datetime import datetime
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -16,6 +16,7 @@ from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
 from config.settings import settings
 from src.common import KafkaMessage, PricingDecision, setup_json_logger
 from .engine import PricingRulesEngine, PriceContext
+from .memo import DecisionMemo
 
 
 logger = setup_json_logger("rules_engine_worker")
@@ -31,8 +32,18 @@ class RulesEngineWorker:
         self.engine = PricingRulesEngine(
             min_margin=settings.MINIMUM_MARGIN,
             max_margin=settings.MAXIMUM_MARGIN,
-            elasticity_factor=settings.ELASTICITY_FACTOR
+            elasticity_factor=settings.ELASTICITY_FACTOR,
+            revenue_optimization=settings.REVENUE_OPTIMIZATION,
+            price_elasticity=settings.PRICE_ELASTICITY
         )
+        self.memo: Optional[DecisionMemo] = None
+        if settings.DECISION_MEMO_ENABLED:
+            self.memo = DecisionMemo(
+                price_tolerance=settings.DECISION_MEMO_PRICE_TOLERANCE,
+                demand_tolerance=settings.DECISION_MEMO_DEMAND_TOLERANCE,
+                max_entries=settings.DECISION_MEMO_MAX_ENTRIES,
+                max_age=settings.DECISION_MEMO_MAX_AGE or None
+            )
         self.consumer: Optional[AIOKafkaConsumer] = None
         self.producer: Optional[AIOKafkaProducer] = None
         self.dlq_producer: Optional[AIOKafkaProducer] = None
@@ -42,6 +53,10 @@ class RulesEngineWorker:
         """Inicia consumer e producers Kafka"""
         logger.info("Iniciando Rules Engine Worker")
         
+        # Compila os kernels antes de consumir, evitando o pico de latência do JIT
+        warmup_seconds = self.engine.warmup()
+        logger.info(f"Kernels do engine prontos em {warmup_seconds * 1000:.1f}ms")
+        
         self.consumer = AIOKafkaConsumer(
             settings.KAFKA_SCRAPER_TOPIC,
             bootstrap_servers=settings.KAFKA_BROKER,
@@ -83,6 +98,10 @@ class RulesEngineWorker:
         await self.start()
         
         try:
+            if settings.RULES_BATCH_MODE:
+                await self._run_batches()
+                return
+            
             async for message in self.consumer:
                 try:
                     await self._process_message(message.value)
@@ -93,6 +112,167 @@ class RulesEngineWorker:
         finally:
             await self.stop()
 
+    async def _run_batches(self):
+        """
+        Loop em lotes: getmany() -> um cálculo em lote no engine -> envio de
+        todas as decisões sem aguardar cada ack -> um flush por lote
+        """
+        timeout_ms = settings.RULES_BATCH_TIMEOUT_MS
+        max_records = settings.BATCH_SIZE
+        while self.running:
+            batches = await self.consumer.getmany(timeout_ms=timeout_ms, max_records=max_records)
+            values = [message.value for messages in batches.values() for message in messages]
+            if not values:
+                continue
+            # Posições do lote que já têm resultado final (publicadas, na DLQ ou descartadas)
+            settled: Set[int] = set()
+            try:
+                await self._process_batch(values, settled)
+            except Exception as e:
+                # Um lote com erro não derruba o worker: só as mensagens ainda
+                # sem resultado são reprocessadas, uma a uma, com DLQ se falharem
+                pending = [(index, value) for index, value in enumerate(values) if index not in settled]
+                logger.error(
+                    f"Erro no lote de {len(values)} mensagens, reprocessando "
+                    f"{len(pending)} individualmente: {str(e)}"
+                )
+                await self._process_individually(pending, settled)
+
+    async def _process_batch(self, message_values: List[str], settled: Set[int]):
+        """
+        Precifica um lote de mensagens pelo caminho colunar do engine
+
+        Mensagens inválidas vão para a DLQ individualmente; se o cálculo
+        do lote falhar, o lote é reprocessado mensagem a mensagem para
+        isolar a(s) mensagem(ns) problemática(s).
+
+        Args:
+            settled: Recebe a posição de cada mensagem assim que ela tem
+                     resultado final, para que uma falha no meio do lote
+                     não republique nem reenvie para a DLQ o que já foi feito
+        """
+        contexts: List[PriceContext] = []
+        indices: List[int] = []
+        for index, value in enumerate(message_values):
+            try:
+                kafka_msg = KafkaMessage.from_json(value)
+                if kafka_msg.event_type != "raw_prices":
+                    logger.warning(f"Evento desconhecido: {kafka_msg.event_type}")
+                    settled.add(index)
+                    continue
+                contexts.append(self._build_context(kafka_msg.data))
+                indices.append(index)
+            except Exception as e:
+                logger.error(f"Erro ao desserializar mensagem: {str(e)}")
+                await self._send_to_dlq(value, str(e))
+                settled.add(index)
+
+        # Só a última atualização de cada SKU no lote é precificada: as
+        # anteriores já estão superadas e publicá-las só geraria ruído
+        latest: Dict[Hashable, int] = {context.sku: i for i, context in enumerate(contexts)}
+        if len(latest) < len(contexts):
+            kept = set(latest.values())
+            settled.update(index for i, index in enumerate(indices) if i not in kept)
+            contexts = [context for i, context in enumerate(contexts) if i in kept]
+            indices = [index for i, index in enumerate(indices) if i in kept]
+
+        # SKUs sem mudança desde a última decisão: nada a recalcular nem publicar
+        fingerprints: List[Optional[Hashable]] = [None] * len(contexts)
+        if self.memo is not None:
+            params = self.engine.rule_key()
+            pending = []
+            for context, index in zip(contexts, indices):
+                fingerprint = self.memo.fingerprint(context, params)
+                if self.memo.lookup(context.sku, fingerprint) is None:
+                    pending.append((context, index, fingerprint))
+                else:
+                    settled.add(index)
+            contexts = [item[0] for item in pending]
+            indices = [item[1] for item in pending]
+            fingerprints = [item[2] for item in pending]
+        if not contexts:
+            return
+
+        try:
+            df = self.engine.calculate_batch_prices(contexts)
+        except Exception as e:
+            logger.error(f"Erro no lote de {len(contexts)} mensagens, reprocessando individualmente: {str(e)}")
+            await self._process_individually(
+                [(index, message_values[index]) for index in indices], settled
+            )
+            return
+
+        prices = df['recommended_price'].tolist()
+        margins = df['margin_pct'].tolist()
+        confidences = df['confidence'].tolist()
+        reason_codes = df['reason_code'].tolist()
+
+        # Uma falha no envio ainda deixa conferir os futures já obtidos: as
+        # mensagens sem future ficam sem resultado e são reprocessadas
+        sends = []
+        send_error: Optional[Exception] = None
+        try:
+            for i, context in enumerate(contexts):
+                decision = PricingDecision(
+                    sku=context.sku,
+                    current_price=context.current_price,
+                    recommended_price=prices[i],
+                    margin_pct=margins[i],
+                    confidence=confidences[i],
+                    reason_code=reason_codes[i],
+                    competitor_prices=context.competitor_prices
+                )
+                # send() só enfileira no buffer do producer; o ack chega pelo future devolvido
+                sends.append(await self.producer.send(
+                    settings.KAFKA_PRICES_TOPIC,
+                    value=KafkaMessage(event_type="recommended_price", data=decision.to_dict()).to_dict()
+                ))
+            await self.producer.flush()
+        except Exception as e:
+            send_error = e
+        results = await asyncio.gather(*sends, return_exceptions=True)
+
+        # Só decisões entregues entram na memo; as demais vão para a DLQ
+        delivered = 0
+        for i, result in enumerate(results):
+            context = contexts[i]
+            if isinstance(result, Exception):
+                logger.error(f"Falha ao publicar decisão de {context.sku}: {str(result)}")
+                await self._send_to_dlq(message_values[indices[i]], f"Falha ao publicar decisão: {str(result)}")
+            else:
+                delivered += 1
+                if self.memo is not None:
+                    self.memo.remember(context.sku, fingerprints[i], (prices[i], reason_codes[i], confidences[i]))
+            settled.add(indices[i])
+
+        if send_error is not None:
+            raise send_error
+        logger.info(
+            f"Lote publicado: {delivered}/{len(contexts)} decisões de {len(message_values)} mensagens"
+        )
+
+    async def _process_individually(self, messages: List[Tuple[int, str]], settled: Set[int]):
+        """Processa mensagens (posição, valor) uma a uma, enviando para a DLQ as que falharem"""
+        for index, value in messages:
+            try:
+                await self._process_message(value)
+            except Exception as e:
+                await self._send_to_dlq(value, str(e))
+            settled.add(index)
+
+    def _build_context(self, data: Dict[str, Any]) -> PriceContext:
+        """Cria o PriceContext a partir do payload raw_prices"""
+        return PriceContext(
+            sku=data.get("sku"),
+            current_price=data.get("current_price", 100.0),
+            cost=data.get("cost", 50.0),
+            competitor_prices=data.get("competitor_prices", []),
+            inventory_level=data.get("inventory_level", 100),
+            days_in_stock=data.get("days_in_stock", 30),
+            demand_forecast=data.get("demand_forecast", 0.5),
+            margin_constraints=(settings.MINIMUM_MARGIN, settings.MAXIMUM_MARGIN)
+        )
+
     async def _process_message(self, message_value: str):
         """
         Processa mensagem de preços da concorrência
@@ -106,32 +286,23 @@ class RulesEngineWorker:
                 logger.warning(f"Evento desconhecido: {kafka_msg.event_type}")
                 return
             
-            # Extrai dados
-            data = kafka_msg.data
-            sku = data.get("sku")
-            current_price = data.get("current_price", 100.0)
-            cost = data.get("cost", 50.0)
-            competitor_prices = data.get("competitor_prices", [])
-            inventory_level = data.get("inventory_level", 100)
-            days_in_stock = data.get("days_in_stock", 30)
-            demand_forecast = data.get("demand_forecast", 0.5)
+            # Extrai dados e cria contexto
+            context = self._build_context(kafka_msg.data)
+            sku = context.sku
+            cost = context.cost
             
             logger.info(f"Processando decisão de preço para {sku}")
             
-            # Cria contexto
-            context = PriceContext(
-                sku=sku,
-                current_price=current_price,
-                cost=cost,
-                competitor_prices=competitor_prices,
-                inventory_level=inventory_level,
-                days_in_stock=days_in_stock,
-                demand_forecast=demand_forecast,
-                margin_constraints=(settings.MINIMUM_MARGIN, settings.MAXIMUM_MARGIN)
-            )
+            # SKU sem mudança desde a última decisão: nada a recalcular nem publicar
+            fingerprint = None
+            if self.memo is not None:
+                fingerprint = self.memo.fingerprint(context, self.engine.rule_key())
+                if self.memo.lookup(sku, fingerprint) is not None:
+                    logger.debug(f"Decisão de {sku} inalterada, publicação suprimida")
+                    return
             
             # Calcula preço recomendado
-            recommended_price, reason, confidence = self.engine.calculate_price(context)
+            recommended_price, reason_code, confidence = self.engine.calculate_decision(context)
             
             # Calcula margem
             margin = (recommended_price - cost) / cost if cost > 0 else 0
@@ -139,16 +310,18 @@ class RulesEngineWorker:
             # Cria decisão
             decision = PricingDecision(
                 sku=sku,
-                current_price=current_price,
+                current_price=context.current_price,
                 recommended_price=recommended_price,
                 margin_pct=margin,
                 confidence=confidence,
-                reason=reason,
-                competitor_prices=competitor_prices
+                reason_code=reason_code,
+                competitor_prices=context.competitor_prices
             )
             
             # Publica decisão
             await self._publish_decision(decision)
+            if self.memo is not None:
+                self.memo.remember(sku, fingerprint, (recommended_price, reason_code, confidence))
             
             logger.info(f"Decisão publicada para {sku}: R${recommended_price:.2f}")
             
@@ -175,7 +348,7 @@ class RulesEngineWorker:
         
         await self.producer.send_and_wait(
             settings.KAFKA_PRICES_TOPIC,
-            value=json.loads(message.to_json())
+            value=message.to_dict()
         )
 
     async def _send_to_dlq(self, message_value: str, error_reason: str):
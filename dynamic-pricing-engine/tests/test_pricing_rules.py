@@ -2,11 +2,26 @@
 Testes unitários para o Rules Engine
 Demonstra como testar a lógica de precificação
 """
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
 import pytest
 from src.rules_engine.engine import (
     PricingRulesEngine, 
     PriceContext,
+    RULE_PARAMETERS,
+    pad_competitor_prices,
 )
+from src.reasons import ReasonCode, describe_reason, encode_reason, parse_reason, render_reason
+from src.rules_engine.history import PriceHistoryStore
+from src.rules_engine.memo import DecisionMemo
+from src.rules_engine.parallel import ParallelPricingEngine
+from src.rules_engine import pipeline as pipeline_module
+from src.rules_engine.pipeline import PRICE, STAGES, RulePipeline, rule_stage
+from src.rules_engine.simulation import ParameterSweep, parameter_grid
+from src.rules_engine.trends import TrendTracker
 
 
 class TestPricingRulesEngine:
@@ -215,31 +230,716 @@ class TestPricingRulesEngine:
         assert 'total_decisions' in trends
 
 
-class TestElasticitiyCalculation:
-    """Testes para o cálculo de elasticidade otimizado com Numba"""
+def _random_contexts(seed: int, count: int):
+    """Contextos aleatórios cobrindo todos os limiares das regras"""
+    rng = random.Random(seed)
+    contexts = []
+    for i in range(count):
+        cost = round(rng.uniform(1, 200), 2)
+        contexts.append(PriceContext(
+            sku=f"SKU_{i:04d}",
+            current_price=round(rng.uniform(1, 400), 2),
+            cost=cost,
+            competitor_prices=[
+                round(rng.uniform(cost * 0.5, cost * 2.5), 2)
+                for _ in range(rng.choice([0, 1, 2, 3, 4, 9, 12]))
+            ],
+            inventory_level=rng.choice([0, 10, 1000, 1001, 5000, 5001, 9000]),
+            days_in_stock=rng.choice([0, 180, 181, 365, 366, 500]),
+            demand_forecast=rng.choice([0.0, 0.3, 0.5, 0.7, rng.random()]),
+            margin_constraints=(0.10, 0.50)
+        ))
+    return contexts
 
-    def test_elasticity_with_numba(self):
-        """Testa otimização Numba de elasticidade"""
-        base_price = 100.0
-        demand = 0.7
-        factor = 1.5
-        
-        result = PricingRulesEngine._elasticity_calc(base_price, demand, factor)
-        
-        # Com demanda 0.7 (acima de 0.5), preço deve aumentar
-        assert result > base_price
 
-    def test_elasticity_symmetry(self):
-        """Testa simetria da elasticidade"""
-        base_price = 100.0
-        factor = 1.5
-        
-        # Demanda alta (0.7) vs demanda baixa (0.3)
-        high_result = PricingRulesEngine._elasticity_calc(base_price, 0.7, factor)
-        low_result = PricingRulesEngine._elasticity_calc(base_price, 0.3, factor)
-        
-        # Alto deve ser maior que baixo
-        assert high_result > low_result
+class TestPriceKernel:
+    """Testes para o kernel escalar compilado com Numba"""
+
+    @pytest.mark.parametrize("context, expected", [
+        # Mediana 105 * 0.98 = 102.9; demanda 0.7: * 1.06 = 109.074
+        (
+            PriceContext("A", 100.0, 80.0, [90.0, 100.0, 110.0, 120.0], 100, 30, 0.7, (0.10, 0.50)),
+            (109.07, "INCREASE: High demand or favorable competition", 0.85),
+        ),
+        # Sem concorrentes: 100; estoque alto * 0.95 e estoque antigo * 0.92 = 87.4
+        (
+            PriceContext("B", 100.0, 70.0, [], 2000, 200, 0.5, (0.10, 0.50)),
+            (87.4, "DISCOUNT: High inventory (2000) or low demand", 0.8),
+        ),
+        # Mediana 82 * 0.98 = 80.36, abaixo do mínimo 95 * 1.10 = 104.5
+        (
+            PriceContext("C", 100.0, 95.0, [80.0, 82.0, 85.0], 100, 30, 0.5, (0.10, 0.50)),
+            (104.5, "STABLE: Market aligned | Premium positioning", 1.0),
+        ),
+    ])
+    def test_known_decisions(self, context, expected):
+        """Testa o kernel contra decisões calculadas à mão"""
+        assert PricingRulesEngine().calculate_price(context) == expected
+
+    def test_warmup_compiles_single_specialization(self):
+        """Testa que warmup() compila o kernel e que mensagens reais reutilizam a mesma versão"""
+        engine = PricingRulesEngine()
+        assert engine.warmup() >= 0.0
+
+        scalar_kernel = engine.pipeline._kernels.scalar_kernel
+        compiled = len(scalar_kernel.signatures)
+        for inventory_level, competitor_prices in [(100, []), (250.0, [10, 12]), (0, [9.5])]:
+            engine.calculate_price(PriceContext(
+                sku="TEST",
+                current_price=100,
+                cost=50,
+                competitor_prices=competitor_prices,
+                inventory_level=inventory_level,
+                days_in_stock=30,
+                demand_forecast=0.5,
+                margin_constraints=(0.10, 0.50)
+            ))
+
+        assert compiled == len(scalar_kernel.signatures) == 1
+
+    def test_uses_current_parameters(self):
+        """Testa que alterações nos parâmetros do engine chegam ao kernel"""
+        engine = PricingRulesEngine()
+        context = PriceContext("A", 100.0, 80.0, [100.0, 110.0, 120.0], 100, 30, 0.5, (0.10, 0.50))
+        assert engine.calculate_price(context)[0] == 107.8
+
+        # Mediana 110 * 0.8 = 88, abaixo do novo mínimo 80 * 1.45 = 116
+        engine.min_margin = 0.45
+        engine.competitive_discount = 0.2
+        assert engine.calculate_price(context) == (
+            116.0, "INCREASE: High demand or favorable competition | Premium positioning", 1.0
+        )
+
+
+class TestColumnarPricing:
+    """Testes para o caminho colunar (NumPy) de cálculo em lote"""
+
+    @pytest.fixture
+    def contexts(self):
+        """Contextos variados cobrindo todos os limiares das regras"""
+        return _random_contexts(seed=7, count=500)
+
+    def test_matches_scalar_path(self, contexts):
+        """Testa que o lote produz exatamente o mesmo resultado de calculate_price"""
+        engine = PricingRulesEngine()
+        df = engine.calculate_batch_prices(contexts)
+
+        for context, row in zip(contexts, df.itertuples()):
+            price, reason_code, confidence = engine.calculate_decision(context)
+            assert row.recommended_price == price
+            assert row.reason_code == reason_code
+            assert row.confidence == confidence
+
+    def test_columnar_arrays(self):
+        """Testa a entrada direta por arrays com matriz de concorrentes preenchida com NaN"""
+        engine = PricingRulesEngine()
+        competitors = pad_competitor_prices([[95.0, 98.0, 100.0], [], [120.0]])
+
+        assert competitors.shape == (3, 3)
+        assert np.isnan(competitors[1]).all()
+
+        df = engine.calculate_prices_columnar(
+            skus=["A", "B", "C"],
+            current_price=np.array([100.0, 100.0, 100.0]),
+            cost=np.array([50.0, 80.0, 0.0]),
+            competitor_prices=competitors,
+            inventory_level=np.array([1000, 0, 6000]),
+            days_in_stock=np.array([30, 30, 400]),
+            demand_forecast=np.array([0.5, 0.5, 0.5]),
+        )
+
+        assert list(df['sku']) == ["A", "B", "C"]
+        assert df['recommended_price'].iloc[1] == 100.0  # sem concorrentes: preço padrão
+        assert df['margin_pct'].iloc[2] == 0.0
+        assert df['reason_code'].iloc[2] & ReasonCode.DISCOUNT
+        assert len(engine.get_price_history()) == 3
+
+    def test_zero_current_price(self):
+        """Testa que preço atual zero não interrompe o lote nem o caminho escalar"""
+        engine = PricingRulesEngine()
+        context = _random_contexts(seed=19, count=1)[0]
+        context.current_price = 0.0
+
+        df = engine.calculate_batch_prices([context])
+        price, reason, confidence = engine.calculate_price(context)
+        assert df['recommended_price'].iloc[0] == price
+        assert reason.startswith("INCREASE")
+
+    def test_rejects_misaligned_competitor_matrix(self):
+        """Testa validação do formato da matriz de concorrentes"""
+        engine = PricingRulesEngine()
+        with pytest.raises(ValueError):
+            engine.evaluate_arrays(
+                np.array([100.0]), np.array([50.0]), np.array([95.0, 98.0]),
+                np.array([10]), np.array([10]), np.array([0.5])
+            )
+
+
+class TestRevenueOptimization:
+    """Testes para o estágio opcional de margem esperada máxima"""
+
+    def test_paths_agree(self):
+        """Testa que lote e kernel escalar coincidem com o estágio ativo"""
+        engine = PricingRulesEngine(revenue_optimization=True)
+        contexts = _random_contexts(seed=29, count=500)
+        df = engine.calculate_batch_prices(contexts)
+
+        for context, row in zip(contexts, df.itertuples()):
+            price, reason, confidence = engine.calculate_price(context)
+            assert render_reason(row.reason_code, context.inventory_level) == reason
+            assert (row.recommended_price, row.confidence) == (price, confidence)
+
+    def test_maximizes_expected_margin(self):
+        """Testa o ótimo contra busca exaustiva e o respeito às margens"""
+        engine = PricingRulesEngine(max_margin=2.0, revenue_optimization=True)
+        context = PriceContext(
+            sku="OPT",
+            current_price=100.0,
+            cost=50.0,
+            competitor_prices=[],
+            inventory_level=0,
+            days_in_stock=0,
+            demand_forecast=0.5,
+            margin_constraints=(0.10, 2.0)
+        )
+        price, _, _ = engine.calculate_price(context)
+
+        # Referência = preço padrão (100); demanda linear com e = price_elasticity
+        candidates = np.linspace(55.0, 150.0, 95_001)
+        expected_margin = (candidates - 50.0) * (1 - 1.5 * (candidates / 100.0 - 1))
+        assert price == pytest.approx(candidates[np.argmax(expected_margin)], abs=0.01)
+
+        engine.max_margin = 0.5
+        assert engine.calculate_price(context)[0] == 75.0
+
+    def test_uses_price_elasticity(self):
+        """Testa que o ótimo depende de price_elasticity e não do fator de demanda"""
+        context = PriceContext(
+            sku="OPT",
+            current_price=100.0,
+            cost=50.0,
+            competitor_prices=[],
+            inventory_level=0,
+            days_in_stock=0,
+            demand_forecast=0.5,
+            margin_constraints=(0.10, 2.0)
+        )
+        base = PricingRulesEngine(max_margin=2.0, revenue_optimization=True)
+        other_factor = PricingRulesEngine(max_margin=2.0, revenue_optimization=True, elasticity_factor=3.0)
+        elastic = PricingRulesEngine(max_margin=2.0, revenue_optimization=True, price_elasticity=-3.0)
+
+        assert other_factor.calculate_price(context)[0] == base.calculate_price(context)[0]
+        # p* = 100 * (e - 1) / (2e) + 50 / 2
+        assert elastic.calculate_price(context)[0] == pytest.approx(100 * 4 / 6 + 25, abs=0.01)
+        assert 'price_elasticity' in RULE_PARAMETERS
+
+    def test_rejects_non_negative_elasticity(self):
+        """Testa a convenção de sinal de price_elasticity"""
+        with pytest.raises(ValueError):
+            PricingRulesEngine(price_elasticity=1.5)
+
+
+class TestReasonCodes:
+    """Testes para os códigos de razão compactos"""
+
+    def test_rendered_text(self):
+        """Testa o texto montado a partir do código de cada decisão"""
+        engine = PricingRulesEngine()
+        context = PriceContext("A", 100.0, 95.0, [80.0, 82.0, 85.0], 100, 30, 0.5, (0.10, 0.50))
+        assert engine.calculate_decision(context)[1] == ReasonCode.STABLE | ReasonCode.PREMIUM_POSITIONING
+
+        assert render_reason(ReasonCode.STABLE | ReasonCode.PREMIUM_POSITIONING) == (
+            "STABLE: Market aligned | Premium positioning"
+        )
+        assert render_reason(ReasonCode.INCREASE) == "INCREASE: High demand or favorable competition"
+        assert render_reason(ReasonCode.DISCOUNT | ReasonCode.AGGRESSIVE_POSITIONING, 2000) == (
+            "DISCOUNT: High inventory (2000) or low demand | Aggressive positioning"
+        )
+        assert render_reason(ReasonCode.DISCOUNT) == "DISCOUNT: High inventory or low demand"
+
+    def test_legacy_reason_text(self):
+        """Testa que registros sem reason_code mantêm o texto gravado"""
+        legacy = "DISCOUNT: High inventory (2000) or low demand"
+        assert describe_reason(None, legacy) == legacy
+        assert describe_reason(None) == ""
+        assert describe_reason(ReasonCode.INCREASE, legacy) == "INCREASE: High demand or favorable competition"
+
+    def test_parse_legacy_reason(self):
+        """Testa a conversão do texto legado de volta ao código"""
+        for code in range(32):
+            if code & 3 == 3 or code & 12 == 12 or (code & ReasonCode.FALLBACK and code != ReasonCode.FALLBACK):
+                continue
+            assert parse_reason(render_reason(code)) == code
+            assert parse_reason(render_reason(code, 2000)) == code
+        assert parse_reason("Preço manual") is None
+        assert parse_reason("STABLE: Market aligned | Outro motivo") is None
+        assert parse_reason(None) is None
+
+    def test_reason_code_migration(self):
+        """Testa a migração que cria e preenche reason_code em uma tabela antiga"""
+        sqlalchemy = pytest.importorskip("sqlalchemy")
+        from src.audit_service.migrations import add_reason_code
+
+        engine = sqlalchemy.create_engine("sqlite://")
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text(
+                "CREATE TABLE pricing_decisions (id INTEGER PRIMARY KEY, sku VARCHAR(50), reason VARCHAR(500))"
+            ))
+            connection.execute(sqlalchemy.text("INSERT INTO pricing_decisions (sku, reason) VALUES (:sku, :reason)"), [
+                {"sku": "A", "reason": "DISCOUNT: High inventory (2000) or low demand | Aggressive positioning"},
+                {"sku": "B", "reason": "STABLE: Market aligned"},
+                {"sku": "C", "reason": "Preço manual"},
+            ])
+
+        assert add_reason_code(engine) == 2
+        assert add_reason_code(engine) == 0
+        with engine.connect() as connection:
+            rows = dict(connection.execute(sqlalchemy.text("SELECT sku, reason_code FROM pricing_decisions")).all())
+        assert rows == {"A": ReasonCode.DISCOUNT | ReasonCode.AGGRESSIVE_POSITIONING, "B": ReasonCode.STABLE, "C": None}
+
+    def test_encoding(self):
+        """Testa a combinação de direção e posicionamento, escalar e vetorizada"""
+        assert encode_reason(2, 1) == ReasonCode.DISCOUNT | ReasonCode.AGGRESSIVE_POSITIONING
+        assert encode_reason(0, 0) == ReasonCode.STABLE
+        np.testing.assert_array_equal(
+            encode_reason(np.array([1, 0], dtype=np.uint8), np.array([2, 0], dtype=np.uint8)),
+            [ReasonCode.INCREASE | ReasonCode.PREMIUM_POSITIONING, 0]
+        )
+        assert render_reason(ReasonCode.DISCOUNT) == "DISCOUNT: High inventory or low demand"
+        assert render_reason(ReasonCode.FALLBACK).startswith("Fallback pricing")
+
+    def test_history_stores_codes(self):
+        """Testa que o histórico guarda o código em uint8, sem strings"""
+        engine = PricingRulesEngine()
+        engine.calculate_batch_prices(_random_contexts(seed=37, count=20))
+
+        history = engine.get_price_history()
+        assert 'reason' not in history.columns
+        assert history['reason_code'].dtype == np.uint8
+
+
+@rule_stage('test_price_ceiling', params=('price_ceiling',))
+def _test_price_ceiling(state, params):
+    """Estágio de teste: teto de preço lido do atributo price_ceiling do engine"""
+    if state[PRICE] > params[0]:
+        state[PRICE] = params[0]
+        return True
+    return False
+
+
+class TestRulePipeline:
+    """Testes para o pipeline de estágios registrados"""
+
+    @pytest.fixture
+    def contexts(self):
+        return _random_contexts(seed=41, count=1000)
+
+    @pytest.mark.parametrize("revenue_optimization", [False, True])
+    def test_scalar_profile_and_batch_agree(self, contexts, revenue_optimization):
+        """Testa que kernel escalar, kernel de lote e modo profile dão o mesmo resultado"""
+        expected = PricingRulesEngine(revenue_optimization=revenue_optimization).calculate_batch_prices(contexts)
+        engine = PricingRulesEngine(revenue_optimization=revenue_optimization)
+        for context, row in zip(contexts, expected.itertuples()):
+            assert engine.calculate_decision(context) == (row.recommended_price, row.reason_code, row.confidence)
+
+        engine.use_pipeline(RulePipeline(profile=True))
+        df = engine.calculate_batch_prices(contexts)
+        pd.testing.assert_frame_equal(df.drop(columns='timestamp'), expected.drop(columns='timestamp'))
+        for context, row in zip(contexts[:50], expected.itertuples()):
+            assert engine.calculate_decision(context) == (row.recommended_price, row.reason_code, row.confidence)
+
+    def test_stage_stats(self, contexts):
+        """Testa a contagem de SKUs afetados e o tempo por estágio"""
+        engine = PricingRulesEngine()
+        engine.calculate_batch_prices(contexts)
+        for context in contexts:
+            engine.calculate_decision(context)
+
+        stats = engine.pipeline.stats()
+        assert list(stats.index) == list(engine.pipeline.stage_names)
+        assert (stats['calls'] == 1 + len(contexts)).all()
+        assert (stats['rows'] == 2 * len(contexts)).all()
+        assert stats.loc['revenue_optimization', 'affected'] == 0
+        with_competitors = sum(1 for context in contexts if context.competitor_prices)
+        assert stats.loc['competition', 'affected'] == 2 * with_competitors
+        assert (stats['seconds'] == 0).all()
+
+        pipeline = engine.use_pipeline(RulePipeline(profile=True))
+        engine.calculate_batch_prices(contexts)
+        stats = pipeline.stats()
+        assert stats.loc['competition', 'affected'] == with_competitors
+        assert stats['time_share'].sum() == pytest.approx(1.0)
+
+    def test_custom_stage_reaches_every_path(self, contexts):
+        """Testa que um estágio registrado vale no lote, no escalar, nos shards e na simulação"""
+        engine = PricingRulesEngine(max_margin=5.0)
+        engine.price_ceiling = 150.0
+        engine.use_pipeline(RulePipeline().with_stage('test_price_ceiling', before='margin_constraints'))
+
+        df = engine.calculate_batch_prices(contexts)
+        # O teto só cede à margem mínima (arredondamento de 2 casas)
+        assert (df['recommended_price'] <= np.maximum(150.0, df['cost'] * 1.10) + 0.005).all()
+        assert (df['recommended_price'] > 150.0).any()
+        batch_affected = engine.pipeline.stats().loc['test_price_ceiling', 'affected']
+        assert batch_affected > 0
+
+        for context, row in zip(contexts[:50], df.itertuples()):
+            assert engine.calculate_decision(context) == (row.recommended_price, row.reason_code, row.confidence)
+
+        before = engine.pipeline.stats().loc['test_price_ceiling', 'affected']
+        engine.parallel(workers=2).min_shard_size = 300
+        try:
+            parallel_df = engine.calculate_batch_prices(contexts, workers=2)
+        finally:
+            engine.close()
+        pd.testing.assert_frame_equal(parallel_df.drop(columns='timestamp'), df.drop(columns='timestamp'))
+        # Contagens dos workers somadas ao pipeline do engine
+        assert engine.pipeline.stats().loc['test_price_ceiling', 'affected'] - before == batch_affected
+
+        sweep = ParameterSweep.from_contexts(engine, contexts)
+        lowered = sweep.evaluate({'price_ceiling': 120.0})['recommended_price']
+        assert (lowered <= np.maximum(120.0, sweep.cost * 1.10) + 0.005).all()
+        assert (lowered == 120.0).any()
+
+    def test_rule_key_tracks_stages(self):
+        """Testa que estágios e parâmetros dos estágios entram na identificação das regras"""
+        engine = PricingRulesEngine()
+        engine.price_ceiling = 150.0
+        default_key = engine.rule_key()
+        assert default_key[:len(engine.pipeline.stage_names)] == engine.pipeline.stage_names
+
+        engine.use_pipeline(RulePipeline().with_stage('test_price_ceiling'))
+        ceiling_key = engine.rule_key()
+        assert ceiling_key != default_key
+
+        engine.price_ceiling = 120.0
+        assert engine.rule_key() != ceiling_key
+
+    def test_unknown_stage(self):
+        with pytest.raises(ValueError):
+            RulePipeline(['competition', 'missing_stage'])
+
+    def test_kernel_files_are_private_and_never_executed(self, tmp_path, monkeypatch):
+        """Testa que diretórios compartilhados são ignorados e que o arquivo do kernel não é executado"""
+        shared = tmp_path / 'shared'
+        shared.mkdir()
+        shared.chmod(0o777)
+        private = tmp_path / 'private'
+        monkeypatch.setattr(pipeline_module, '_KERNEL_DIRS', (str(shared), str(private)))
+        monkeypatch.setattr(pipeline_module, '_kernel_modules', {})
+
+        stages = ['competition', 'margin_constraints']
+        module = RulePipeline(stages)._kernels
+        assert list(shared.iterdir()) == []
+        assert (private.stat().st_mode & 0o777) == 0o700
+
+        # Código plantado no caminho do kernel é substituído pelo código gerado
+        with open(module.__file__, 'w') as kernel_file:
+            kernel_file.write('raise RuntimeError("código plantado")\n')
+        monkeypatch.setattr(pipeline_module, '_kernel_modules', {})
+        engine = PricingRulesEngine()
+        engine.use_pipeline(RulePipeline(stages))
+        assert engine.calculate_decision(_random_contexts(seed=3, count=1)[0])
+        with open(module.__file__) as kernel_file:
+            assert 'código plantado' not in kernel_file.read()
+
+
+class TestParallelPricing:
+    """Testes para a precificação em shards paralelos"""
+
+    @pytest.fixture
+    def contexts(self):
+        return _random_contexts(seed=13, count=2000)
+
+    def test_matches_serial_path(self, contexts):
+        """Testa que os shards reproduzem evaluate_arrays na ordem original"""
+        engine = PricingRulesEngine(min_margin=0.2, competitive_discount=0.05)
+        arrays = (
+            np.array([context.current_price for context in contexts]),
+            np.array([context.cost for context in contexts]),
+            pad_competitor_prices([context.competitor_prices for context in contexts]),
+            np.array([context.inventory_level for context in contexts]),
+            np.array([context.days_in_stock for context in contexts]),
+            np.array([context.demand_forecast for context in contexts]),
+        )
+        expected = engine.evaluate_arrays(*arrays)
+
+        with ParallelPricingEngine(engine, workers=3, min_shard_size=300) as parallel:
+            assert len(parallel._shards(len(contexts))) == 3
+            result = parallel.evaluate_arrays(*arrays)
+
+        for name, values in expected.items():
+            np.testing.assert_array_equal(result[name], values)
+
+    def test_batch_prices_with_workers(self, contexts):
+        """Testa a opção workers de calculate_batch_prices"""
+        engine = PricingRulesEngine()
+        engine.parallel(workers=2).min_shard_size = 500
+        try:
+            df = engine.calculate_batch_prices(contexts, workers=2)
+        finally:
+            engine.close()
+
+        expected = PricingRulesEngine().calculate_batch_prices(contexts)
+        pd.testing.assert_frame_equal(df.drop(columns='timestamp'), expected.drop(columns='timestamp'))
+        assert len(engine.get_price_history()) == len(contexts)
+        assert engine.analyze_price_trends()['total_decisions'] == len(contexts)
+
+    def test_small_batches_stay_in_process(self):
+        """Testa que lotes menores que dois shards não usam o pool"""
+        parallel = ParallelPricingEngine(PricingRulesEngine(), workers=4, min_shard_size=1000)
+
+        assert len(parallel._shards(1999)) == 1
+        assert parallel._shards(10_000) == [(0, 2500), (2500, 5000), (5000, 7500), (7500, 10_000)]
+
+        result = parallel.evaluate_arrays(
+            np.array([100.0]), np.array([50.0]), pad_competitor_prices([[95.0]]),
+            np.array([10]), np.array([10]), np.array([0.5])
+        )
+        assert len(result['recommended_price']) == 1
+        assert parallel._pool is None
+
+
+class TestDecisionMemo:
+    """Testes para a memoização de decisões por fingerprint"""
+
+    @pytest.fixture
+    def context(self):
+        return _random_contexts(seed=17, count=1)[0]
+
+    def test_reuses_decision_within_tolerance(self, context):
+        """Testa que variações abaixo da tolerância reaproveitam a decisão"""
+        engine = PricingRulesEngine()
+        memo = DecisionMemo(price_tolerance=0.05, demand_tolerance=0.01)
+        params = engine.rule_key()
+
+        fingerprint = memo.fingerprint(context, params)
+        assert memo.lookup(context.sku, fingerprint) is None
+        decision = engine.calculate_price(context)
+        memo.remember(context.sku, fingerprint, decision)
+
+        context.current_price += 0.001
+        context.competitor_prices = list(reversed(context.competitor_prices))
+        assert memo.lookup(context.sku, memo.fingerprint(context, params)) == decision
+        assert (memo.hits, memo.misses) == (1, 1)
+
+    def test_changes_invalidate(self, context):
+        """Testa que mudanças de entrada ou de parâmetros geram nova decisão"""
+        engine = PricingRulesEngine()
+        memo = DecisionMemo()
+        memo.remember(context.sku, memo.fingerprint(context, engine.rule_key()), (1.0, "", 0.5))
+
+        engine.min_margin = 0.3
+        assert memo.lookup(context.sku, memo.fingerprint(context, engine.rule_key())) is None
+
+        engine.min_margin = 0.10
+        context.inventory_level += 1
+        assert memo.lookup(context.sku, memo.fingerprint(context, engine.rule_key())) is None
+
+    def test_max_age_and_max_entries(self, context):
+        """Testa expiração por idade e descarte LRU"""
+        memo = DecisionMemo(max_entries=2, max_age=0.0)
+        fingerprint = memo.fingerprint(context)
+        memo.remember("A", fingerprint, (1.0, "", 0.5))
+        assert memo.lookup("A", fingerprint) is None
+
+        memo.max_age = None
+        memo.remember("B", fingerprint, (2.0, "", 0.5))
+        assert memo.lookup("A", fingerprint) is not None
+        memo.remember("C", fingerprint, (3.0, "", 0.5))
+
+        assert len(memo) == 2
+        assert memo.lookup("B", fingerprint) is None
+
+
+class TestParameterSweep:
+    """Testes para a simulação de grades de parâmetros"""
+
+    @pytest.fixture
+    def sweep(self):
+        return ParameterSweep.from_contexts(PricingRulesEngine(), _random_contexts(seed=23, count=1000))
+
+    def test_parameter_grid(self):
+        """Testa o produto cartesiano dos eixos"""
+        grid = parameter_grid(elasticity_factor=[1.0, 1.5, 2.0], competitive_discount=[0.0, 0.02])
+
+        assert len(grid) == 6
+        assert grid[1] == {'elasticity_factor': 1.0, 'competitive_discount': 0.02}
+
+    def test_matches_engine_with_overrides(self, sweep):
+        """Testa que cada conjunto equivale a um engine construído com os mesmos parâmetros"""
+        contexts = _random_contexts(seed=23, count=1000)
+        params = {'elasticity_factor': 2.5, 'high_inventory_discount': 0.2, 'min_margin': 0.05}
+        expected = PricingRulesEngine(**params).calculate_batch_prices(contexts)
+
+        result = sweep.evaluate(params)
+        np.testing.assert_array_equal(result['recommended_price'], expected['recommended_price'])
+        np.testing.assert_array_equal(result['confidence'], expected['confidence'])
+        assert sweep.engine.elasticity_factor == 1.5
+        assert sweep.engine.price_history.empty
+
+    def test_run_reports_metrics(self, sweep):
+        """Testa o resumo por conjunto de parâmetros"""
+        df = sweep.run(parameter_grid(competitive_discount=[0.0, 0.05, 0.10]))
+
+        assert len(df) == 3
+        assert list(df['competitive_discount']) == [0.0, 0.05, 0.10]
+        shares = df['share_increase'] + df['share_decrease'] + df['share_stable']
+        np.testing.assert_allclose(shares, 1.0)
+        assert (df['price_change_p5'] <= df['price_change_p95']).all()
+        # Mais desconto competitivo nunca aumenta o preço médio
+        assert df['mean_price'].is_monotonic_decreasing
+
+    def test_rejects_unknown_parameter(self, sweep):
+        """Testa validação dos nomes de parâmetros"""
+        with pytest.raises(ValueError):
+            sweep.evaluate({'history_max_rows': 10})
+
+
+def _history_batch(skus, timestamp=None, price=100.0):
+    """Lote de colunas para o PriceHistoryStore"""
+    count = len(skus)
+    return {
+        'sku': np.array(skus, dtype=object),
+        'current_price': np.full(count, 100.0),
+        'recommended_price': np.full(count, price),
+        'margin_pct': np.full(count, 0.2),
+        'confidence': np.full(count, 0.8),
+        'reason_code': np.zeros(count, dtype=np.uint8),
+        'cost': np.full(count, 50.0),
+        'demand_forecast': np.full(count, 0.5),
+        'inventory_level': np.full(count, 10),
+        'timestamp': np.datetime64(timestamp or datetime.utcnow(), 'ns'),
+    }
+
+
+class TestPriceHistoryStore:
+    """Testes para o histórico colunar limitado"""
+
+    def test_append_across_chunks(self):
+        """Testa lotes maiores que o bloco e a leitura na ordem de inserção"""
+        store = PriceHistoryStore(chunk_size=4)
+        store.append(_history_batch([f"S{i}" for i in range(10)]))
+        store.append(_history_batch(["S10"]))
+
+        df = store.to_frame()
+        assert len(store) == 11
+        assert list(df['sku']) == [f"S{i}" for i in range(11)]
+        assert df['timestamp'].dtype.kind == 'M'
+
+    def test_max_rows_evicts_oldest(self):
+        """Testa o limite de linhas descartando as mais antigas"""
+        store = PriceHistoryStore(max_rows=5, chunk_size=3)
+        for start in range(0, 12, 4):
+            store.append(_history_batch([f"S{i}" for i in range(start, start + 4)]))
+
+        assert len(store) == 5
+        assert list(store.column('sku')) == [f"S{i}" for i in range(7, 12)]
+
+    def test_retention_window(self):
+        """Testa a janela de retenção pelo timestamp das decisões"""
+        store = PriceHistoryStore(retention=timedelta(hours=1), chunk_size=4)
+        store.append(_history_batch(["OLD1", "OLD2"], datetime.utcnow() - timedelta(hours=2)))
+        store.append(_history_batch(["NEW1", "NEW2", "NEW3"]))
+
+        assert list(store.column('sku')) == ["NEW1", "NEW2", "NEW3"]
+
+    def test_engine_history_is_bounded(self):
+        """Testa get_price_history sobre o histórico limitado"""
+        engine = PricingRulesEngine(history_max_rows=3)
+        contexts = [
+            PriceContext(
+                sku="TREND_SKU" if i % 2 else "OTHER",
+                current_price=100.0 + i * 10,
+                cost=50.0 + i,
+                competitor_prices=[95.0, 98.0, 100.0],
+                inventory_level=1000,
+                days_in_stock=30,
+                demand_forecast=0.5,
+                margin_constraints=(0.10, 0.50)
+            )
+            for i in range(6)
+        ]
+        for context in contexts:
+            engine.calculate_batch_prices([context])
+
+        history = engine.get_price_history()
+        assert len(history) == 3
+        assert list(engine.get_price_history("TREND_SKU")['current_price']) == [130.0, 150.0]
+        # As tendências continuam cobrindo as decisões que saíram do histórico
+        assert engine.analyze_price_trends("TREND_SKU")['total_decisions'] == 3
+
+
+class TestTrendTracker:
+    """Testes para os acumuladores incrementais de tendência"""
+
+    @pytest.fixture
+    def decisions(self):
+        """Decisões sintéticas de 5 SKUs em lotes de tamanhos variados"""
+        rng = np.random.default_rng(3)
+        skus = rng.choice([f"S{i}" for i in range(5)], size=400)
+        prices = rng.uniform(50, 150, size=400)
+        margins = rng.uniform(0.1, 0.5, size=400)
+        confidences = rng.uniform(0.5, 1.0, size=400)
+        return skus, prices, margins, confidences
+
+    def test_matches_full_recomputation(self, decisions):
+        """Testa média, desvio, EWMA e janela contra o recálculo com pandas"""
+        skus, prices, margins, confidences = decisions
+        tracker = TrendTracker(ewma_alpha=0.2, window=10)
+        for start, end in [(0, 1), (1, 37), (37, 250), (250, 400)]:
+            tracker.update(skus[start:end], prices[start:end], margins[start:end], confidences[start:end])
+
+        df = pd.DataFrame({'sku': skus, 'price': prices, 'margin': margins, 'confidence': confidences})
+        for sku, group in df.groupby('sku'):
+            stats = tracker.stats(sku)
+            assert stats['total_decisions'] == len(group)
+            assert stats['mean_recommended_price'] == pytest.approx(group['price'].mean())
+            assert stats['price_volatility'] == pytest.approx(group['price'].std())
+            assert stats['mean_margin'] == pytest.approx(group['margin'].mean())
+            assert stats['avg_confidence'] == pytest.approx(group['confidence'].mean())
+            assert stats['ewma_price'] == pytest.approx(group['price'].ewm(alpha=0.2, adjust=False).mean().iloc[-1])
+            assert stats['ewma_margin'] == pytest.approx(group['margin'].ewm(alpha=0.2, adjust=False).mean().iloc[-1])
+            assert stats['window_mean_price'] == pytest.approx(group['price'].tail(10).mean())
+            assert stats['window_price_volatility'] == pytest.approx(group['price'].tail(10).std())
+
+        overall = tracker.stats()
+        assert overall['total_decisions'] == 400
+        assert overall['price_volatility'] == pytest.approx(df['price'].std())
+
+    def test_grows_beyond_initial_capacity(self):
+        """Testa o crescimento dos arrays de estado com muitos SKUs"""
+        tracker = TrendTracker(capacity=2)
+        skus = [f"S{i}" for i in range(50)]
+        tracker.update(skus, np.arange(50.0), np.zeros(50), np.ones(50))
+
+        assert len(tracker) == 50
+        assert tracker.stats("S49")['mean_recommended_price'] == 49.0
+        assert np.isnan(tracker.stats("S49")['price_volatility'])
+        assert tracker.stats("MISSING") == {}
+
+    def test_engine_uses_tracker(self):
+        """Testa analyze_price_trends lendo os acumuladores do engine"""
+        engine = PricingRulesEngine(trend_window=3)
+        contexts = [
+            PriceContext(
+                sku="TREND_SKU",
+                current_price=100.0 + i * 10,
+                cost=50.0 + i,
+                competitor_prices=[95.0, 98.0, 100.0],
+                inventory_level=1000,
+                days_in_stock=30,
+                demand_forecast=0.5,
+                margin_constraints=(0.10, 0.50)
+            )
+            for i in range(5)
+        ]
+        df = engine.calculate_batch_prices(contexts)
+        trends = engine.analyze_price_trends("TREND_SKU")
+
+        assert trends['total_decisions'] == 5
+        assert trends['mean_recommended_price'] == pytest.approx(df['recommended_price'].mean())
+        assert trends['window_mean_price'] == pytest.approx(df['recommended_price'].tail(3).mean())
 
 
 if __name__ == "__main__":
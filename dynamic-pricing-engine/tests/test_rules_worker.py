@@ -0,0 +1,159 @@
+"""
+Testes do RulesEngineWorker no modo em lotes
+Consumer e producers Kafka são substituídos por versões em memória
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aiokafka")
+pytest.importorskip("pydantic_settings")
+
+from config.settings import settings
+from src.common import KafkaMessage
+from src.rules_engine.worker import RulesEngineWorker
+
+
+class FakeProducer:
+    """Producer em memória; SKUs em fail_skus têm o ack com erro, em raise_skus send() falha"""
+
+    def __init__(self, fail_skus=(), raise_skus=(), fail_flush=False):
+        self.fail_skus = set(fail_skus)
+        self.raise_skus = set(raise_skus)
+        self.fail_flush = fail_flush
+        self.published = []
+
+    async def send(self, topic, value):
+        sku = value.get("data", {}).get("sku")
+        if sku in self.raise_skus:
+            raise RuntimeError(f"buffer cheio ao enviar {sku}")
+        future = asyncio.get_running_loop().create_future()
+        if sku in self.fail_skus:
+            future.set_exception(RuntimeError(f"ack com erro para {sku}"))
+        else:
+            self.published.append((topic, value))
+            future.set_result(None)
+        return future
+
+    async def send_and_wait(self, topic, value):
+        self.published.append((topic, value))
+
+    async def flush(self):
+        if self.fail_flush:
+            raise RuntimeError("flush falhou")
+
+
+class FakeConsumer:
+    """Entrega os lotes pedidos em getmany() e então encerra o loop do worker"""
+
+    def __init__(self, worker, batches):
+        self.worker = worker
+        self.batches = list(batches)
+
+    async def getmany(self, timeout_ms, max_records):
+        if not self.batches:
+            self.worker.running = False
+            return {}
+        return {"partition": [SimpleNamespace(value=value) for value in self.batches.pop(0)]}
+
+
+def _raw_message(sku, current_price=100.0):
+    return KafkaMessage(event_type="raw_prices", data={
+        "sku": sku,
+        "current_price": current_price,
+        "cost": 50.0,
+        "competitor_prices": [95.0, 105.0],
+    }).to_json()
+
+
+def _published_skus(producer):
+    return [value["data"]["sku"] for topic, value in producer.published]
+
+
+@pytest.fixture
+def worker():
+    worker = RulesEngineWorker()
+    worker.producer = FakeProducer()
+    worker.dlq_producer = FakeProducer()
+    return worker
+
+
+class TestBatchProcessing:
+    """Testes para _process_batch e _run_batches"""
+
+    def test_publishes_batch_and_remembers_decisions(self, worker):
+        """Testa a publicação do lote e a supressão de SKUs inalterados no lote seguinte"""
+        values = [_raw_message("A"), _raw_message("B")]
+        settled = set()
+        asyncio.run(worker._process_batch(values, settled))
+
+        assert _published_skus(worker.producer) == ["A", "B"]
+        assert all(topic == settings.KAFKA_PRICES_TOPIC for topic, value in worker.producer.published)
+        assert settled == {0, 1}
+
+        asyncio.run(worker._process_batch(values, set()))
+        assert _published_skus(worker.producer) == ["A", "B"]
+
+    def test_only_last_update_per_sku_is_published(self, worker):
+        """Testa que atualizações repetidas de um SKU no mesmo lote geram uma única decisão"""
+        values = [_raw_message("A", 100.0), _raw_message("B"), _raw_message("A", 110.0), _raw_message("A", 110.0)]
+        settled = set()
+        asyncio.run(worker._process_batch(values, settled))
+
+        assert _published_skus(worker.producer) == ["B", "A"]
+        assert worker.producer.published[1][1]["data"]["current_price"] == 110.0
+        assert settled == {0, 1, 2, 3}
+
+    def test_partial_delivery_failure(self, worker):
+        """Testa que só decisões entregues entram na memo e que as demais vão para a DLQ"""
+        worker.producer = FakeProducer(fail_skus={"B"})
+        values = [_raw_message("A"), _raw_message("B"), _raw_message("C")]
+        asyncio.run(worker._process_batch(values, set()))
+
+        assert _published_skus(worker.producer) == ["A", "C"]
+        assert [value["original_message"] for topic, value in worker.dlq_producer.published] == [values[1]]
+
+        # B não foi entregue: a mesma mensagem é precificada e publicada de novo
+        worker.producer.fail_skus.clear()
+        asyncio.run(worker._process_batch(values, set()))
+        assert _published_skus(worker.producer) == ["A", "C", "B"]
+
+    def test_failed_flush_does_not_republish(self, worker):
+        """Testa que uma falha depois dos envios não republica nem derruba o loop"""
+        worker.producer = FakeProducer(fail_flush=True)
+        worker.running = True
+        worker.consumer = FakeConsumer(worker, [
+            [_raw_message("A"), _raw_message("B")],
+            [_raw_message("C")],
+        ])
+        asyncio.run(worker._run_batches())
+
+        assert _published_skus(worker.producer) == ["A", "B", "C"]
+        assert worker.dlq_producer.published == []
+
+    def test_failure_mid_batch_retries_only_pending_messages(self, worker):
+        """Testa que, após uma exceção no lote, só mensagens sem resultado são reprocessadas"""
+        worker.producer = FakeProducer(raise_skus={"B"})
+        values = ["{json inválido", _raw_message("A"), _raw_message("B"), _raw_message("C")]
+        worker.running = True
+        worker.consumer = FakeConsumer(worker, [values])
+        asyncio.run(worker._run_batches())
+
+        # A saiu no lote; B e C são reprocessados por _process_message (send_and_wait)
+        assert _published_skus(worker.producer) == ["A", "B", "C"]
+        assert [value["original_message"] for topic, value in worker.dlq_producer.published] == [values[0]]
+
+    def test_engine_failure_falls_back_to_single_messages(self, worker, monkeypatch):
+        """Testa o reprocessamento individual quando o cálculo em lote falha"""
+        def fail(contexts):
+            raise RuntimeError("falha no lote")
+
+        monkeypatch.setattr(worker.engine, "calculate_batch_prices", fail)
+        values = [_raw_message("A"), _raw_message("B")]
+        settled = set()
+        asyncio.run(worker._process_batch(values, settled))
+
+        assert _published_skus(worker.producer) == ["A", "B"]
+        assert settled == {0, 1}
+        assert worker.dlq_producer.published == []